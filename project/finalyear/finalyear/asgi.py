@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finalyear.settings')
 
-application = get_asgi_application()
+# Set up Django before importing consumers, which use the ORM
+django_asgi_application = get_asgi_application()
+
+from protest.warmup import warm_up_configured  # noqa: E402
+
+try:
+    from channels.routing import ProtocolTypeRouter, URLRouter
+    from channels.security.websocket import AllowedHostsOriginValidator
+except ImportError:  # Channels is optional; without it only HTTP is served
+    application = django_asgi_application
+else:
+    from protest.websocket_urls import websocket_urlpatterns
+
+    application = ProtocolTypeRouter({
+        'http': django_asgi_application,
+        'websocket': AllowedHostsOriginValidator(URLRouter(websocket_urlpatterns)),
+    })
+
+warm_up_configured()
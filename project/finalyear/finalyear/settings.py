@@ -64,6 +64,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'protest.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -151,3 +152,54 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Precomputed analysis artifacts (road graph, etc.), keyed by data version
+PROTEST_CACHE_DIR = BASE_DIR / 'cache'
+
+# Days of protest_event_change kept for ?since= delta syncs (manage.py prune_change_log);
+# clients with an older sync token reload the whole layer
+PROTEST_CHANGE_LOG_RETENTION_DAYS = 30
+
+# Per-view latency/SQL/size histograms served at /api/_metrics (protest/metrics.py)
+PROTEST_METRICS_ENABLED = True
+# Bearer token for Prometheus scrapes of /api/_metrics; without it only staff users can read them
+PROTEST_METRICS_TOKEN = os.environ.get('PROTEST_METRICS_TOKEN', '')
+
+# Admin changelists use estimated counts and cached filter choices (protest/admin_performance.py)
+PROTEST_ADMIN_PERFORMANCE_MODE = True
+
+# Preload the lazily imported analysis stack when a server process starts (protest/warmup.py):
+# '' (load on first use), 'imports', or 'snapshots' (imports plus the cached table snapshots)
+PROTEST_WARM_UP = os.environ.get('PROTEST_WARM_UP', '')
+
+# Channel layer for live pushes (protest/live.py). The in-memory layer only reaches
+# subscribers of the same process; set PROTEST_REDIS_URL so management commands and
+# multiple ASGI workers share one layer.
+ASGI_APPLICATION = 'finalyear.asgi.application'
+if os.environ.get('PROTEST_REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['PROTEST_REDIS_URL']], 'capacity': 1000},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {'capacity': 1000},
+        },
+    }
+
+# File-based cache shared by all workers for results keyed by data version
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analysis': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': PROTEST_CACHE_DIR / 'analysis',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
@@ -0,0 +1,52 @@
+"""
+Settings for the benchmark commands: the same project pointed at a stand-in PostGIS
+database that generate_synthetic_data fills with synthetic Nairobi data.
+
+    export DJANGO_SETTINGS_MODULE=finalyear.settings_bench
+    createdb protest_bench && psql protest_bench -c 'CREATE EXTENSION postgis'
+    python manage.py migrate
+    python manage.py generate_synthetic_data --events 100000
+    python manage.py bench_api --baseline cache/bench/benchmarks/baseline.json
+
+Load tests run against a server started with these settings, e.g.
+
+    gunicorn finalyear.wsgi --workers 4
+    python manage.py load_test --users 50 --duration 120
+
+Startup cost (import time, time to first request) of fresh processes:
+
+    python manage.py bench_startup --output startup.json
+
+PROTEST_BENCH_DB overrides the database name.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES, DATABASES
+
+
+DATABASES = {
+    'default': {**DATABASES['default'], 'NAME': os.environ.get('PROTEST_BENCH_DB', 'protest_bench')}
+}
+
+# DEBUG keeps every query in connection.queries, which skews timings of long runs
+DEBUG = False
+ALLOWED_HOSTS = ['localhost', '127.0.0.1']
+
+# Keep benchmark results and cached analyses apart from the real ones
+PROTEST_CACHE_DIR = BASE_DIR / 'cache' / 'bench'
+CACHES = {
+    **CACHES,
+    'analysis': {**CACHES['analysis'], 'LOCATION': PROTEST_CACHE_DIR / 'analysis'},
+}
+
+# Allows generate_synthetic_data to empty and reload the GIS tables
+PROTEST_BENCHMARK_DATABASE = True
+
+# trending-hashtags scrapes a local stub (started by manage.py load_test) instead of the
+# real trending sites, so load tests run offline
+PROTEST_SCRAPE_STUB_PORT = int(os.environ.get('PROTEST_SCRAPE_STUB_PORT', 8765))
+PROTEST_TRENDING_SOURCES = [
+    f'http://127.0.0.1:{PROTEST_SCRAPE_STUB_PORT}/twitter-trending-topics/kenya.html',
+    f'http://127.0.0.1:{PROTEST_SCRAPE_STUB_PORT}/kenya/',
+]
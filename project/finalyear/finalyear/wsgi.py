@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finalyear.settings')
 
 application = get_wsgi_application()
+
+from protest.warmup import warm_up_configured  # noqa: E402
+
+warm_up_configured()
@@ -0,0 +1,209 @@
+# protest/admin_performance.py
+"""
+Changelist performance mode for the admin of large geometry tables
+(settings.PROTEST_ADMIN_PERFORMANCE_MODE, on by default).
+
+- counts above EXACT_COUNT_THRESHOLD come from planner statistics (pg_class.reltuples
+  for the whole table, the EXPLAIN row estimate for a filtered list) instead of COUNT(*)
+- list_filter choices are cached per data version instead of a DISTINCT scan per page view
+
+Independently of the mode, the changelist defers geometry columns and computes derived
+list columns as SQL annotations (sortable, and no model property calls per row).
+"""
+import json
+
+from django.conf import settings
+from django.contrib.admin import AllValuesFieldListFilter
+from django.contrib.gis.admin import GISModelAdmin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import BooleanField, Case, CharField, ExpressionWrapper, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils.functional import cached_property
+
+from .versioning import versioned_cache_get_or_set
+
+
+EXACT_COUNT_THRESHOLD = 10000
+ANNOTATION_PREFIX = 'db_'
+
+
+def performance_mode():
+    return getattr(settings, 'PROTEST_ADMIN_PERFORMANCE_MODE', True)
+
+
+def estimated_count(queryset):
+    """
+    Planner row estimate for the queryset, or None when PostgreSQL has no statistics yet
+    """
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # reltuples is -1 (0 before PostgreSQL 14) until the table is first analyzed
+            return int(row[0]) if row and row[0] > 0 else None
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the planner estimate for large result sets and only runs
+    COUNT(*) when the estimate is small enough for the exact count to be cheap
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+
+class CachedAllValuesFieldListFilter(AllValuesFieldListFilter):
+    """
+    AllValuesFieldListFilter whose choices are computed once per data version of the model
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        if performance_mode() and field.model is model:
+            self.lookup_choices, _ = versioned_cache_get_or_set(
+                'admin-filter-choices',
+                (model,),
+                lambda: list(self.lookup_choices),
+                field_path,
+            )
+
+
+def level_case(field, thresholds, top_label, unknown_label='Unknown'):
+    """
+    SQL version of the models' `if not value: unknown / elif value < t: label ...` properties
+    """
+    return Case(
+        When(Q(**{f'{field}__isnull': True}) | Q(**{field: 0}), then=Value(unknown_label)),
+        *(When(**{f'{field}__lt': threshold}, then=Value(label)) for threshold, label in thresholds),
+        default=Value(top_label),
+        output_field=CharField(),
+    )
+
+
+def severity_level_expression():
+    """
+    ProtestEvents.severity_level
+    """
+    return Case(
+        When(Q(fatalities__isnull=True) | Q(fatalities=0), then=Value('Low')),
+        When(fatalities__lte=2, then=Value('Medium')),
+        When(fatalities__lte=5, then=Value('High')),
+        default=Value('Critical'),
+        output_field=CharField(),
+    )
+
+
+def has_fatalities_expression():
+    """
+    ProtestEvents.has_fatalities (NULL when fatalities is unknown)
+    """
+    return ExpressionWrapper(Q(fatalities__gt=0), output_field=BooleanField())
+
+
+RISK_FACTORS = (
+    ('poverty_ra', lambda value: Least(value / 10.0, Value(10.0))),
+    ('youth_unem', lambda value: Least(value / 5.0, Value(10.0))),
+    ('slum_house', lambda value: Least(value / 5.0, Value(10.0))),
+    ('pop_densit', lambda value: Least(value / 1000.0, Value(5.0))),
+    ('avg_educat', lambda value: Greatest(Value(0.0), (12.0 - value) / 2.0)),
+)
+
+
+def risk_assessment_expression():
+    """
+    MergedWards.risk_assessment. The average score is compared as score < limit * factors
+    so no division is needed.
+    """
+    present = {field: ~Q(**{f'{field}__isnull': True}) & ~Q(**{field: 0}) for field, _ in RISK_FACTORS}
+    present['protest_de'] = Q(protest_de__isnull=False)
+    contributions = [(field, points(F(field))) for field, points in RISK_FACTORS]
+    contributions.append(('protest_de', Least(F('protest_de') * 5.0, Value(15.0))))
+
+    score = sum(
+        (Case(When(present[field], then=points), default=Value(0.0), output_field=FloatField())
+         for field, points in contributions),
+        Value(0.0),
+    )
+    factors = sum(
+        (Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField())
+         for condition in present.values()),
+        Value(0),
+    )
+    return Case(
+        When(Q(risk_factors=0), then=Value('Unknown')),
+        When(Q(risk_score__lt=F('risk_factors') * 3), then=Value('Low Risk')),
+        When(Q(risk_score__lt=F('risk_factors') * 6), then=Value('Medium Risk')),
+        When(Q(risk_score__lt=F('risk_factors') * 9), then=Value('High Risk')),
+        default=Value('Critical Risk'),
+        output_field=CharField(),
+    ), {'risk_score': score, 'risk_factors': factors}
+
+
+class PerformanceModeAdmin(GISModelAdmin):
+    """
+    GISModelAdmin whose changelist defers changelist_defer and adds changelist_annotations
+    (name -> callable returning an expression, or (expression, aliases) it depends on)
+    as db_<name>; in performance mode it also paginates with estimated counts
+    """
+
+    changelist_defer = ('geom',)
+    changelist_annotations = {}
+
+    @property
+    def show_full_result_count(self):
+        # The "N total" link next to a filtered count is a second full COUNT(*)
+        return not performance_mode()
+
+    def is_changelist(self, request):
+        opts = self.model._meta
+        match = request.resolver_match
+        return match is not None and match.url_name == f'{opts.app_label}_{opts.model_name}_changelist'
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if not self.is_changelist(request):
+            return queryset
+        for name, build in self.changelist_annotations.items():
+            expression = build()
+            if isinstance(expression, tuple):
+                expression, aliases = expression
+                queryset = queryset.alias(**aliases)
+            queryset = queryset.annotate(**{ANNOTATION_PREFIX + name: expression})
+        return queryset.defer(*self.changelist_defer)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if performance_mode():
+            return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+
+
+def annotated_column(name, description, boolean=False):
+    """
+    List column reading the db_<name> annotation, falling back to the model property
+    where the queryset is not annotated (the change form's readonly fields)
+    """
+    def column(self, obj):
+        if hasattr(obj, ANNOTATION_PREFIX + name):
+            return getattr(obj, ANNOTATION_PREFIX + name)
+        return getattr(obj, name)
+    column.__name__ = name
+    column.short_description = description
+    column.admin_order_field = ANNOTATION_PREFIX + name
+    if boolean:
+        column.boolean = True
+    return column
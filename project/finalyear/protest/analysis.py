@@ -0,0 +1,213 @@
+# protest/analysis.py
+"""
+KDE risk surface, ward correlation and ward statistics behind the spatial-analysis and
+ward-statistics endpoints. Imported on first use (or by protest.warmup) so that
+processes serving only the GeoJSON layers never load SciPy and scikit-learn.
+"""
+import numpy as np
+from scipy import stats
+from scipy.spatial import cKDTree
+from sklearn.neighbors import KernelDensity
+
+from .bandwidth import project_to_metres, square_metres_per_square_degree
+from .metrics import timed
+from .police_weights import calculate_police_proximity_weights
+from .snapshot import get_ward_snapshot
+
+
+def snapshot_coordinates(snapshot):
+    """
+    (n, 2) lon/lat array of a point snapshot
+    """
+    return np.column_stack([snapshot['lon'], snapshot['lat']])
+
+
+@timed('kde')
+def perform_kde_analysis(protest_coords, police_coords, grid_size=50, bandwidth=None):
+    """
+    Perform Kernel Density Estimation on protest events.
+    The kernel works in projected metres; bandwidth is a get_kde_bandwidth() result.
+    """
+    if len(protest_coords) < 2 or not bandwidth or not bandwidth['bandwidth_m']:
+        return None
+    
+    # Create KDE model
+    x, y, origin = project_to_metres(protest_coords[:, 0], protest_coords[:, 1])
+    kde = KernelDensity(bandwidth=bandwidth['bandwidth_m'], kernel='gaussian')
+    kde.fit(np.c_[x, y])
+    
+    # Create grid for density estimation
+    x_min, x_max = protest_coords[:, 0].min() - 0.05, protest_coords[:, 0].max() + 0.05
+    y_min, y_max = protest_coords[:, 1].min() - 0.05, protest_coords[:, 1].max() + 0.05
+    
+    xx, yy = np.meshgrid(
+        np.linspace(x_min, x_max, grid_size),
+        np.linspace(y_min, y_max, grid_size)
+    )
+    
+    grid_points = np.c_[xx.ravel(), yy.ravel()]
+    
+    # Calculate density scores, per square degree as the frontend colour scales expect
+    grid_x, grid_y, _ = project_to_metres(grid_points[:, 0], grid_points[:, 1], origin)
+    log_density = kde.score_samples(np.c_[grid_x, grid_y])
+    density = (np.exp(log_density) * square_metres_per_square_degree(origin)).reshape(xx.shape)
+    
+    # Calculate police station proximity weights
+    proximity_weights = calculate_police_proximity_weights(grid_points, police_coords)
+    proximity_weights = proximity_weights.reshape(xx.shape)
+    
+    # Calculate weighted risk surface
+    risk_surface = density * (1 / (proximity_weights + 0.1))  # Higher risk when police are far
+    
+    # Prepare data for frontend
+    kde_data = {
+        'density_grid': density.tolist(),
+        'risk_surface': risk_surface.tolist(),
+        'proximity_weights': proximity_weights.tolist(),
+        'grid_bounds': {
+            'x_min': x_min, 'x_max': x_max,
+            'y_min': y_min, 'y_max': y_max
+        },
+        'grid_size': grid_size,
+        'bandwidth': {'method': bandwidth['method'], 'bandwidth_m': bandwidth['bandwidth_m']},
+        'hotspots': identify_hotspots(xx, yy, risk_surface)
+    }
+    
+    return kde_data
+
+def identify_hotspots(xx, yy, risk_surface, threshold_percentile=90):
+    """
+    Identify high-risk hotspots
+    """
+    threshold = np.percentile(risk_surface, threshold_percentile)
+    hotspot_indices = np.where(risk_surface >= threshold)
+    
+    hotspots = []
+    for i, j in zip(hotspot_indices[0], hotspot_indices[1]):
+        hotspots.append({
+            'longitude': xx[i, j],
+            'latitude': yy[i, j],
+            'risk_score': float(risk_surface[i, j]),
+            'intensity': float(risk_surface[i, j] / np.max(risk_surface))
+        })
+    
+    return hotspots
+
+# Query metric -> MergedWards column; zero counts as missing except for protest density
+CORRELATION_METRICS = {
+    'poverty_rate': 'poverty_ra',
+    'youth_unemployment': 'youth_unem',
+    'population_density': 'pop_densit',
+    'education_level': 'avg_educat',
+    'slum_housing': 'slum_house',
+    'protest_density': 'protest_de',
+}
+
+# Only the first wards in (county, subcounty, ward) order are correlated, as before
+CORRELATION_WARD_LIMIT = 30
+
+
+def perform_correlation_analysis(protests, metric):
+    """
+    Perform correlation analysis between protest intensity and socioeconomic factors using real ward data
+    """
+    correlation_data = []
+    wards = get_ward_snapshot()
+    
+    # Get socioeconomic value based on metric
+    field = CORRELATION_METRICS.get(metric)
+    count = min(len(wards['gids']), CORRELATION_WARD_LIMIT)
+    if field is None:
+        selected = np.zeros(count, dtype=bool)
+        socio_values = np.zeros(count)
+    else:
+        socio_values = wards[field][:count]
+        selected = ~np.isnan(socio_values)
+        if field != 'protest_de':
+            selected &= socio_values != 0
+    selected = np.flatnonzero(selected)
+    
+    # Calculate protest intensity around each ward centre
+    intensity = calculate_protest_intensity_for_location(
+        wards['centroid_lat'][selected], wards['centroid_lon'][selected], protests, radius_km=5
+    )
+    protest_intensity = intensity.tolist()
+    socioeconomic_values = socio_values[selected].tolist()
+    
+    for i, ward_intensity, socio_value in zip(selected, protest_intensity, socioeconomic_values):
+        correlation_data.append({
+            'protest_intensity': ward_intensity,
+            'socioeconomic_value': socio_value,
+            'ward': wards['full_location'][i],
+            'ward_id': int(wards['gids'][i]),
+            'risk_assessment': wards['risk_assessment'][i]
+        })
+    
+    # Calculate correlation
+    if len(protest_intensity) > 1:
+        correlation, p_value = stats.pearsonr(protest_intensity, socioeconomic_values)
+    else:
+        correlation, p_value = 0, 1
+    
+    return {
+        'correlation': float(correlation) if not np.isnan(correlation) else 0,
+        'p_value': float(p_value) if not np.isnan(p_value) else 1,
+        'data': correlation_data,
+        'sample_size': len(correlation_data)
+    }
+
+def calculate_protest_intensity_for_location(lat, lon, all_protests, radius_km=2):
+    """
+    Count protests within radius of each location (arrays), using the same
+    planar degree distance (x 111 km) as before
+    """
+    lat = np.atleast_1d(lat)
+    lon = np.atleast_1d(lon)
+    if not len(all_protests['lon']) or not len(lat):
+        return np.zeros(len(lat), dtype=np.int64)
+    
+    tree = cKDTree(np.column_stack([all_protests['lon'], all_protests['lat']]))
+    return tree.query_ball_point(np.column_stack([lon, lat]), r=radius_km / 111, return_length=True)
+
+
+def calculate_field_stats(wards, field_name):
+    """
+    Calculate statistics for a specific field
+    """
+    values = wards[field_name][~np.isnan(wards[field_name])]
+    
+    if not len(values):
+        return None
+    
+    return {
+        'mean': np.mean(values),
+        'median': np.median(values),
+        'std': np.std(values),
+        'min': np.min(values),
+        'max': np.max(values),
+        'count': len(values)
+    }
+
+def get_risk_distribution(wards):
+    """
+    Get distribution of risk levels across wards
+    """
+    risk_counts = {'Low Risk': 0, 'Medium Risk': 0, 'High Risk': 0, 'Critical Risk': 0, 'Unknown': 0}
+    
+    for risk_level in wards['risk_assessment']:
+        if risk_level in risk_counts:
+            risk_counts[risk_level] += 1
+    
+    return risk_counts
+
+def get_protest_density_distribution(wards):
+    """
+    Get distribution of protest density levels across wards
+    """
+    protest_counts = {'None': 0, 'Low': 0, 'Medium': 0, 'High': 0, 'Very High': 0, 'No Data': 0}
+    
+    for protest_level in wards['protest_density_level']:
+        if protest_level in protest_counts:
+            protest_counts[protest_level] += 1
+    
+    return protest_counts
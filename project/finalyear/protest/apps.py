@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ProtestConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'protest'
+
+    def ready(self):
+        from django.core.checks import Tags, register
+
+        from . import signals  # noqa: F401
+        from .triggers import check_triggers
+
+        register(check_triggers, Tags.database)
@@ -0,0 +1,210 @@
+# protest/autocorrelation.py
+"""
+Global Moran's I and local Moran (LISA) clusters for ward indicators.
+
+Contiguity weights are built once from the ward polygons in PostGIS and cached as a
+scipy.sparse matrix per ward data version. Permutation inference is vectorized: all
+global permutations are one sparse product, and local conditional permutations draw
+one shared random index matrix that is evaluated, for all wards with the same number
+of neighbours at once, as a single gather and mean.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.db import connection
+
+from .models import MergedWards
+from .versioning import versioned_cache_get_or_set
+
+
+WARD_INDICATORS = (
+    'poverty_ra', 'youth_unem', 'slum_house', 'avg_educat',
+    'pop_densit', 'dist_to_ci', 'protest_de', 'pop2009',
+)
+CONTIGUITY_TYPES = ('queen', 'rook')
+SIGNIFICANCE_LEVEL = 0.05
+PERMUTATION_SEED = 12345
+LISA_BLOCK_SIZE = 64
+
+QUADRANTS = {1: 'High-High', 2: 'Low-High', 3: 'Low-Low', 4: 'High-Low'}
+
+
+def compute_ward_weights(contiguity):
+    """
+    Binary contiguity between wards: queen shares any boundary point, rook a boundary segment
+    """
+    table = MergedWards._meta.db_table
+    shared = 'TRUE' if contiguity == 'queen' else 'ST_Dimension(ST_Intersection(a.geom, b.geom)) >= 1'
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT gid FROM {table} WHERE geom IS NOT NULL ORDER BY gid")
+        gids = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        cursor.execute(f"""
+            SELECT a.gid, b.gid
+            FROM {table} a
+            JOIN {table} b ON a.gid < b.gid AND a.geom && b.geom AND ST_Touches(a.geom, b.geom)
+            WHERE {shared}
+        """)
+        pairs = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+
+    rows = np.searchsorted(gids, pairs[:, 0])
+    columns = np.searchsorted(gids, pairs[:, 1])
+    size = len(gids)
+    weights = sparse.csr_matrix(
+        (np.ones(2 * len(pairs)), (np.concatenate([rows, columns]), np.concatenate([columns, rows]))),
+        shape=(size, size),
+    )
+    return {'gids': gids, 'weights': weights}
+
+
+def get_ward_weights(contiguity='queen'):
+    """
+    Ward contiguity weights, built once per ward data version
+    """
+    return versioned_cache_get_or_set(
+        'ward-weights',
+        (MergedWards,),
+        lambda: compute_ward_weights(contiguity),
+        contiguity,
+    )
+
+
+def row_standardize(weights):
+    neighbour_counts = np.asarray(weights.sum(axis=1)).ravel()
+    scale = np.divide(1.0, neighbour_counts, out=np.zeros_like(neighbour_counts), where=neighbour_counts > 0)
+    return sparse.diags(scale) @ weights, neighbour_counts.astype(np.int64)
+
+
+def folded_p_values(observed, simulated, permutations):
+    """
+    Pseudo p-values from the share of permutations at least as extreme (either tail)
+    """
+    larger = (simulated >= observed).sum(axis=-1)
+    larger = np.minimum(larger, permutations - larger)
+    return (larger + 1) / (permutations + 1)
+
+
+def global_moran(z, weights, permutations, rng):
+    """
+    Moran's I of deviations z with row-standardized weights, plus permutation inference
+    """
+    n = len(z)
+    s0 = weights.sum()
+    scale = n / s0 / (z @ z)
+    observed = scale * (z @ (weights @ z))
+
+    shuffled = rng.permuted(np.repeat(z[:, None], permutations, axis=1), axis=0)
+    simulated = scale * np.einsum('ij,ij->j', shuffled, np.asarray(weights @ shuffled))
+    return {
+        'I': round(float(observed), 6),
+        'expected_I': round(-1 / (n - 1), 6),
+        'z_score': round(float((observed - simulated.mean()) / simulated.std()), 4),
+        'p_value': round(float(folded_p_values(observed, simulated, permutations)), 4),
+    }
+
+
+def conditional_draws(rng, n, permutations, max_k):
+    """
+    (permutations x max_k) indices drawn without replacement from range(n - 1)
+    """
+    if n < 2 or not max_k:
+        return np.zeros((permutations, 0), dtype=np.int64)
+    return np.argsort(rng.random((permutations, n - 1)), axis=1)[:, :max_k]
+
+
+def local_moran(z, weights, neighbour_counts, permutations, rng):
+    """
+    Local Moran's I_i with conditional permutation: each ward's neighbours are replaced by
+    random draws from the other wards. One (permutations x max_k) draw from n - 1 values
+    is shared by every ward and shifted past the ward's own index.
+    """
+    n = len(z)
+    m2 = (z @ z) / n
+    lag = np.asarray(weights @ z).ravel()
+    observed = z * lag / m2
+
+    max_k = int(neighbour_counts.max()) if n else 0
+    draws = conditional_draws(rng, n, permutations, max_k)
+    p_values = np.ones(n)
+
+    # Wards with k neighbours share draws[:, :k]; (wards x permutations x k) per block
+    for k in np.unique(neighbour_counts[neighbour_counts > 0]):
+        wards = np.flatnonzero(neighbour_counts == k)
+        for start in range(0, len(wards), LISA_BLOCK_SIZE):
+            block = wards[start:start + LISA_BLOCK_SIZE]
+            indices = draws[None, :, :k]
+            indices = indices + (indices >= block[:, None, None])
+            simulated = z[block, None] * z[indices].mean(axis=2) / m2
+            p_values[block] = folded_p_values(observed[block, None], simulated, permutations)
+
+    quadrant = np.where(z > 0, np.where(lag > 0, 1, 4), np.where(lag > 0, 2, 3))
+    return observed, lag, p_values, quadrant
+
+
+def compute_autocorrelation(indicator, contiguity, permutations):
+    weights_data, _ = get_ward_weights(contiguity)
+    gids, weights = weights_data['gids'], weights_data['weights']
+
+    values = dict(
+        MergedWards.objects.filter(gid__in=gids.tolist(), **{f'{indicator}__isnull': False})
+        .values_list('gid', indicator)
+    )
+    names = dict(MergedWards.objects.filter(gid__in=gids.tolist()).values_list('gid', 'ward'))
+    keep = np.flatnonzero([int(gid) in values for gid in gids])
+    if len(keep) < 3:
+        raise ValueError(f'Not enough wards with {indicator} values')
+
+    gids = gids[keep]
+    x = np.array([values[int(gid)] for gid in gids], dtype=np.float64)
+    z = x - x.mean()
+    if not z.any():
+        raise ValueError(f'{indicator} has no variation across wards')
+
+    standardized, neighbour_counts = row_standardize(weights[keep][:, keep])
+    rng = np.random.default_rng(PERMUTATION_SEED)
+    moran = global_moran(z, standardized, permutations, rng)
+    local_i, lag, p_values, quadrant = local_moran(z, standardized, neighbour_counts, permutations, rng)
+
+    wards = []
+    cluster_counts = {label: 0 for label in (*QUADRANTS.values(), 'Not significant', 'Isolated')}
+    for i, gid in enumerate(gids):
+        if neighbour_counts[i] == 0:
+            cluster = 'Isolated'
+        elif p_values[i] <= SIGNIFICANCE_LEVEL:
+            cluster = QUADRANTS[int(quadrant[i])]
+        else:
+            cluster = 'Not significant'
+        cluster_counts[cluster] += 1
+        wards.append({
+            'gid': int(gid),
+            'ward': names.get(int(gid)),
+            'value': float(x[i]),
+            'spatial_lag': round(float(lag[i] + x.mean()), 6) if neighbour_counts[i] else None,
+            'local_I': round(float(local_i[i]), 6),
+            'p_value': round(float(p_values[i]), 4) if neighbour_counts[i] else None,
+            'neighbours': int(neighbour_counts[i]),
+            'cluster': cluster,
+        })
+
+    return {
+        'indicator': indicator,
+        'contiguity': contiguity,
+        'permutations': permutations,
+        'ward_count': len(gids),
+        'global': moran,
+        'cluster_counts': cluster_counts,
+        'wards': wards,
+    }
+
+
+def get_autocorrelation(indicator, contiguity='queen', permutations=999):
+    """
+    Moran's I and LISA clusters for a ward indicator, computed once per ward data version
+    """
+    return versioned_cache_get_or_set(
+        'ward-autocorrelation',
+        (MergedWards,),
+        lambda: compute_autocorrelation(indicator, contiguity, permutations),
+        indicator,
+        contiguity,
+        permutations,
+    )
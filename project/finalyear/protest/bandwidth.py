@@ -0,0 +1,157 @@
+# protest/bandwidth.py
+"""
+KDE bandwidth selection for protest events in local projected metres.
+
+Scott and Silverman are closed-form rules. 'cv' maximizes the leave-one-out
+log-likelihood over a geometric range of candidates around Scott's bandwidth,
+evaluated on binned counts with FFT convolution (one candidate per worker thread).
+The chosen bandwidth is cached per protest events data version.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+from .hotspots import METRES_PER_DEGREE_LAT, METRES_PER_DEGREE_LON
+from .models import ProtestEvents
+from .snapshot import get_event_snapshot
+from .versioning import versioned_cache_get_or_set
+
+
+BANDWIDTH_METHODS = ('scott', 'silverman', 'cv')
+CV_CANDIDATES = 24
+CV_RANGE = (0.05, 2.0)  # candidate bandwidths as multiples of Scott's rule
+CV_GRID_CELLS = 512  # bins along the longer side of the binned data
+KERNEL_RADIUS = 4  # Gaussian kernel truncated at this many bandwidths
+
+
+def project_to_metres(lon, lat, origin=None):
+    """
+    Equirectangular projection about the points' mean latitude, so distances are isotropic.
+    Returns (x, y, origin); pass origin back in to project other points the same way.
+    """
+    if origin is None:
+        origin = (float(np.mean(lon)), float(np.mean(lat)))
+    lon0, lat0 = origin
+    x = (np.asarray(lon) - lon0) * METRES_PER_DEGREE_LON * math.cos(math.radians(lat0))
+    y = (np.asarray(lat) - lat0) * METRES_PER_DEGREE_LAT
+    return x, y, origin
+
+
+def square_metres_per_square_degree(origin):
+    """
+    Area of one lon x lat square degree at the origin's latitude under project_to_metres()
+    """
+    return METRES_PER_DEGREE_LON * math.cos(math.radians(origin[1])) * METRES_PER_DEGREE_LAT
+
+
+def pooled_sigma(x, y, robust=False):
+    """
+    Pooled spread of both axes; robust uses min(std, IQR / 1.349) per axis as in Silverman's rule
+    """
+    spreads = []
+    for values in (x, y):
+        std = values.std(ddof=1)
+        iqr = np.subtract(*np.percentile(values, [75, 25])) / 1.349
+        spreads.append(min(std, iqr) if robust and iqr > 0 else std)
+    return math.sqrt((spreads[0] ** 2 + spreads[1] ** 2) / 2)
+
+
+# In two dimensions Scott's n^(-1/(d+4)) and Silverman's (n(d+2)/4)^(-1/(d+4)) factors
+# coincide, so the rules differ only in the spread estimate
+def scott_bandwidth(x, y):
+    return pooled_sigma(x, y) * len(x) ** (-1 / 6)
+
+
+def silverman_bandwidth(x, y):
+    return pooled_sigma(x, y, robust=True) * len(x) ** (-1 / 6)
+
+
+def bin_counts(x, y, cells=CV_GRID_CELLS):
+    """
+    Histogram points onto a square-celled grid with at most `cells` bins on the longer side
+    """
+    extent = max(np.ptp(x), np.ptp(y)) or 1.0
+    cell = extent / (cells - 1)
+    columns = np.round((x - x.min()) / cell).astype(np.int64)
+    rows = np.round((y - y.min()) / cell).astype(np.int64)
+    counts = np.zeros((rows.max() + 1, columns.max() + 1))
+    np.add.at(counts, (rows, columns), 1)
+    return counts, cell
+
+
+def loo_log_likelihood(counts, cell, bandwidth):
+    """
+    Leave-one-out log-likelihood of the binned points under a Gaussian KDE
+    """
+    radius = max(int(math.ceil(KERNEL_RADIUS * bandwidth / cell)), 1)
+    offsets = np.arange(-radius, radius + 1) * cell
+    kernel_1d = np.exp(-offsets ** 2 / (2 * bandwidth ** 2))
+    kernel = np.outer(kernel_1d, kernel_1d) / (2 * math.pi * bandwidth ** 2)
+
+    n = counts.sum()
+    occupied = counts > 0
+    smoothed = fftconvolve(counts, kernel, mode='same')[occupied]
+    # Remove each point's own kernel contribution. Isolated points fall to FFT round-off
+    # and are clamped, which only penalizes (never favours) undersmoothed candidates
+    leave_one_out = np.maximum(smoothed - kernel[radius, radius], 1e-300) / (n - 1)
+    return float((counts[occupied] * np.log(leave_one_out)).sum())
+
+
+def cv_bandwidth(x, y):
+    """
+    Candidate bandwidth maximizing the binned leave-one-out likelihood, with the score curve
+    """
+    reference = scott_bandwidth(x, y)
+    candidates = reference * np.geomspace(*CV_RANGE, CV_CANDIDATES)
+    counts, cell = bin_counts(x, y)
+    # Below about two cells per bandwidth the binning error dominates the score
+    candidates = candidates[candidates >= 2 * cell]
+    if not len(candidates):
+        return reference, []
+
+    with ThreadPoolExecutor(max_workers=min(len(candidates), os.cpu_count() or 1)) as pool:
+        scores = list(pool.map(lambda bandwidth: loo_log_likelihood(counts, cell, bandwidth), candidates))
+
+    best = int(np.argmax(scores))
+    curve = [
+        {'bandwidth_m': round(float(bandwidth), 1), 'log_likelihood': round(score, 3)}
+        for bandwidth, score in zip(candidates, scores)
+    ]
+    return float(candidates[best]), curve
+
+
+def compute_kde_bandwidth(method):
+    events = get_event_snapshot()
+    if len(events['lon']) < 2:
+        return {'method': method, 'bandwidth_m': None, 'event_count': len(events['lon'])}
+
+    x, y, _ = project_to_metres(events['lon'], events['lat'])
+    curve = None
+    if method == 'scott':
+        bandwidth = scott_bandwidth(x, y)
+    elif method == 'silverman':
+        bandwidth = silverman_bandwidth(x, y)
+    else:
+        bandwidth, curve = cv_bandwidth(x, y)
+
+    return {
+        'method': method,
+        'bandwidth_m': round(bandwidth, 1),
+        'event_count': int(len(x)),
+        'cv_scores': curve,
+    }
+
+
+def get_kde_bandwidth(method='scott'):
+    """
+    Selected bandwidth in metres, computed once per protest events data version
+    """
+    return versioned_cache_get_or_set(
+        'kde-bandwidth',
+        (ProtestEvents,),
+        lambda: compute_kde_bandwidth(method),
+        method,
+    )
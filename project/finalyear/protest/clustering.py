@@ -0,0 +1,239 @@
+# protest/clustering.py
+"""
+Density-based clustering of protest events (DBSCAN / HDBSCAN on a haversine BallTree).
+
+DBSCAN results are updated incrementally: the clustering state (neighbour counts,
+core flags and labels) is cached, and when the only change since the last run is
+newly appended events, just those events and their eps-neighbourhoods are processed.
+Insertions can only create or merge clusters, never split them, so this matches a
+full recompute up to the (order-dependent) assignment of border points.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import ConvexHull, QhullError
+from sklearn.cluster import HDBSCAN
+from sklearn.neighbors import BallTree
+
+from django.contrib.gis.geos import MultiPoint, Point
+from django.core.cache import caches
+
+from .columns import EARTH_RADIUS_KM, events_fingerprint, load_events
+from .models import ProtestEvents
+from .versioning import versioned_cache_get_or_set
+
+
+CLUSTER_ALGORITHMS = ('dbscan', 'hdbscan')
+NOISE = -1
+
+
+def to_radians(lon, lat):
+    return np.radians(np.column_stack([lat, lon]))
+
+
+def neighbour_pairs(neighbourhoods, offset=0):
+    """
+    Flatten query_radius output into (row, neighbour) index arrays
+    """
+    lengths = np.fromiter((len(n) for n in neighbourhoods), dtype=np.int64, count=len(neighbourhoods))
+    rows = np.repeat(np.arange(len(neighbourhoods), dtype=np.int64) + offset, lengths)
+    columns = np.concatenate(neighbourhoods).astype(np.int64) if lengths.sum() else np.zeros(0, dtype=np.int64)
+    return rows, columns
+
+
+def label_components(size, core, rows, columns, seed_labels=None):
+    """
+    Connect core points over eps-edges, then attach border points to a neighbouring core.
+    seed_labels (old labels, -1 for none) force points sharing a label into one component.
+    """
+    core_edges = core[rows] & core[columns]
+    edge_rows, edge_columns = rows[core_edges], columns[core_edges]
+    if seed_labels is not None:
+        # Chain each existing cluster's core members together so old clusters stay connected
+        labelled = np.flatnonzero(core & (seed_labels != NOISE))
+        ordered = labelled[np.argsort(seed_labels[labelled], kind='stable')]
+        same = seed_labels[ordered[1:]] == seed_labels[ordered[:-1]]
+        edge_rows = np.concatenate([edge_rows, ordered[:-1][same]])
+        edge_columns = np.concatenate([edge_columns, ordered[1:][same]])
+
+    graph = csr_matrix((np.ones(len(edge_rows)), (edge_rows, edge_columns)), shape=(size, size))
+    _, components = connected_components(graph, directed=False)
+
+    labels = np.full(size, NOISE, dtype=np.int64)
+    labels[core] = components[core]
+    if seed_labels is not None:
+        # Old border points keep the (possibly merged) cluster they belonged to
+        labelled_core = np.flatnonzero(core & (seed_labels != NOISE))
+        old_labels, first = np.unique(seed_labels[labelled_core], return_index=True)
+        representatives = labelled_core[first]
+        keep = np.flatnonzero(~core & (seed_labels != NOISE))
+        if len(old_labels) and len(keep):
+            positions = np.minimum(np.searchsorted(old_labels, seed_labels[keep]), len(old_labels) - 1)
+            found = old_labels[positions] == seed_labels[keep]
+            labels[keep[found]] = labels[representatives[positions[found]]]
+
+    border = (~core[rows]) & core[columns] & (labels[rows] == NOISE)
+    border_rows, border_columns = rows[border], columns[border]
+    unique_rows, first = np.unique(border_rows, return_index=True)
+    labels[unique_rows] = labels[border_columns[first]]
+    return labels
+
+
+def dbscan_full(events, eps_rad, min_samples):
+    points = to_radians(events['lon'], events['lat'])
+    size = len(points)
+    if size == 0:
+        return {**events, 'counts': np.zeros(0, dtype=np.int64), 'core': np.zeros(0, bool), 'labels': np.zeros(0, dtype=np.int64)}
+
+    neighbourhoods = BallTree(points, metric='haversine').query_radius(points, r=eps_rad)
+    rows, columns = neighbour_pairs(neighbourhoods)
+    counts = np.bincount(rows, minlength=size)
+    core = counts >= min_samples
+    return {**events, 'counts': counts, 'core': core, 'labels': label_components(size, core, rows, columns)}
+
+
+def dbscan_insert(state, new_events, eps_rad, min_samples):
+    """
+    Add appended events to a cached DBSCAN state without revisiting unaffected points
+    """
+    old_size = len(state['gids'])
+    new_size = len(new_events['gids'])
+    if new_size == 0:
+        return state
+    if old_size == 0:
+        return dbscan_full(new_events, eps_rad, min_samples)
+
+    old_points = to_radians(state['lon'], state['lat'])
+    new_points = to_radians(new_events['lon'], new_events['lat'])
+    old_tree = BallTree(old_points, metric='haversine')
+
+    # New -> old and new -> new neighbourhoods (indices into the combined arrays)
+    new_old_rows, new_old_columns = neighbour_pairs(old_tree.query_radius(new_points, r=eps_rad), offset=old_size)
+    new_new_rows, new_new_columns = neighbour_pairs(
+        BallTree(new_points, metric='haversine').query_radius(new_points, r=eps_rad), offset=old_size
+    )
+    new_new_columns = new_new_columns + old_size
+
+    size = old_size + new_size
+    counts = np.concatenate([state['counts'], np.zeros(new_size, dtype=np.int64)])
+    counts += np.bincount(new_old_columns, minlength=size)
+    counts += np.bincount(new_new_rows, minlength=size) + np.bincount(new_old_rows, minlength=size)
+    core = counts >= min_samples
+
+    # Old points that just became core need their old -> old neighbourhoods too
+    promoted = np.flatnonzero(core[:old_size] & ~state['core'])
+    if len(promoted):
+        promoted_rows, promoted_columns = neighbour_pairs(old_tree.query_radius(old_points[promoted], r=eps_rad))
+        promoted_rows = promoted[promoted_rows]
+    else:
+        # The usual append: no old point crossed min_samples (BallTree rejects an empty query)
+        promoted_rows = promoted_columns = np.zeros(0, dtype=np.int64)
+
+    # Every edge that can change connectivity touches a new point or a newly core point
+    rows = np.concatenate([new_old_rows, new_old_columns, new_new_rows, promoted_rows, promoted_columns])
+    columns = np.concatenate([new_old_columns, new_old_rows, new_new_columns, promoted_columns, promoted_rows])
+
+    seed_labels = np.concatenate([state['labels'], np.full(new_size, NOISE, dtype=np.int64)])
+    labels = label_components(size, core, rows, columns, seed_labels=seed_labels)
+
+    merged = {key: np.concatenate([state[key], new_events[key]]) for key in ('gids', 'lon', 'lat', 'fatalities', 'dates')}
+    return {**merged, 'counts': counts, 'core': core, 'labels': labels}
+
+
+def hdbscan_labels(events, min_samples):
+    if len(events['gids']) < 2:
+        return np.full(len(events['gids']), NOISE, dtype=np.int64)
+    model = HDBSCAN(min_cluster_size=max(min_samples, 2), metric='haversine')
+    return model.fit_predict(to_radians(events['lon'], events['lat'])).astype(np.int64)
+
+
+def cluster_hull(lon, lat):
+    """
+    Convex hull of a cluster as GeoJSON (a point or line for degenerate clusters)
+    """
+    points = np.unique(np.column_stack([lon, lat]), axis=0)
+    if len(points) >= 3:
+        try:
+            ring = points[ConvexHull(points).vertices].tolist()
+            return {'type': 'Polygon', 'coordinates': [ring + [ring[0]]]}
+        except QhullError:
+            pass
+    hull = MultiPoint([Point(x, y) for x, y in points.tolist()], srid=4326).convex_hull
+    return {'type': hull.geom_type, 'coordinates': hull.coords}
+
+
+def summarize_clusters(events, labels, core=None):
+    clusters = []
+    for cluster_id, label in enumerate(np.unique(labels[labels != NOISE])):
+        members = labels == label
+        dates = events['dates'][members]
+        dates = dates[~np.isnat(dates)]
+        clusters.append({
+            'cluster_id': cluster_id,
+            'member_count': int(members.sum()),
+            'core_count': int(core[members].sum()) if core is not None else None,
+            'fatalities': int(events['fatalities'][members].sum()),
+            'centroid': [float(events['lon'][members].mean()), float(events['lat'][members].mean())],
+            'first_date': str(dates.min()) if len(dates) else None,
+            'last_date': str(dates.max()) if len(dates) else None,
+            'hull': cluster_hull(events['lon'][members], events['lat'][members]),
+        })
+    clusters.sort(key=lambda cluster: cluster['member_count'], reverse=True)
+    return {
+        'clusters': clusters,
+        'cluster_count': len(clusters),
+        'event_count': int(len(labels)),
+        'noise_count': int((labels == NOISE).sum()),
+    }
+
+
+def incremental_dbscan(eps_km, min_samples, start_date, end_date):
+    """
+    Update (or build) the cached DBSCAN state for these parameters and summarize it
+    """
+    cache = caches['analysis']
+    state_key = f"protest-clusters-state:{eps_km}:{min_samples}:{start_date or ''}:{end_date or ''}"
+    eps_rad = eps_km / EARTH_RADIUS_KM
+    state = cache.get(state_key)
+    mode = 'full'
+
+    if state is not None and len(state['gids']):
+        max_gid = int(state['gids'].max())
+        if events_fingerprint(start_date, end_date, max_gid) == state['fingerprint']:
+            state = dbscan_insert(state, load_events(start_date, end_date, after_gid=max_gid), eps_rad, min_samples)
+            mode = 'incremental'
+        else:
+            state = None
+    else:
+        state = None
+
+    if state is None:
+        state = dbscan_full(load_events(start_date, end_date), eps_rad, min_samples)
+
+    if len(state['gids']):
+        state['fingerprint'] = events_fingerprint(start_date, end_date, int(state['gids'].max()))
+    cache.set(state_key, state)
+    return {**summarize_clusters(state, state['labels'], state['core']), 'update_mode': mode}
+
+
+def compute_clusters(algorithm, eps_km, min_samples, start_date, end_date):
+    if algorithm == 'dbscan':
+        return incremental_dbscan(eps_km, min_samples, start_date, end_date)
+    events = load_events(start_date, end_date)
+    return {**summarize_clusters(events, hdbscan_labels(events, min_samples)), 'update_mode': 'full'}
+
+
+def get_protest_clusters(algorithm, eps_km, min_samples, start_date=None, end_date=None):
+    """
+    Cluster summaries, computed once per protest events data version
+    """
+    return versioned_cache_get_or_set(
+        'protest-clusters',
+        (ProtestEvents,),
+        lambda: compute_clusters(algorithm, eps_km, min_samples, start_date, end_date),
+        algorithm,
+        eps_km,
+        min_samples,
+        start_date or '',
+        end_date or '',
+    )
@@ -0,0 +1,104 @@
+# protest/columns.py
+"""
+Column arrays read from the GIS tables with values_list() and PostGIS point accessors,
+without model instances or GEOS geometries.
+
+Only NumPy and the ORM are needed here, so protest.snapshot can load the event and
+police columns without importing the scikit-learn/SciPy modules that analyse them
+(clustering, proximity, hexbins).
+"""
+import numpy as np
+
+from django.db import connection
+from django.db.models import FloatField, Func
+
+from .models import PoliceStn, ProtestEvents
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class PointX(Func):
+    template = 'ST_X(ST_PointOnSurface(%(expressions)s))'
+    output_field = FloatField()
+
+
+class PointY(Func):
+    template = 'ST_Y(ST_PointOnSurface(%(expressions)s))'
+    output_field = FloatField()
+
+
+def station_table():
+    """
+    Return (gids, names, lon, lat) for police stations
+    """
+    rows = list(
+        PoliceStn.objects.filter(geom__isnull=False).order_by('gid')
+        .annotate(lon=PointX('geom'), lat=PointY('geom')).values_list('gid', 'name', 'lon', 'lat')
+    )
+    gids = np.array([row[0] for row in rows], dtype=np.int64)
+    names = [row[1] or f"Police Station {row[0]}" for row in rows]
+    lon = np.array([row[2] for row in rows], dtype=np.float64)
+    lat = np.array([row[3] for row in rows], dtype=np.float64)
+    return gids, names, lon, lat
+
+
+def filtered_events(start_date=None, end_date=None):
+    """
+    Events with a geometry, optionally limited to an event_date range
+    """
+    events = ProtestEvents.objects.filter(geom__isnull=False)
+    if start_date:
+        events = events.filter(event_date__gte=start_date)
+    if end_date:
+        events = events.filter(event_date__lte=end_date)
+    return events
+
+
+def event_coordinates(start_date=None, end_date=None):
+    """
+    Return (gids, lon, lat) arrays for protest events without building model instances
+    """
+    events = filtered_events(start_date, end_date)
+    rows = events.order_by().annotate(lon=PointX('geom'), lat=PointY('geom')).values_list('gid', 'lon', 'lat')
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+    return data[:, 0].astype(np.int64), data[:, 1], data[:, 2]
+
+
+def load_events(start_date=None, end_date=None, after_gid=None):
+    """
+    Column arrays for the filtered events, ordered by gid
+    """
+    events = filtered_events(start_date, end_date)
+    if after_gid is not None:
+        events = events.filter(gid__gt=after_gid)
+    rows = list(
+        events.order_by('gid').annotate(lon=PointX('geom'), lat=PointY('geom'))
+        .values_list('gid', 'lon', 'lat', 'fatalities', 'event_date')
+    )
+    return {
+        'gids': np.array([row[0] for row in rows], dtype=np.int64),
+        'lon': np.array([row[1] for row in rows], dtype=np.float64),
+        'lat': np.array([row[2] for row in rows], dtype=np.float64),
+        'fatalities': np.array([row[3] or 0 for row in rows], dtype=np.int64),
+        'dates': np.array([row[4] for row in rows], dtype='datetime64[D]'),
+    }
+
+
+def events_fingerprint(start_date, end_date, max_gid):
+    """
+    Row count and content checksum of the filtered events up to max_gid.
+    If it is unchanged, everything since the last run was an append.
+    """
+    events = filtered_events(start_date, end_date).filter(gid__lte=max_gid)
+    sql, params = events.values('gid').query.sql_with_params()
+    table = ProtestEvents._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT count(*), COALESCE(sum(hashtextextended(concat_ws('|',
+                e.gid, ST_X(e.geom), ST_Y(e.geom), e.fatalities, e.event_date), 0)), 0)
+            FROM {table} e
+            WHERE e.gid IN ({sql})
+        """, params)
+        count, checksum = cursor.fetchone()
+    return int(count), str(checksum)
@@ -0,0 +1,35 @@
+# protest/consumers.py
+"""
+WebSocket endpoint for live protest event updates (messages are described in protest/live.py).
+"""
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .encoders import dumps
+from .live import GROUP
+from .versioning import TRACKED_MODELS, get_data_version
+
+
+@database_sync_to_async
+def current_versions():
+    return {model._meta.db_table: get_data_version(model) for model in TRACKED_MODELS}
+
+
+class ProtestEventsConsumer(AsyncWebsocketConsumer):
+    """
+    Joins the broadcast group and forwards its pre-encoded messages unchanged. On connect
+    the client gets the current data versions, so it can tell whether its cached layers
+    went stale while it was disconnected.
+    """
+
+    async def connect(self):
+        await self.channel_layer.group_add(GROUP, self.channel_name)
+        await self.accept()
+        versions = await current_versions()
+        await self.send(text_data=dumps({'type': 'versions', 'versions': versions}).decode('utf-8'))
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(GROUP, self.channel_name)
+
+    async def live_message(self, event):
+        await self.send(text_data=event['text'])
@@ -0,0 +1,100 @@
+# protest/coverage.py
+"""
+Dissolved geodesic coverage buffers around hospitals / police stations, with per-ward coverage.
+"""
+import json
+
+from django.db import connection
+
+from .facilities import FACILITY_MODELS
+from .models import MergedWards
+from .versioning import versioned_cache_get_or_set
+
+
+def compute_coverage(facility_type, radius_km):
+    """
+    Buffer every facility by radius_km on the spheroid, dissolve with ST_Union and measure
+    the covered / uncovered area and population (assuming uniform density) of each ward.
+    """
+    facility_table = FACILITY_MODELS[facility_type]._meta.db_table
+    ward_table = MergedWards._meta.db_table
+    radius_m = radius_km * 1000
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT ST_AsEWKB(u.geom), ST_AsGeoJSON(u.geom, 6), ST_Area(u.geom::geography), u.facilities
+            FROM (
+                SELECT ST_Union(ST_Buffer(geom::geography, %s)::geometry) AS geom, count(*) AS facilities
+                FROM {facility_table}
+                WHERE geom IS NOT NULL
+            ) u
+        """, [radius_m])
+        union_ewkb, union_geojson, covered_m2, facility_count = cursor.fetchone()
+
+        wards = []
+        if union_ewkb is not None:
+            cursor.execute(f"""
+                SELECT
+                    w.gid, w.ward, w.subcounty, w.pop2009,
+                    ST_Area(w.geom::geography),
+                    CASE WHEN ST_Intersects(w.geom, c.geom)
+                         THEN ST_Area(ST_Intersection(w.geom, c.geom)::geography)
+                         ELSE 0 END
+                FROM {ward_table} w, (SELECT ST_GeomFromEWKB(%s) AS geom) c
+                WHERE w.geom IS NOT NULL
+                ORDER BY w.gid
+            """, [bytes(union_ewkb)])
+            wards = cursor.fetchall()
+
+    ward_rows = []
+    totals = {'area_km2': 0.0, 'covered_km2': 0.0, 'population': 0, 'covered_population': 0.0}
+    for gid, ward, subcounty, population, area_m2, ward_covered_m2 in wards:
+        fraction = ward_covered_m2 / area_m2 if area_m2 else 0.0
+        population = population or 0
+        covered_population = population * fraction
+        ward_rows.append({
+            'gid': gid,
+            'ward': ward,
+            'subcounty': subcounty,
+            'area_km2': round(area_m2 / 1e6, 3),
+            'covered_km2': round(ward_covered_m2 / 1e6, 3),
+            'uncovered_km2': round((area_m2 - ward_covered_m2) / 1e6, 3),
+            'covered_pct': round(fraction * 100, 1),
+            'population': population,
+            'covered_population': round(covered_population),
+            'uncovered_population': round(population - covered_population),
+        })
+        totals['area_km2'] += area_m2 / 1e6
+        totals['covered_km2'] += ward_covered_m2 / 1e6
+        totals['population'] += population
+        totals['covered_population'] += covered_population
+
+    return {
+        'facility_type': facility_type,
+        'radius_km': radius_km,
+        'facility_count': facility_count,
+        'coverage': json.loads(union_geojson) if union_geojson else None,
+        'coverage_area_km2': round((covered_m2 or 0) / 1e6, 3),
+        'totals': {
+            'ward_area_km2': round(totals['area_km2'], 3),
+            'covered_km2': round(totals['covered_km2'], 3),
+            'uncovered_km2': round(totals['area_km2'] - totals['covered_km2'], 3),
+            'population': totals['population'],
+            'covered_population': round(totals['covered_population']),
+            'uncovered_population': round(totals['population'] - totals['covered_population']),
+        },
+        'wards': ward_rows,
+    }
+
+
+def get_coverage(facility_type, radius_km):
+    """
+    Coverage for a facility type and radius, computed once per facility/ward data version
+    """
+    return versioned_cache_get_or_set(
+        'coverage',
+        (FACILITY_MODELS[facility_type], MergedWards),
+        lambda: compute_coverage(facility_type, radius_km),
+        facility_type,
+        radius_km,
+    )
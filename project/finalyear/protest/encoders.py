@@ -0,0 +1,117 @@
+# protest/encoders.py
+"""
+Tuple-based GeoJSON encoding for the protest events endpoint.
+
+Produces the same FeatureCollection as ProtestEventsSerializer without
+instantiating models, GEOS geometries or DRF fields per row.
+"""
+import json
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.utils import timezone
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+# Column order matches the properties emitted by ProtestEventsSerializer
+PROTEST_EVENT_COLUMNS = ('gid', 'event_date', 'year', 'latitude', 'longitude', 'fatalities', 'timestamp', 'geometry')
+
+# Matches the decimal_places of ProtestEvents.latitude / longitude
+COORDINATE_QUANTUM = Decimal('1e-8')
+
+# ST_AsGeoJSON precision; enough digits to round-trip the stored doubles
+GEOJSON_PRECISION = 15
+
+
+if orjson is not None:
+    dumps = orjson.dumps
+else:
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def protest_event_rows(queryset):
+    """
+    Turn a ProtestEvents queryset into lightweight tuples with SQL-side GeoJSON geometry
+    """
+    return queryset.annotate(
+        geometry=AsGeoJSON('geom', precision=GEOJSON_PRECISION)
+    ).values_list(*PROTEST_EVENT_COLUMNS)
+
+
+def format_decimal(value):
+    """
+    Same string form as DRF's DecimalField with COERCE_DECIMAL_TO_STRING
+    """
+    if value is None:
+        return None
+    return '{:f}'.format(Decimal(value).quantize(COORDINATE_QUANTUM))
+
+
+def legacy_timestamp(value):
+    """
+    Legacy tables store epoch seconds (or milliseconds) in protest_events.timestamp until
+    protest/sql/convert_timestamp_column.sql has run; return those as aware UTC datetimes
+    (None if out of range) and anything else unchanged
+    """
+    if not isinstance(value, (int, float, Decimal)) or isinstance(value, bool):
+        return value
+    seconds = float(value)
+    if abs(seconds) > 1e11:
+        seconds /= 1000.0
+    try:
+        return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def format_datetime(value):
+    """
+    Same string form as DRF's DateTimeField: current timezone, 'Z' for UTC
+    """
+    value = legacy_timestamp(value)
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def encode_feature(row):
+    """
+    Encode one protest_event_rows() tuple as a GeoJSON Feature
+    """
+    gid, event_date, year, latitude, longitude, fatalities, timestamp, geometry = row
+    properties = {
+        'event_date': event_date.isoformat() if event_date is not None else None,
+        'year': year,
+        'latitude': format_decimal(latitude),
+        'longitude': format_decimal(longitude),
+        'fatalities': fatalities,
+        'timestamp': format_datetime(timestamp),
+    }
+    geometry = geometry.encode('utf-8') if geometry is not None else b'null'
+    return b'{"id":%d,"type":"Feature","geometry":%s,"properties":%s}' % (gid, geometry, dumps(properties))
+
+
+def encode_feature_collection(rows, count=None, next_link=None, previous_link=None, paginated=False):
+    """
+    Encode rows as a FeatureCollection. With paginated=True the envelope matches GeoJsonPagination.
+    """
+    features = b','.join(encode_feature(row) for row in rows)
+    if not paginated:
+        return b'{"type":"FeatureCollection","features":[%s]}' % features
+    return b'{"type":"FeatureCollection","count":%s,"next":%s,"previous":%s,"features":[%s]}' % (
+        dumps(count),
+        dumps(next_link),
+        dumps(previous_link),
+        features,
+    )
@@ -0,0 +1,63 @@
+# protest/facilities.py
+"""
+Nearest hospital / police station lookups using PostGIS KNN ordering.
+"""
+from django.db import connection
+
+from .models import NairobiHospitals, PoliceStn
+
+
+FACILITY_MODELS = {
+    'hospital': NairobiHospitals,
+    'police': PoliceStn,
+}
+
+# KNN ordering on SRID 4326 is planar in degrees, so its order can differ from the
+# geodesic one; a few extra candidates make it unlikely (not impossible, e.g. for
+# facilities far apart in longitude) that the re-ranking misses a true neighbour
+CANDIDATE_PADDING = 3
+
+
+def nearest_facilities(points, facility_type, k=5):
+    """
+    Return the k nearest facilities for every (lon, lat) in points.
+    One query handles the whole batch via a LATERAL KNN join, using the GiST index on geom.
+    """
+    model = FACILITY_MODELS[facility_type]
+    table = model._meta.db_table
+    longitudes = [float(lon) for lon, lat in points]
+    latitudes = [float(lat) for lon, lat in points]
+
+    sql = f"""
+        SELECT q.idx, f.gid, f.name, ST_X(f.location), ST_Y(f.location), f.distance_m
+        FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS q(lon, lat, idx)
+        CROSS JOIN LATERAL (
+            SELECT
+                t.gid,
+                t.name,
+                ST_PointOnSurface(t.geom) AS location,
+                ST_Distance(t.geom::geography, ST_SetSRID(ST_MakePoint(q.lon, q.lat), 4326)::geography) AS distance_m
+            FROM {table} t
+            WHERE t.geom IS NOT NULL
+            ORDER BY t.geom <-> ST_SetSRID(ST_MakePoint(q.lon, q.lat), 4326)
+            LIMIT %s
+        ) f
+        ORDER BY q.idx, f.distance_m
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [longitudes, latitudes, k + CANDIDATE_PADDING])
+        rows = cursor.fetchall()
+
+    results = [[] for _ in points]
+    for idx, gid, name, longitude, latitude, distance_m in rows:
+        ranked = results[idx - 1]
+        if len(ranked) < k:
+            ranked.append({
+                'rank': len(ranked) + 1,
+                'gid': gid,
+                'name': name or f"{facility_type.title()} {gid}",
+                'latitude': latitude,
+                'longitude': longitude,
+                'distance_m': round(distance_m, 1),
+            })
+    return results
@@ -0,0 +1,291 @@
+# protest/forecast.py
+"""
+Ward-level protest risk forecast: a Poisson regression on ward indicators plus lagged
+monthly protest counts, trained offline (manage.py train_risk_model) and saved as an
+.npz artifact. Workers load the artifact once and score every ward with one matrix product.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from sklearn.linear_model import PoissonRegressor
+
+from django.conf import settings
+from django.db import connection
+
+from .models import MergedWards, ProtestEvents
+from .versioning import get_data_version, versioned_cache_get_or_set
+
+
+WARD_FEATURES = ('poverty_ra', 'youth_unem', 'slum_house', 'avg_educat', 'pop_densit', 'dist_to_ci')
+LAG_FEATURES = ('lag_1', 'lag_2', 'lag_3', 'mean_12', 'fatalities_3')
+FEATURE_NAMES = WARD_FEATURES + LAG_FEATURES
+MIN_HISTORY_MONTHS = 3
+HOLDOUT_MONTHS = 6
+MODEL_ALPHA = 1e-3
+
+RISK_LEVELS = ((0.75, 'Very High'), (0.5, 'High'), (0.25, 'Medium'), (0.0, 'Low'))
+
+
+def model_path():
+    return os.path.join(settings.PROTEST_CACHE_DIR, 'risk_model.npz')
+
+
+def month_label(month_index):
+    year, month = divmod(int(month_index), 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+def ward_table():
+    """
+    Return (gids, names, static feature matrix with NaN for missing values)
+    """
+    rows = list(
+        MergedWards.objects.filter(geom__isnull=False).order_by('gid')
+        .values_list('gid', 'ward', *WARD_FEATURES)
+    )
+    gids = np.array([row[0] for row in rows], dtype=np.int64)
+    names = [row[1] for row in rows]
+    static = np.array([[np.nan if value is None else value for value in row[2:]] for row in rows], dtype=np.float64)
+    static = static.reshape(len(rows), len(WARD_FEATURES))
+    # Population density is heavy-tailed
+    density = WARD_FEATURES.index('pop_densit')
+    static[:, density] = np.log1p(static[:, density])
+    return gids, names, static
+
+
+def monthly_ward_counts(gids):
+    """
+    Dense (ward x month) event and fatality counts from the first to the last month with events
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT w.gid,
+                   (date_part('year', e.event_date) * 12 + date_part('month', e.event_date) - 1)::int AS month,
+                   count(*), COALESCE(sum(e.fatalities), 0)
+            FROM {MergedWards._meta.db_table} w
+            JOIN {ProtestEvents._meta.db_table} e
+                ON e.geom IS NOT NULL AND e.event_date IS NOT NULL AND ST_Covers(w.geom, e.geom)
+            WHERE w.geom IS NOT NULL
+            GROUP BY 1, 2
+        """)
+        rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 4)
+
+    if not len(rows):
+        return np.zeros((len(gids), 0)), np.zeros((len(gids), 0)), None
+    first_month = int(rows[:, 1].min())
+    months = int(rows[:, 1].max()) - first_month + 1
+    ward_index = np.searchsorted(gids, rows[:, 0])
+    counts = np.zeros((len(gids), months))
+    fatalities = np.zeros((len(gids), months))
+    counts[ward_index, rows[:, 1] - first_month] = rows[:, 2]
+    fatalities[ward_index, rows[:, 1] - first_month] = rows[:, 3]
+    return counts, fatalities, first_month
+
+
+def lag_features(counts, fatalities, month):
+    """
+    Lagged features (wards x LAG_FEATURES) for predicting column `month` from earlier columns
+    """
+    def window(array, size):
+        start = max(month - size, 0)
+        return array[:, start:month] if month > start else np.zeros((len(array), 1))
+
+    def lag(k):
+        return counts[:, month - k] if month - k >= 0 else np.zeros(len(counts))
+
+    return np.log1p(np.column_stack([
+        lag(1), lag(2), lag(3),
+        window(counts, 12).mean(axis=1),
+        window(fatalities, 3).sum(axis=1),
+    ]))
+
+
+def training_panel(static, counts, fatalities):
+    """
+    Stack (ward, month) rows for every month with enough history. Returns (X, y, month of each row).
+    """
+    features, targets, months = [], [], []
+    for month in range(MIN_HISTORY_MONTHS, counts.shape[1]):
+        features.append(np.hstack([static, lag_features(counts, fatalities, month)]))
+        targets.append(counts[:, month])
+        months.append(np.full(len(counts), month))
+    if not features:
+        raise ValueError(f'Need at least {MIN_HISTORY_MONTHS + 1} months of events to train')
+    return np.vstack(features), np.concatenate(targets), np.concatenate(months)
+
+
+def poisson_d2(y, predicted, baseline):
+    """
+    Share of Poisson deviance explained relative to a constant baseline prediction
+    """
+    def deviance(mu):
+        mu = np.maximum(mu, 1e-12)
+        terms = np.where(y > 0, y * np.log(np.where(y > 0, y, 1) / mu), 0) - (y - mu)
+        return 2 * terms.sum()
+    null = deviance(np.full(len(y), baseline))
+    return 1 - deviance(predicted) / null if null else None
+
+
+class RiskModel:
+    """
+    Standardized linear predictor with a log link; score() is one NumPy expression
+    """
+
+    def __init__(self, mean, scale, fill, coef, intercept, metadata, mtime=None):
+        self.mean = mean
+        self.scale = scale
+        self.fill = fill
+        self.coef = coef
+        self.intercept = intercept
+        self.metadata = metadata
+        self.mtime = mtime
+
+    @classmethod
+    def fit(cls, X, y):
+        fill = np.nanmean(X, axis=0)
+        fill = np.where(np.isnan(fill), 0, fill)
+        X = np.where(np.isnan(X), fill, X)
+        mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale == 0] = 1
+        regressor = PoissonRegressor(alpha=MODEL_ALPHA, max_iter=500)
+        regressor.fit((X - mean) / scale, y)
+        return cls(mean, scale, fill, regressor.coef_, float(regressor.intercept_), {})
+
+    def score(self, X):
+        """
+        Expected event counts for each row of X
+        """
+        X = np.where(np.isnan(X), self.fill, X)
+        return np.exp(((X - self.mean) / self.scale) @ self.coef + self.intercept)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = path + '.tmp.npz'
+        np.savez(
+            temporary_path,
+            features=np.array(FEATURE_NAMES),
+            mean=self.mean, scale=self.scale, fill=self.fill, coef=self.coef,
+            intercept=np.array(self.intercept),
+            metadata=np.array(json.dumps(self.metadata)),
+        )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if tuple(data['features'].tolist()) != FEATURE_NAMES:
+                raise ValueError('Risk model was trained on different features; run manage.py train_risk_model')
+            return cls(
+                data['mean'], data['scale'], data['fill'], data['coef'], float(data['intercept']),
+                json.loads(str(data['metadata'])), mtime=os.path.getmtime(path),
+            )
+
+
+def train_risk_model():
+    """
+    Fit on all but the last HOLDOUT_MONTHS for evaluation, then refit on everything and save
+    """
+    started = time.perf_counter()
+    gids, _, static = ward_table()
+    counts, fatalities, first_month = monthly_ward_counts(gids)
+    X, y, months = training_panel(static, counts, fatalities)
+    panel_seconds = time.perf_counter() - started
+
+    holdout_d2 = None
+    cutoff = months.max() - HOLDOUT_MONTHS
+    train = months <= cutoff
+    if train.any() and (~train).any():
+        holdout_model = RiskModel.fit(X[train], y[train])
+        holdout_d2 = poisson_d2(y[~train], holdout_model.score(X[~train]), y[train].mean())
+
+    started = time.perf_counter()
+    model = RiskModel.fit(X, y)
+    fit_seconds = time.perf_counter() - started
+
+    model.metadata = {
+        'trained_at': datetime.now(dt_timezone.utc).isoformat(),
+        'data_version': get_data_version(MergedWards, ProtestEvents),
+        'first_month': month_label(first_month),
+        'last_month': month_label(first_month + counts.shape[1] - 1),
+        'training_rows': int(len(y)),
+        'ward_count': int(len(gids)),
+        'holdout_months': HOLDOUT_MONTHS,
+        'holdout_d2': round(float(holdout_d2), 4) if holdout_d2 is not None else None,
+        'coefficients': {name: round(float(value), 4) for name, value in zip(FEATURE_NAMES, model.coef)},
+    }
+    model.save(model_path())
+    return model, {'panel_seconds': panel_seconds, 'fit_seconds': fit_seconds}
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_risk_model():
+    """
+    Return the process-wide risk model, reloading it when the artifact on disk changes
+    """
+    global _model
+    path = model_path()
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _model is not None and _model.mtime == mtime:
+        return _model
+    with _model_lock:
+        if _model is None or _model.mtime != mtime:
+            _model = RiskModel.load(path)
+    return _model
+
+
+def compute_forecast_features():
+    gids, names, static = ward_table()
+    counts, fatalities, first_month = monthly_ward_counts(gids)
+    month = counts.shape[1]
+    return {
+        'gids': gids,
+        'names': names,
+        'X': np.hstack([static, lag_features(counts, fatalities, month)]),
+        'forecast_month': month_label(first_month + month) if first_month is not None else None,
+    }
+
+
+def get_forecast_features():
+    """
+    Feature matrix for the month after the latest events, built once per ward/events data version
+    """
+    return versioned_cache_get_or_set(
+        'risk-forecast-features',
+        (MergedWards, ProtestEvents),
+        compute_forecast_features,
+    )
+
+
+def risk_level(probability):
+    for threshold, label in RISK_LEVELS:
+        if probability >= threshold:
+            return label
+    return RISK_LEVELS[-1][1]
+
+
+def forecast_wards(model, features):
+    """
+    Score every ward at once; probability is P(at least one event) under the Poisson rate
+    """
+    expected = model.score(features['X'])
+    probability = 1 - np.exp(-expected)
+    return [
+        {
+            'gid': int(gid),
+            'ward': name,
+            'expected_events': round(float(rate), 4),
+            'probability': round(float(p), 4),
+            'risk_level': risk_level(p),
+        }
+        for gid, name, rate, p in zip(features['gids'], features['names'], expected, probability)
+    ]
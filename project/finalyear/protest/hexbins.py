@@ -0,0 +1,186 @@
+# protest/hexbins.py
+"""
+Multi-resolution hexagonal aggregation of protest events (count, fatalities, latest date).
+
+Hexagons are pointy-top cells on a Web Mercator grid, one level per hex size, so a map
+zoom maps directly onto a level. The pyramid is kept in the analysis cache and extended
+incrementally: when the only change since the last build is appended events (the same
+fingerprint check used by clustering), just the new events are binned and merged in.
+"""
+import math
+
+import numpy as np
+
+from django.core.cache import caches
+
+from .columns import events_fingerprint, load_events
+from .models import ProtestEvents
+from .versioning import versioned_cache_get_or_set
+
+
+# Hexagon size (centre to vertex, Web Mercator metres) of each pyramid level
+HEX_SIZES_M = (8000, 4000, 2000, 1000, 500, 250)
+FIRST_LEVEL_ZOOM = 9
+WEB_MERCATOR_RADIUS = 6378137.0
+SQRT3 = math.sqrt(3)
+NO_DATE = np.iinfo(np.int64).min
+STATE_KEY = 'protest-hexbins-state'
+
+
+def level_for_zoom(zoom):
+    return int(min(max(zoom - FIRST_LEVEL_ZOOM, 0), len(HEX_SIZES_M) - 1))
+
+
+def to_mercator(lon, lat):
+    x = WEB_MERCATOR_RADIUS * np.radians(lon)
+    y = WEB_MERCATOR_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+
+def from_mercator(x, y):
+    lon = np.degrees(x / WEB_MERCATOR_RADIUS)
+    lat = np.degrees(2 * np.arctan(np.exp(y / WEB_MERCATOR_RADIUS)) - np.pi / 2)
+    return lon, lat
+
+
+def hex_axial(x, y, size):
+    """
+    Axial (q, r) coordinates of the hexagon containing each point (cube rounding)
+    """
+    q = (SQRT3 / 3 * x - y / 3) / size
+    r = (2 / 3 * y) / size
+    s = -q - r
+    rounded_q, rounded_r, rounded_s = np.rint(q), np.rint(r), np.rint(s)
+    dq, dr, ds = np.abs(rounded_q - q), np.abs(rounded_r - r), np.abs(rounded_s - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rounded_q = np.where(fix_q, -rounded_r - rounded_s, rounded_q)
+    rounded_r = np.where(fix_r, -rounded_q - rounded_s, rounded_r)
+    return rounded_q.astype(np.int64), rounded_r.astype(np.int64)
+
+
+def hex_centres(q, r, size):
+    return size * SQRT3 * (q + r / 2), size * 1.5 * r
+
+
+def aggregate_level(q, r, fatalities, days, existing=None):
+    """
+    Sum counts/fatalities and take the latest date per (q, r), merging into existing cells
+    """
+    counts = np.ones(len(q), dtype=np.int64)
+    if existing is not None:
+        q = np.concatenate([existing['q'], q])
+        r = np.concatenate([existing['r'], r])
+        counts = np.concatenate([existing['count'], counts])
+        fatalities = np.concatenate([existing['fatalities'], fatalities])
+        days = np.concatenate([existing['latest'], days])
+
+    keys = q * (1 << 32) + r
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    latest = np.full(len(unique_keys), NO_DATE, dtype=np.int64)
+    np.maximum.at(latest, inverse, days)
+    return {
+        'q': q[first],
+        'r': r[first],
+        'count': np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.int64),
+        'fatalities': np.bincount(inverse, weights=fatalities, minlength=len(unique_keys)).astype(np.int64),
+        'latest': latest,
+    }
+
+
+def bin_events(events, levels=None):
+    """
+    Build (or extend) every pyramid level from column arrays of events
+    """
+    x, y = to_mercator(events['lon'], events['lat'])
+    dates = events['dates']
+    days = np.where(np.isnat(dates), NO_DATE, dates.astype('datetime64[D]').astype(np.int64))
+    pyramid = []
+    for level, size in enumerate(HEX_SIZES_M):
+        q, r = hex_axial(x, y, size)
+        cells = aggregate_level(q, r, events['fatalities'], days, levels[level] if levels else None)
+        cells['lon'], cells['lat'] = from_mercator(*hex_centres(cells['q'], cells['r'], size))
+        pyramid.append(cells)
+    return pyramid
+
+
+def update_hex_pyramid():
+    """
+    Extend the cached pyramid with appended events, or rebuild it if older rows changed
+    """
+    cache = caches['analysis']
+    state = cache.get(STATE_KEY)
+    mode = 'full'
+
+    if state is not None and state['max_gid'] is not None and (
+        events_fingerprint(None, None, state['max_gid']) == state['fingerprint']
+    ):
+        events = load_events(after_gid=state['max_gid'])
+        levels = bin_events(events, state['levels'])
+        max_gid = int(events['gids'].max()) if len(events['gids']) else state['max_gid']
+        mode = 'incremental'
+    else:
+        events = load_events()
+        levels = bin_events(events)
+        max_gid = int(events['gids'].max()) if len(events['gids']) else None
+
+    state = {
+        'max_gid': max_gid,
+        'fingerprint': events_fingerprint(None, None, max_gid) if max_gid is not None else None,
+        'levels': levels,
+    }
+    cache.set(STATE_KEY, state)
+    return {'levels': levels, 'update_mode': mode}
+
+
+def get_hex_pyramid():
+    """
+    Hexagon pyramid for the current protest events data version
+    """
+    return versioned_cache_get_or_set('protest-hexbins', (ProtestEvents,), update_hex_pyramid)
+
+
+def hexagon_ring(lon, lat, size):
+    """
+    Closed lon/lat rings (N x 7 x 2) of pointy-top hexagons centred on the given points
+    """
+    x, y = to_mercator(lon, lat)
+    angles = np.radians(30 + 60 * np.arange(7))
+    ring_lon, ring_lat = from_mercator(
+        x[:, None] + size * np.cos(angles)[None, :],
+        y[:, None] + size * np.sin(angles)[None, :],
+    )
+    return np.round(np.stack([ring_lon, ring_lat], axis=-1), 6)
+
+
+def hexbin_features(pyramid, level, bbox=None):
+    """
+    GeoJSON features of one pyramid level, optionally limited to cells whose centre
+    falls in bbox (west, south, east, north) grown by one cell
+    """
+    cells = pyramid['levels'][level]
+    size = HEX_SIZES_M[level]
+    selected = np.arange(len(cells['q']))
+    if bbox is not None:
+        west, south, east, north = bbox
+        margin = np.degrees(2 * size / WEB_MERCATOR_RADIUS)
+        selected = np.flatnonzero(
+            (cells['lon'] >= west - margin) & (cells['lon'] <= east + margin)
+            & (cells['lat'] >= south - margin) & (cells['lat'] <= north + margin)
+        )
+
+    rings = hexagon_ring(cells['lon'][selected], cells['lat'][selected], size).tolist()
+    features = []
+    for ring, i in zip(rings, selected):
+        latest = cells['latest'][i]
+        features.append({
+            'type': 'Feature',
+            'id': f"{level}:{int(cells['q'][i])}:{int(cells['r'][i])}",
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': {
+                'count': int(cells['count'][i]),
+                'fatalities': int(cells['fatalities'][i]),
+                'latest_date': str(np.datetime64(int(latest), 'D')) if latest != NO_DATE else None,
+            },
+        })
+    return features
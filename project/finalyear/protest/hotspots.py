@@ -0,0 +1,227 @@
+# protest/hotspots.py
+"""
+Emerging hot spot analysis: Getis-Ord Gi* over a fishnet grid x time-step cube,
+with a Mann-Kendall trend test on each cell's Gi* z-score series.
+
+Everything is vectorized across cells: neighbour weights are one scipy.sparse
+matrix built once for the grid, and the trend test loops over lags, not cells.
+"""
+import math
+
+import numpy as np
+from scipy import sparse
+from scipy.stats import norm
+
+from .models import ProtestEvents
+from .snapshot import get_event_snapshot
+from .versioning import versioned_cache_get_or_set
+
+
+TIME_STEPS = ('month', 'week')
+SIGNIFICANCE_Z = 1.96  # 95% confidence, two-tailed
+PERSISTENCE_SHARE = 0.9
+TREND_BLOCK_SIZE = 256
+METRES_PER_DEGREE_LAT = 110574.0
+METRES_PER_DEGREE_LON = 111320.0
+
+# Cells x time steps of the cube; Gi* and the trend test allocate several arrays of this
+# size and the trend test's work grows with steps², so larger requests are refused
+MAX_CUBE_SIZE = 2_000_000
+# Smallest cell_size_m per time step: weekly cubes have ~4x the steps of monthly ones
+MIN_CELL_SIZE_M = {'month': 100, 'week': 500}
+
+PATTERNS = (
+    'new', 'consecutive', 'intensifying', 'persistent',
+    'diminishing', 'sporadic', 'historical', 'no pattern',
+)
+
+
+class CubeTooLarge(ValueError):
+    """
+    The requested grid and time step exceed MAX_CUBE_SIZE
+    """
+
+
+def time_step_index(dates, time_step):
+    """
+    Integer time-step index for each date (months or ISO weeks starting Monday)
+    """
+    if time_step == 'month':
+        return dates.astype('datetime64[M]').astype(np.int64)
+    # 1970-01-01 was a Thursday; shift so weeks start on Monday
+    return (dates.astype('datetime64[D]').astype(np.int64) + 3) // 7
+
+
+def fishnet(lon, lat, cell_size_m):
+    """
+    Assign points to square cells of cell_size_m over their bounding box.
+    Returns (cell index per point, nx, ny, grid origin/steps in degrees).
+    """
+    lon_scale = METRES_PER_DEGREE_LON * math.cos(math.radians(float(np.mean(lat))))
+    dx = cell_size_m / lon_scale
+    dy = cell_size_m / METRES_PER_DEGREE_LAT
+    x0, y0 = float(lon.min()) - dx / 2, float(lat.min()) - dy / 2
+    columns = np.floor((lon - x0) / dx).astype(np.int64)
+    rows = np.floor((lat - y0) / dy).astype(np.int64)
+    nx, ny = int(columns.max()) + 1, int(rows.max()) + 1
+    return rows * nx + columns, nx, ny, (x0, y0, dx, dy)
+
+
+def queen_weights(nx, ny):
+    """
+    Binary queen-contiguity weights including each cell itself (as Gi* requires)
+    """
+    rows, columns = np.meshgrid(np.arange(ny), np.arange(nx), indexing='ij')
+    rows, columns = rows.ravel(), columns.ravel()
+    sources, targets = [], []
+    for d_row in (-1, 0, 1):
+        for d_column in (-1, 0, 1):
+            neighbour_rows, neighbour_columns = rows + d_row, columns + d_column
+            valid = (neighbour_rows >= 0) & (neighbour_rows < ny) & (neighbour_columns >= 0) & (neighbour_columns < nx)
+            sources.append((rows * nx + columns)[valid])
+            targets.append((neighbour_rows * nx + neighbour_columns)[valid])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    size = nx * ny
+    return sparse.csr_matrix((np.ones(len(sources)), (sources, targets)), shape=(size, size))
+
+
+def gi_star(cube, weights, time_window):
+    """
+    Gi* z-scores for every (time step, cell) of cube (T x N). The neighbourhood of a bin is
+    its queen neighbours in the current and previous time_window - 1 steps.
+    """
+    steps, cells = cube.shape
+    n = cube.size
+    mean = cube.mean()
+    std = math.sqrt((cube ** 2).mean() - mean ** 2)
+    if std == 0:
+        return np.zeros_like(cube)
+
+    spatial_sum = np.asarray((weights @ cube.T).T)
+    neighbour_count = np.asarray(weights.sum(axis=1)).ravel()
+
+    # Rolling sum over the time window via cumulative sums
+    cumulative = np.vstack([np.zeros((1, cells)), np.cumsum(spatial_sum, axis=0)])
+    starts = np.maximum(np.arange(steps) - time_window + 1, 0)
+    window_sum = cumulative[1:] - cumulative[starts]
+    window_steps = (np.arange(steps) - starts + 1)[:, None]
+    weight_sum = window_steps * neighbour_count[None, :]
+
+    # Binary weights, so sum(w^2) == sum(w)
+    denominator = std * np.sqrt((n * weight_sum - weight_sum ** 2) / (n - 1))
+    return (window_sum - mean * weight_sum) / denominator
+
+
+def mann_kendall(series):
+    """
+    Mann-Kendall trend z-scores and p-values for each column of series (T x N)
+    """
+    steps = series.shape[0]
+    if steps < 3:
+        zeros = np.zeros(series.shape[1])
+        return zeros, np.ones(series.shape[1])
+    s = np.zeros(series.shape[1])
+    # Column blocks keep each lag comparison in cache for long series
+    for start in range(0, series.shape[1], TREND_BLOCK_SIZE):
+        block = np.ascontiguousarray(series[:, start:start + TREND_BLOCK_SIZE])
+        for lag in range(1, steps):
+            later, earlier = block[lag:], block[:-lag]
+            s[start:start + TREND_BLOCK_SIZE] += (
+                np.count_nonzero(later > earlier, axis=0) - np.count_nonzero(later < earlier, axis=0)
+            )
+    variance = steps * (steps - 1) * (2 * steps + 5) / 18
+    z = (s - np.sign(s)) / math.sqrt(variance)
+    return z, 2 * norm.sf(np.abs(z))
+
+
+def classify(z_scores, trend_z, trend_p):
+    """
+    ArcGIS-style emerging hot spot categories from the Gi* z-score series (T x N)
+    """
+    steps, cells = z_scores.shape
+    hot = z_scores >= SIGNIFICANCE_Z
+    cold = z_scores <= -SIGNIFICANCE_Z
+    final_hot = hot[-1]
+    hot_share = hot.mean(axis=0)
+    ever_hot_before_final = hot[:-1].any(axis=0)
+    trend_up = (trend_p < 0.05) & (trend_z > 0)
+    trend_down = (trend_p < 0.05) & (trend_z < 0)
+
+    # Length of the uninterrupted hot run ending at the final step
+    not_hot_reversed = ~hot[::-1]
+    run_length = np.where(not_hot_reversed.any(axis=0), not_hot_reversed.argmax(axis=0), steps)
+    hot_before_run = hot.sum(axis=0) > run_length
+
+    mostly_hot = hot_share >= PERSISTENCE_SHARE
+    patterns = np.full(cells, 'no pattern', dtype=object)
+    patterns[mostly_hot & ~final_hot] = 'historical'
+    patterns[final_hot & ~mostly_hot & ever_hot_before_final & ~cold.any(axis=0)] = 'sporadic'
+    patterns[final_hot & ~mostly_hot & (run_length >= 2) & ~hot_before_run] = 'consecutive'
+    patterns[final_hot & mostly_hot] = 'persistent'
+    patterns[final_hot & mostly_hot & trend_up] = 'intensifying'
+    patterns[final_hot & mostly_hot & trend_down] = 'diminishing'
+    patterns[final_hot & ~ever_hot_before_final] = 'new'
+    return patterns
+
+
+def compute_emerging_hotspots(cell_size_m, time_step, time_window):
+    events = get_event_snapshot()
+    valid = ~np.isnat(events['dates'])
+    lon, lat, dates = events['lon'][valid], events['lat'][valid], events['dates'][valid]
+    if len(lon) < 2:
+        return {'cells': [], 'pattern_counts': {}, 'time_steps': 0, 'grid': None}
+
+    cell_index, nx, ny, (x0, y0, dx, dy) = fishnet(lon, lat, cell_size_m)
+    step_index = time_step_index(dates, time_step)
+    first_step = int(step_index.min())
+    step_index = step_index - first_step
+    steps, cells = int(step_index.max()) + 1, nx * ny
+    if steps * cells > MAX_CUBE_SIZE:
+        raise CubeTooLarge(
+            f"{cells} cells x {steps} {time_step}s exceeds the limit of {MAX_CUBE_SIZE} cell-steps; "
+            f"use a larger cell_size_m or time_step=month"
+        )
+
+    cube = np.bincount(step_index * cells + cell_index, minlength=steps * cells).reshape(steps, cells).astype(np.float64)
+    z_scores = gi_star(cube, queen_weights(nx, ny), time_window)
+
+    trend_z, trend_p = mann_kendall(z_scores)
+    patterns = classify(z_scores, trend_z, trend_p)
+
+    totals = cube.sum(axis=0)
+    first_label = np.datetime64(first_step, 'M') if time_step == 'month' else np.datetime64(first_step * 7 - 3, 'D')
+    output = []
+    for cell in np.flatnonzero((patterns != 'no pattern') | (totals > 0)):
+        row, column = divmod(int(cell), nx)
+        west, south = x0 + column * dx, y0 + row * dy
+        output.append({
+            'cell': int(cell),
+            'bounds': [round(west, 6), round(south, 6), round(west + dx, 6), round(south + dy, 6)],
+            'event_count': int(totals[cell]),
+            'final_z': round(float(z_scores[-1, cell]), 3),
+            'trend_z': round(float(trend_z[cell]), 3),
+            'trend_p': round(float(trend_p[cell]), 4),
+            'pattern': patterns[cell],
+        })
+
+    return {
+        'grid': {'nx': nx, 'ny': ny, 'cell_size_m': cell_size_m, 'origin': [x0, y0], 'step_degrees': [dx, dy]},
+        'time_steps': steps,
+        'first_step': str(first_label),
+        'pattern_counts': {pattern: int((patterns == pattern).sum()) for pattern in PATTERNS},
+        'cells': output,
+    }
+
+
+def get_emerging_hotspots(cell_size_m=1000, time_step='month', time_window=1):
+    """
+    Emerging hot spot cube, computed once per protest events data version
+    """
+    return versioned_cache_get_or_set(
+        'emerging-hotspots',
+        (ProtestEvents,),
+        lambda: compute_emerging_hotspots(cell_size_m, time_step, time_window),
+        cell_size_m,
+        time_step,
+        time_window,
+    )
@@ -0,0 +1,130 @@
+# protest/isochrones.py
+"""
+Travel-time coverage isochrones for police stations and hospitals over the road network.
+"""
+import json
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from django.contrib.gis.geos import LineString, MultiLineString
+
+from .facilities import FACILITY_MODELS
+from .models import NairobiRoads
+from .routing import get_road_graph
+from .versioning import versioned_cache_get_or_set
+
+
+ISOCHRONE_MINUTES = (5, 10, 15)
+
+# Reachable roads are buffered by ~100 m to form coverage polygons
+ROAD_BUFFER_DEGREES = 0.0009
+SIMPLIFY_TOLERANCE = 0.0001
+
+# Projected CRS used for areas (WGS 84 / UTM zone 37S covers Nairobi)
+AREA_SRID = 32737
+
+
+def facility_locations(facility_type):
+    """
+    Return [(gid, name, lon, lat)] for every facility of the given type
+    """
+    model = FACILITY_MODELS[facility_type]
+    locations = []
+    for gid, name, geom in model.objects.filter(geom__isnull=False).values_list('gid', 'name', 'geom'):
+        point = geom.point_on_surface
+        locations.append((gid, name or f"{facility_type.title()} {gid}", point.x, point.y))
+    return locations
+
+
+def edges_polygon(graph, positions):
+    """
+    Buffer and dissolve the geometries of the given edges into one coverage polygon
+    """
+    lines = []
+    for position in positions:
+        edge = int(graph.edge_geometry[position])
+        coords = graph.geometry_coords[graph.geometry_offsets[edge]:graph.geometry_offsets[edge + 1]]
+        lines.append(LineString(coords.tolist(), srid=4326))
+    if not lines:
+        return None
+    polygon = MultiLineString(lines, srid=4326).buffer(ROAD_BUFFER_DEGREES)
+    return polygon.simplify(SIMPLIFY_TOLERANCE, preserve_topology=True)
+
+
+def isochrone_feature(polygon, properties):
+    projected = polygon.transform(AREA_SRID, clone=True)
+    return {
+        'type': 'Feature',
+        'geometry': json.loads(polygon.geojson),
+        'properties': {**properties, 'area_km2': round(projected.area / 1e6, 3)},
+    }
+
+
+def compute_isochrones(facility_type, minutes=ISOCHRONE_MINUTES):
+    """
+    One multi-source Dijkstra from every facility gives each road node its travel time to the
+    closest facility; thresholds then yield the combined coverage and each facility's catchment.
+    """
+    graph = get_road_graph()
+    facilities = facility_locations(facility_type)
+    if not facilities:
+        return []
+
+    facility_nodes = {}
+    for gid, name, lon, lat in facilities:
+        node, _ = graph.snap(lon, lat)
+        # Facilities sharing a snapped node share a catchment; the first one names it
+        facility_nodes.setdefault(node, (gid, name))
+
+    costs, _, sources = dijkstra(
+        graph.matrix, indices=list(facility_nodes), min_only=True, return_predecessors=True
+    )
+
+    tails = np.repeat(np.arange(graph.node_count), np.diff(graph.indptr))
+    heads = graph.targets
+    # Each road appears once per direction; keep one
+    forward = tails < heads
+
+    features = []
+    for limit in sorted(minutes, reverse=True):
+        seconds = limit * 60
+        reachable = forward & (costs[tails] <= seconds) & (costs[heads] <= seconds)
+        positions = np.flatnonzero(reachable)
+
+        polygon = edges_polygon(graph, positions)
+        if polygon is not None:
+            features.append(isochrone_feature(polygon, {
+                'minutes': limit,
+                'scope': 'all',
+                'facility_type': facility_type,
+                'facility_count': len(facilities),
+            }))
+
+        catchments = sources[tails[positions]]
+        for node, (gid, name) in facility_nodes.items():
+            polygon = edges_polygon(graph, positions[catchments == node])
+            if polygon is not None:
+                features.append(isochrone_feature(polygon, {
+                    'minutes': limit,
+                    'scope': 'facility',
+                    'facility_type': facility_type,
+                    'facility_gid': gid,
+                    'facility_name': name,
+                }))
+
+    return features
+
+
+def get_isochrones(facility_type, minutes=ISOCHRONE_MINUTES):
+    """
+    Isochrone features for a facility type, computed once per roads/facility data version
+    """
+    minutes = tuple(sorted(set(minutes)))
+    return versioned_cache_get_or_set(
+        'isochrones',
+        (NairobiRoads, FACILITY_MODELS[facility_type]),
+        lambda: compute_isochrones(facility_type, minutes),
+        facility_type,
+        '-'.join(str(limit) for limit in minutes),
+    )
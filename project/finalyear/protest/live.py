@@ -0,0 +1,143 @@
+# protest/live.py
+"""
+Live push of protest event changes and data version bumps to WebSocket subscribers
+(ws/protest-events/, see protest/consumers.py).
+
+Changes are collected per transaction and published after commit, so subscribers never
+see rolled-back rows. Each message is encoded to JSON once and handed to the channel
+layer as a ready-made text frame; consumers forward it unchanged, so fan-out costs one
+queue put per subscriber rather than one encode.
+
+Messages:
+    {"type": "events", "action": "upsert", "data_version": ..., "features": [GeoJSON Feature, ...]}
+    {"type": "events", "action": "delete", "data_version": ..., "ids": [gid, ...]}
+    {"type": "events", "action": "reload", "data_version": ..., "count": n or null}
+    {"type": "versions", "versions": {table: data version, ...}}
+
+Publishing is a no-op when Django Channels is not installed.
+"""
+import weakref
+
+from asgiref.sync import async_to_sync
+from django.db import transaction
+
+from .encoders import dumps, encode_feature, protest_event_rows
+from .models import ProtestEvents
+from .versioning import get_data_version
+
+try:
+    from channels.layers import get_channel_layer
+except ImportError:  # Channels is optional; without it nothing is pushed
+    get_channel_layer = None
+
+
+GROUP = 'protest-events'
+MESSAGE_TYPE = 'live.message'
+# Above this many changed events per transaction clients are told to refetch instead
+MAX_PUSHED_FEATURES = 1000
+
+
+def channel_layer():
+    return get_channel_layer() if get_channel_layer is not None else None
+
+
+def send(payload):
+    """
+    Broadcast an encoded JSON payload to every subscriber
+    """
+    layer = channel_layer()
+    if layer is None:
+        return
+    async_to_sync(layer.group_send)(GROUP, {'type': MESSAGE_TYPE, 'text': payload.decode('utf-8')})
+
+
+def event_messages(upserted, deleted, reload=False):
+    """
+    Encoded 'events' messages for changed and deleted gids; a single 'reload' when the
+    changed rows are unknown or too many to push
+    """
+    version = get_data_version(ProtestEvents)
+    if reload or len(upserted) + len(deleted) > MAX_PUSHED_FEATURES:
+        count = None if reload else len(upserted) + len(deleted)
+        return [dumps({'type': 'events', 'action': 'reload', 'data_version': version, 'count': count})]
+    messages = []
+    if upserted:
+        rows = protest_event_rows(ProtestEvents.objects.filter(gid__in=upserted).order_by('gid'))
+        features = b','.join(encode_feature(row) for row in rows)
+        messages.append(
+            b'{"type":"events","action":"upsert","data_version":%s,"features":[%s]}' % (dumps(version), features)
+        )
+    if deleted:
+        # A delete undone by a savepoint rollback inside the transaction is not sent
+        deleted = set(deleted) - set(ProtestEvents.objects.filter(gid__in=deleted).values_list('gid', flat=True))
+    if deleted:
+        messages.append(dumps({'type': 'events', 'action': 'delete', 'data_version': version, 'ids': sorted(deleted)}))
+    return messages
+
+
+def version_message(models):
+    return dumps({
+        'type': 'versions',
+        'versions': {model._meta.db_table: get_data_version(model) for model in models},
+    })
+
+
+class PendingChanges:
+    """
+    Changes made inside one transaction; publish() is registered with on_commit
+    """
+
+    def __init__(self):
+        self.upserted = set()
+        self.deleted = set()
+        self.models = {}
+        self.reload = False
+
+    def add(self, model, gids, deleted):
+        self.models[model._meta.db_table] = model
+        if model is ProtestEvents and gids is None:
+            self.reload = True
+        elif model is ProtestEvents:
+            gids = set(gids)
+            if deleted:
+                self.upserted -= gids
+                self.deleted |= gids
+            else:
+                self.deleted -= gids
+                self.upserted |= gids
+
+    def publish(self):
+        if channel_layer() is None:
+            return
+        if ProtestEvents._meta.db_table in self.models:
+            for payload in event_messages(self.upserted, self.deleted, self.reload):
+                send(payload)
+        send(version_message(self.models.values()))
+
+
+# connection -> weak reference to the PendingChanges of its current transaction. The only
+# strong reference is the publish callback registered with on_commit, so when Django
+# discards the callbacks of a rolled-back transaction its pending changes go with them.
+_pending = weakref.WeakKeyDictionary()
+
+
+def record_change(model, gids=None, deleted=False):
+    """
+    Queue a change for publishing when the current transaction commits
+    (immediately under autocommit). Several changes in one transaction are sent together.
+    gids=None means the changed protest events are unknown (e.g. a load outside Django).
+    """
+    if get_channel_layer is None:
+        return
+    connection = transaction.get_connection()
+    reference = _pending.get(connection)
+    pending = reference() if reference is not None else None
+    if pending is not None:
+        pending.add(model, gids, deleted)
+        return
+    pending = PendingChanges()
+    pending.add(model, gids, deleted)
+    if connection.in_atomic_block:
+        _pending[connection] = weakref.ref(pending)
+    # robust: a channel layer outage must not fail the request that made the change
+    transaction.on_commit(pending.publish, robust=True)
@@ -0,0 +1,209 @@
+# protest/loadtest.py
+"""
+Load generator replaying the dashboard's traffic against a running server.
+
+Each virtual user repeats a dashboard visit, then pauses for a think time. A visit
+issues the requests that ProtestDashboard's components make when they mount, using
+up to six connections at once like a browser does:
+
+- DataContext / fetchMapData: the five map layers, all at once
+- analysis/RiskSurfaceMap: ward-statistics, merged-wards, then spatial-analysis
+  with KDE, one after the other
+- TrendingHashtags: trending-hashtags
+
+LoadStats collects latencies per endpoint and per whole visit. The scrape targets of
+trending-hashtags can be served by a local stub (start_scrape_stub) so runs stay offline
+and do not measure third-party sites; see PROTEST_TRENDING_SOURCES in settings_bench.
+"""
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+BROWSER_CONNECTIONS = 6
+
+MAP_LAYERS = (
+    ('protest-events', '/api/protest-events/'),
+    ('nairobi-hospitals', '/api/nairobi-hospitals/'),
+    ('police-stations', '/api/police-stations/'),
+    ('nairobi-wards', '/api/nairobi-wards/'),
+    ('nairobi-roads', '/api/nairobi-roads/'),
+)
+RISK_SURFACE_MAP = (
+    ('ward-statistics', '/api/ward-statistics/'),
+    ('merged-wards', '/api/merged-wards/'),
+    ('spatial-analysis-kde', '/api/spatial-analysis/?metric=poverty_rate&include_kde=true'),
+)
+TRENDING = (
+    ('trending-hashtags', '/api/trending-hashtags/'),
+)
+# Request chains started together on each visit; a chain's requests run in order
+VISIT = tuple((request,) for request in MAP_LAYERS) + (RISK_SURFACE_MAP,) + (TRENDING,)
+
+STUB_HASHTAGS = (
+    '#Maandamano', '#RejectFinanceBill', '#OccupyParliament', '#NairobiTraffic', '#KenyaDecides',
+    '#RutoMustGo', '#JusticeForAlbert', '#SiriNiNumbers', '#KOT', '#GenZProtest',
+)
+
+
+def percentile(ordered, fraction):
+    """
+    Nearest-rank percentile of an ascending list
+    """
+    if not ordered:
+        return None
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class LoadStats:
+    """
+    Thread-safe latency samples and error counts per endpoint name
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, size=0, error=None):
+        with self.lock:
+            if error is None:
+                self.latencies.setdefault(name, []).append(seconds)
+                self.bytes[name] = self.bytes.get(name, 0) + size
+            else:
+                self.errors.setdefault(name, {})
+                self.errors[name][error] = self.errors[name].get(error, 0) + 1
+
+    def summary(self, elapsed):
+        """
+        {name: count, errors, throughput (requests/s over the run), mean and p50/p95/p99 seconds}
+        """
+        with self.lock:
+            names = sorted(set(self.latencies) | set(self.errors))
+            results = {}
+            for name in names:
+                ordered = sorted(self.latencies.get(name, ()))
+                results[name] = {
+                    'count': len(ordered),
+                    'errors': sum(self.errors.get(name, {}).values()),
+                    'error_kinds': dict(self.errors.get(name, {})),
+                    'throughput': len(ordered) / elapsed if elapsed else 0.0,
+                    'mean': sum(ordered) / len(ordered) if ordered else None,
+                    'p50': percentile(ordered, 0.50),
+                    'p95': percentile(ordered, 0.95),
+                    'p99': percentile(ordered, 0.99),
+                    'bytes': self.bytes.get(name, 0),
+                }
+        return results
+
+
+class VirtualUser:
+    """
+    One simulated dashboard user with its own connection pool
+    """
+
+    def __init__(self, base_url, stats, timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=BROWSER_CONNECTIONS))
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=BROWSER_CONNECTIONS))
+        self.executor = ThreadPoolExecutor(BROWSER_CONNECTIONS)
+
+    def fetch(self, name, path):
+        started = time.perf_counter()
+        try:
+            response = self.session.get(self.base_url + path, timeout=self.timeout)
+            size = len(response.content)
+        except requests.RequestException as e:
+            self.stats.record(name, time.perf_counter() - started, error=type(e).__name__)
+            return False
+        seconds = time.perf_counter() - started
+        if response.status_code != 200:
+            self.stats.record(name, seconds, error=f'HTTP {response.status_code}')
+            return False
+        self.stats.record(name, seconds, size)
+        return True
+
+    def run_chain(self, chain):
+        for name, path in chain:
+            self.fetch(name, path)
+
+    def visit(self):
+        started = time.perf_counter()
+        wait([self.executor.submit(self.run_chain, chain) for chain in VISIT])
+        self.stats.record('visit', time.perf_counter() - started)
+
+    def run(self, deadline, think_time, visits=None):
+        completed = 0
+        while time.monotonic() < deadline and (visits is None or completed < visits):
+            self.visit()
+            completed += 1
+            remaining = deadline - time.monotonic()
+            if think_time and remaining > 0:
+                time.sleep(min(think_time, remaining))
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+
+def run_load(base_url, users, duration, think_time=1.0, ramp_up=0.0, visits=None, timeout=120):
+    """
+    Run `users` virtual users for `duration` seconds (or until each has made `visits`
+    visits), starting them evenly over `ramp_up` seconds. Returns (LoadStats, elapsed).
+    """
+    stats = LoadStats()
+    started = time.monotonic()
+    deadline = started + duration
+
+    def user_loop(index):
+        if ramp_up and users > 1:
+            time.sleep(ramp_up * index / (users - 1))
+        user = VirtualUser(base_url, stats, timeout)
+        try:
+            user.run(deadline, think_time, visits)
+        finally:
+            user.close()
+
+    threads = [threading.Thread(target=user_loop, args=(index,), daemon=True) for index in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.monotonic() - started
+
+
+class ScrapeStubHandler(BaseHTTPRequestHandler):
+    """
+    Serves a trending-topics page in the shape scrape_trending_hashtags looks for
+    """
+
+    def do_GET(self):
+        links = ''.join(f'<li><a href="/tag/{tag[1:]}">{tag}</a></li>' for tag in STUB_HASHTAGS)
+        body = f'<html><body><ol>{links}</ol></body></html>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_scrape_stub(port, host='127.0.0.1'):
+    """
+    Start the stub in a daemon thread; call shutdown() on the returned server to stop it
+    """
+    server = ThreadingHTTPServer((host, port), ScrapeStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
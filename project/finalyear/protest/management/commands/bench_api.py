@@ -0,0 +1,207 @@
+# protest/management/commands/bench_api.py
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.renderers import JSONRenderer
+
+from protest.synthetic import require_benchmark_database
+from protest.versioning import TRACKED_MODELS, bump_data_version
+from protest.views import (
+    HospitalViewSet, MergedWardsViewSet, NairobiRoadsViewSet, NairobiViewSet, PoliceStnViewSet,
+    ProtestEventsViewSet,
+)
+
+
+# (name, path) of the API calls behind the map layers and analysis panels
+CASES = (
+    ('nairobi-wards', '/api/nairobi-wards/'),
+    ('nairobi-roads', '/api/nairobi-roads/'),
+    ('police-stations', '/api/police-stations/'),
+    ('nairobi-hospitals', '/api/nairobi-hospitals/'),
+    ('merged-wards', '/api/merged-wards/'),
+    ('protest-events', '/api/protest-events/'),
+    ('protest-events-clustered', '/api/protest-events/?cluster=true&zoom=11'),
+    ('spatial-analysis', '/api/spatial-analysis/?metric=poverty_rate'),
+    ('spatial-analysis-kde', '/api/spatial-analysis/?metric=poverty_rate&include_kde=true'),
+    ('ward-statistics', '/api/ward-statistics/'),
+    ('spatial-metrics', '/api/spatial-metrics/'),
+    ('protest-clusters', '/api/protest-clusters/'),
+    ('emerging-hotspots', '/api/emerging-hotspots/'),
+    ('ward-autocorrelation', '/api/ward-autocorrelation/'),
+    ('protest-hexbins', '/api/protest-hexbins/'),
+    ('search', '/api/search/?q=kenyatta'),
+)
+
+# (name, viewset) whose serializer is timed on its own, on rows fetched beforehand
+SERIALIZER_CASES = (
+    ('serialize-nairobi-wards', NairobiViewSet),
+    ('serialize-nairobi-roads', NairobiRoadsViewSet),
+    ('serialize-police-stations', PoliceStnViewSet),
+    ('serialize-nairobi-hospitals', HospitalViewSet),
+    ('serialize-merged-wards', MergedWardsViewSet),
+    ('serialize-protest-events', ProtestEventsViewSet),
+)
+
+
+def table_counts():
+    counts = {}
+    with connection.cursor() as cursor:
+        for model in TRACKED_MODELS:
+            cursor.execute(f'SELECT count(*) FROM {connection.ops.quote_name(model._meta.db_table)}')
+            counts[model._meta.db_table] = cursor.fetchone()[0]
+    return counts
+
+
+def database_version():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT version(), postgis_full_version()')
+        return ' / '.join(cursor.fetchone())
+
+
+class Command(BaseCommand):
+    help = "Time the API and analysis endpoints against the benchmark database (finalyear.settings_bench)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Warm runs per case after the cold run')
+        parser.add_argument('--cases', nargs='+', default=None, help='Only run these case names')
+        parser.add_argument('--output', default=None,
+                            help='Results file (default PROTEST_CACHE_DIR/benchmarks/bench-<timestamp>.json)')
+        parser.add_argument('--serializer-rows', type=int, default=1000,
+                            help='Rows per serializer case (0 to skip the serializer cases)')
+        parser.add_argument('--baseline', default=None, help='Earlier results file to compare against')
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help='Warm median / baseline warm median above which a case counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        require_benchmark_database()
+        cases = CASES
+        serializer_cases = SERIALIZER_CASES if options['serializer_rows'] > 0 else ()
+        if options['cases']:
+            unknown = set(options['cases']) - {name for name, _ in CASES + SERIALIZER_CASES}
+            if unknown:
+                raise CommandError(f"Unknown cases: {', '.join(sorted(unknown))}")
+            cases = [(name, path) for name, path in CASES if name in options['cases']]
+            serializer_cases = [(name, viewset) for name, viewset in serializer_cases if name in options['cases']]
+
+        client = Client(HTTP_HOST='localhost')
+        results = {}
+        self.stdout.write(f"{'case':<28} {'cold (s)':>9} {'median (s)':>11} {'min (s)':>9} {'bytes':>12}")
+        for name, path in cases:
+            results[name] = self.run_case(client, path, options['repeat'])
+            self.write_result(name, results[name])
+        for name, viewset in serializer_cases:
+            results[name] = self.run_serializer_case(viewset, options['serializer_rows'], options['repeat'])
+            self.write_result(name, results[name])
+
+        report = {
+            'meta': {
+                'created': datetime.now().isoformat(),
+                'rows': table_counts(),
+                'database': database_version(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'repeat': options['repeat'],
+                'serializer_rows': options['serializer_rows'],
+            },
+            'results': results,
+        }
+        output = Path(options['output'] or Path(settings.PROTEST_CACHE_DIR) / 'benchmarks' /
+                      f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(f"Results written to {output}")
+
+        if options['baseline']:
+            regressions = self.compare(results, options['baseline'], options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} case(s) regressed: {', '.join(regressions)}")
+
+    def run_case(self, client, path, repeat):
+        """
+        One cold run (all data versions bumped, so no cached snapshot or result applies)
+        followed by `repeat` warm runs
+        """
+        bump_data_version(*TRACKED_MODELS)
+        timings = []
+        size = None
+        for _ in range(repeat + 1):
+            started = time.perf_counter()
+            response = client.get(path)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                return {'path': path, 'status': response.status_code, 'error': content[:500].decode('utf-8', 'replace')}
+            size = len(content)
+        warm = timings[1:] or timings
+        return {
+            'path': path,
+            'status': 200,
+            'cold': timings[0],
+            'median': statistics.median(warm),
+            'min': min(warm),
+            'bytes': size,
+        }
+
+    def run_serializer_case(self, viewset, rows, repeat):
+        """
+        Serialize and render the first `rows` rows of the viewset's queryset, fetched once
+        up front so only the serializer and the JSON renderer are timed
+        """
+        objects = list(viewset.queryset.order_by('pk')[:rows])
+        renderer = JSONRenderer()
+        timings = []
+        for _ in range(repeat + 1):
+            started = time.perf_counter()
+            content = renderer.render(viewset.serializer_class(objects, many=True).data)
+            timings.append(time.perf_counter() - started)
+        warm = timings[1:] or timings
+        return {
+            'serializer': viewset.serializer_class.__name__,
+            'rows': len(objects),
+            'cold': timings[0],
+            'median': statistics.median(warm),
+            'min': min(warm),
+            'bytes': len(content),
+        }
+
+    def write_result(self, name, result):
+        if 'error' in result:
+            self.stdout.write(self.style.ERROR(f"{name:<28} HTTP {result['status']}: {result['error'][:80]}"))
+            return
+        self.stdout.write(
+            f"{name:<28} {result['cold']:>9.3f} {result['median']:>11.3f} {result['min']:>9.3f} {result['bytes']:>12}"
+        )
+
+    def compare(self, results, baseline_path, threshold):
+        """
+        Print warm medians against the baseline and return the names of regressed cases
+        """
+        try:
+            baseline = json.loads(Path(baseline_path).read_text())['results']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Cannot read baseline {baseline_path}: {e}")
+
+        regressions = []
+        self.stdout.write(f"\n{'case':<28} {'baseline (s)':>12} {'now (s)':>9} {'ratio':>7}")
+        for name, result in results.items():
+            before = baseline.get(name)
+            if not before or 'median' not in before or 'median' not in result:
+                continue
+            ratio = result['median'] / before['median'] if before['median'] else float('inf')
+            line = f"{name:<28} {before['median']:>12.3f} {result['median']:>9.3f} {ratio:>6.2f}x"
+            if ratio > threshold:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,122 @@
+# protest/management/commands/bench_event_serialization.py
+import json
+import random
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from protest.encoders import encode_feature_collection, protest_event_rows
+from protest.models import ProtestEvents
+from protest.serializers import ProtestEventsSerializer
+
+
+# Rough Nairobi bounding box
+NAIROBI_BBOX = (36.65, -1.45, 37.10, -1.16)
+
+
+def synthetic_events(size, seed=42):
+    """
+    Build matching model instances and values_list()-style tuples for the same synthetic events
+    """
+    rng = random.Random(seed)
+    min_lon, min_lat, max_lon, max_lat = NAIROBI_BBOX
+    start = date(2015, 1, 1)
+    instances = []
+    rows = []
+
+    for gid in range(1, size + 1):
+        longitude = Decimal(f"{rng.uniform(min_lon, max_lon):.8f}")
+        latitude = Decimal(f"{rng.uniform(min_lat, max_lat):.8f}")
+        event_date = start + timedelta(days=rng.randint(0, 3650))
+        timestamp = datetime(event_date.year, event_date.month, event_date.day, tzinfo=dt_timezone.utc)
+        fatalities = rng.choice([0, 0, 0, 1, 2, 5])
+        geometry = f'{{"type":"Point","coordinates":[{float(longitude)!r},{float(latitude)!r}]}}'
+
+        instances.append(ProtestEvents(
+            gid=gid,
+            event_date=event_date,
+            year=event_date.year,
+            latitude=latitude,
+            longitude=longitude,
+            fatalities=fatalities,
+            timestamp=timestamp,
+            geom=Point(float(longitude), float(latitude), srid=4326),
+        ))
+        rows.append((gid, event_date, event_date.year, latitude, longitude, fatalities, timestamp, geometry))
+
+    return instances, rows
+
+
+class Command(BaseCommand):
+    help = "Benchmark ProtestEventsSerializer against the tuple-based GeoJSON encoder"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000])
+        parser.add_argument('--skip-drf-above', type=int, default=None,
+                            help='Only time the fast path for sizes above this (DRF at 1M rows takes minutes)')
+        parser.add_argument('--check-rows', type=int, default=1000,
+                            help='Also compare both paths on this many events from the database (0 to skip)')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        if options['check_rows']:
+            self.check_database_rows(renderer, options['check_rows'])
+        self.stdout.write(f"{'rows':>10} {'drf (s)':>10} {'fast (s)':>10} {'speedup':>9}")
+
+        for size in options['sizes']:
+            instances, rows = synthetic_events(size)
+
+            started = time.perf_counter()
+            fast_output = encode_feature_collection(rows)
+            fast_seconds = time.perf_counter() - started
+
+            drf_seconds = None
+            skip_above = options['skip_drf_above']
+            if skip_above is None or size <= skip_above:
+                started = time.perf_counter()
+                data = ProtestEventsSerializer(instances, many=True).data
+                drf_output = renderer.render(data)
+                drf_seconds = time.perf_counter() - started
+                self.check_identical(f'{size} synthetic events', drf_output, fast_output)
+
+            if drf_seconds is None:
+                self.stdout.write(f"{size:>10} {'-':>10} {fast_seconds:>10.3f} {'-':>9}")
+            else:
+                speedup = drf_seconds / fast_seconds if fast_seconds else float('inf')
+                self.stdout.write(f"{size:>10} {drf_seconds:>10.3f} {fast_seconds:>10.3f} {speedup:>8.1f}x")
+
+    def check_database_rows(self, renderer, limit):
+        """
+        Compare the paths on stored events, where the fast path's geometry comes from
+        ST_AsGeoJSON in protest_event_rows() rather than from Python floats
+        """
+        gids = list(ProtestEvents.objects.order_by('gid').values_list('gid', flat=True)[:limit])
+        if not gids:
+            self.stdout.write(self.style.WARNING('No protest events in the database; only synthetic rows are checked'))
+            return
+        queryset = ProtestEvents.objects.filter(gid__in=gids).order_by('gid')
+        drf_output = renderer.render(ProtestEventsSerializer(list(queryset), many=True).data)
+        fast_output = encode_feature_collection(protest_event_rows(queryset))
+        self.check_identical(f'{len(gids)} database events', drf_output, fast_output)
+        self.stdout.write(f"Both paths agree on {len(gids)} database events")
+
+    def check_identical(self, label, drf_output, fast_output):
+        """
+        Both paths must produce the same document; raise on the first differing feature
+        """
+        drf_features = json.loads(drf_output)['features']
+        fast_features = json.loads(fast_output)['features']
+        if len(drf_features) != len(fast_features):
+            raise CommandError(
+                f"{label}: the fast encoder returned {len(fast_features)} features, the serializer {len(drf_features)}"
+            )
+        for drf_feature, fast_feature in zip(drf_features, fast_features):
+            if drf_feature != fast_feature:
+                raise CommandError(
+                    f"{label}: fast encoder output differs from ProtestEventsSerializer for event "
+                    f"{drf_feature.get('id')}:\n  serializer: {json.dumps(drf_feature)}\n  fast:       {json.dumps(fast_feature)}"
+                )
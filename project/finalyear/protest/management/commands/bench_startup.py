@@ -0,0 +1,181 @@
+# protest/management/commands/bench_startup.py
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Packages whose share of the import time is reported separately
+HEAVY_PACKAGES = ('numpy', 'scipy', 'sklearn', 'requests', 'bs4', 'rest_framework', 'django')
+
+DEFAULT_PATHS = (
+    '/api/nairobi-wards/',
+    '/api/spatial-analysis/?metric=poverty_rate&include_kde=true',
+    '/api/trending-hashtags/',
+)
+
+# Run in a fresh interpreter: load the WSGI application and URLconf
+IMPORT_SCRIPT = 'import finalyear.wsgi, finalyear.urls'
+
+# Run in a fresh interpreter: boot the WSGI application and serve one request through it
+FIRST_REQUEST_SCRIPT = '''
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+started = time.perf_counter()
+from finalyear.wsgi import application
+booted = time.perf_counter()
+path, _, query = sys.argv[1].partition('?')
+environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': 'localhost'}
+setup_testing_defaults(environ)
+status = []
+body = b''.join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+done = time.perf_counter()
+print(json.dumps({'responded_at': time.time(), 'boot': booted - started, 'request': done - booted,
+                  'status': int(status[0].split()[0]), 'bytes': len(body)}))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    Total import time and the share of it spent in each of HEAVY_PACKAGES (self times
+    of the package's modules), in seconds, from `python -X importtime` output
+    """
+    total = 0
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        total += int(self_us)
+        package = name.strip().split('.', 1)[0]
+        if package in HEAVY_PACKAGES:
+            packages[package] = packages.get(package, 0) + int(self_us)
+    return total / 1e6, {package: microseconds / 1e6 for package, microseconds in packages.items()}
+
+
+class Command(BaseCommand):
+    help = "Measure import time and time-to-first-request of fresh server processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Fresh processes per measurement (median is reported)')
+        parser.add_argument('--paths', nargs='+', default=list(DEFAULT_PATHS), help='First requests to time')
+        parser.add_argument('--modes', nargs='+', default=['', 'imports'],
+                            help="PROTEST_WARM_UP values to compare: '' loads the analysis stack on first "
+                                 "use, 'imports' preloads protest.warmup.LAZY_MODULES at boot. That list "
+                                 "includes modules added since (risk_cube, search, point_clusters, ...), so "
+                                 "'imports' is not the old eager boot; use --baseline for a before/after comparison")
+        parser.add_argument('--output', default=None, help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', default=None,
+                            help='Results file to compare against, made with --output on another checkout '
+                                 '(copy this command file there if it predates it; PROTEST_WARM_UP has no '
+                                 'effect on a checkout without protest.warmup, so every mode measures its boot)')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in options['modes']:
+            label = mode or 'lazy'
+            env = {**os.environ, 'PROTEST_WARM_UP': mode}
+            results[label] = {
+                'import': self.measure_imports(env, options['runs']),
+                'first_request': {
+                    path: self.measure_first_request(env, path, options['runs']) for path in options['paths']
+                },
+            }
+            self.write_mode(label, results[label])
+
+        if options['output']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps({
+                'meta': {
+                    'created': datetime.now().isoformat(),
+                    'settings': os.environ.get('DJANGO_SETTINGS_MODULE'),
+                    'python': sys.version.split()[0],
+                    'runs': options['runs'],
+                },
+                'results': results,
+            }, indent=2))
+            self.stdout.write(f"Results written to {output}")
+
+        if options['baseline']:
+            self.compare(results, options['baseline'])
+
+    def run_python(self, description, args, env):
+        completed = subprocess.run(
+            [sys.executable, *args], env=env, capture_output=True, text=True, cwd=settings.BASE_DIR
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"{description} failed:\n{completed.stderr[-2000:]}")
+        return completed
+
+    def measure_imports(self, env, runs):
+        totals, wall, packages = [], [], []
+        for _ in range(runs):
+            started = time.perf_counter()
+            completed = self.run_python('Import timing', ['-X', 'importtime', '-c', IMPORT_SCRIPT], env)
+            wall.append(time.perf_counter() - started)
+            total, package_times = parse_importtime(completed.stderr)
+            totals.append(total)
+            packages.append(package_times)
+        return {
+            'total': statistics.median(totals),
+            'process': statistics.median(wall),
+            'packages': {
+                name: statistics.median(run.get(name, 0.0) for run in packages)
+                for name in HEAVY_PACKAGES if any(name in run for run in packages)
+            },
+        }
+
+    def measure_first_request(self, env, path, runs):
+        samples = []
+        for _ in range(runs):
+            spawned = time.time()
+            completed = self.run_python(f'First request to {path}', ['-c', FIRST_REQUEST_SCRIPT, path], env)
+            sample = json.loads(completed.stdout.strip().splitlines()[-1])
+            sample['time_to_first_request'] = sample.pop('responded_at') - spawned
+            samples.append(sample)
+        return {
+            key: statistics.median(sample[key] for sample in samples)
+            for key in ('time_to_first_request', 'boot', 'request')
+        } | {'status': samples[-1]['status'], 'bytes': samples[-1]['bytes']}
+
+    def write_mode(self, label, result):
+        imports = result['import']
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nPROTEST_WARM_UP={label}"))
+        self.stdout.write(f"  import time total {imports['total']:.3f}s (process {imports['process']:.3f}s)")
+        for name, seconds in imports['packages'].items():
+            self.stdout.write(f"    {name:<16} {seconds:>7.3f}s")
+        self.stdout.write(f"  {'first request':<62} {'ttfr (s)':>9} {'boot (s)':>9} {'req (s)':>8} {'status':>6}")
+        for path, timing in result['first_request'].items():
+            self.stdout.write(
+                f"  {path:<62} {timing['time_to_first_request']:>9.3f} {timing['boot']:>9.3f} "
+                f"{timing['request']:>8.3f} {timing['status']:>6}"
+            )
+
+    def compare(self, results, baseline_path):
+        try:
+            baseline = json.loads(Path(baseline_path).read_text())['results']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Cannot read baseline {baseline_path}: {e}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nCompared with {baseline_path} (before -> after)"))
+        for label, result in results.items():
+            before = baseline.get(label)
+            if before is None:
+                continue
+            self.stdout.write(
+                f"  [{label}] import time {before['import']['total']:.3f}s -> {result['import']['total']:.3f}s"
+            )
+            for path, timing in result['first_request'].items():
+                if path in before['first_request']:
+                    self.stdout.write(
+                        f"  [{label}] {path}: {before['first_request'][path]['time_to_first_request']:.3f}s -> "
+                        f"{timing['time_to_first_request']:.3f}s"
+                    )
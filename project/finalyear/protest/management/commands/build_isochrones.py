@@ -0,0 +1,24 @@
+# protest/management/commands/build_isochrones.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from protest.facilities import FACILITY_MODELS
+from protest.isochrones import ISOCHRONE_MINUTES, get_isochrones
+
+
+class Command(BaseCommand):
+    help = "Precompute police and hospital coverage isochrones for the current data versions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', nargs='+', choices=list(FACILITY_MODELS), default=list(FACILITY_MODELS))
+        parser.add_argument('--minutes', nargs='+', type=int, default=list(ISOCHRONE_MINUTES))
+
+    def handle(self, *args, **options):
+        for facility_type in options['types']:
+            started = time.perf_counter()
+            features, version = get_isochrones(facility_type, options['minutes'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"{facility_type}: {len(features)} isochrones for {version} in {elapsed:.2f}s"
+            ))
@@ -0,0 +1,27 @@
+# protest/management/commands/build_risk_cube.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from protest.hotspots import TIME_STEPS
+from protest.risk_cube import cube_directory, update_risk_cube
+
+
+class Command(BaseCommand):
+    help = "Update the memory-mapped density/risk cube, recomputing only slices whose events changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--time-steps', nargs='+', choices=TIME_STEPS, default=list(TIME_STEPS))
+
+    def handle(self, *args, **options):
+        for time_step in options['time_steps']:
+            started = time.perf_counter()
+            index, recomputed = update_risk_cube(time_step)
+            elapsed = time.perf_counter() - started
+            if index is None:
+                self.stdout.write(self.style.WARNING(f"{time_step}: fewer than two dated events at distinct points; no cube"))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"{time_step}: recomputed {recomputed} of {index['slices']} slices in {elapsed:.2f}s "
+                f"({cube_directory(time_step)})"
+            ))
@@ -0,0 +1,19 @@
+# protest/management/commands/build_road_graph.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from protest.routing import get_road_graph, graph_cache_path
+
+
+class Command(BaseCommand):
+    help = "Build (or load) the cached road routing graph for the current roads data version"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        graph = get_road_graph()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Road graph {graph.version}: {graph.node_count} nodes, {graph.edge_count} directed edges "
+            f"ready in {elapsed:.2f}s ({graph_cache_path(graph.version)})"
+        ))
@@ -0,0 +1,26 @@
+# protest/management/commands/bump_data_version.py
+from django.core.management.base import BaseCommand, CommandError
+
+from protest.live import record_change
+from protest.versioning import TRACKED_MODELS, bump_data_version, get_data_version
+
+
+class Command(BaseCommand):
+    help = "Bump data versions by hand (writes bump them through triggers), invalidating cached results and notifying live subscribers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help='Table names to bump (default: all tracked tables)')
+
+    def handle(self, *args, **options):
+        models_by_table = {model._meta.db_table: model for model in TRACKED_MODELS}
+        tables = options['tables'] or list(models_by_table)
+
+        unknown = [table for table in tables if table not in models_by_table]
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(unknown)}. Choose from {', '.join(models_by_table)}")
+
+        models = [models_by_table[table] for table in tables]
+        bump_data_version(*models)
+        for model in models:
+            record_change(model)
+        self.stdout.write(self.style.SUCCESS(f"Data versions now {get_data_version(*models)}"))
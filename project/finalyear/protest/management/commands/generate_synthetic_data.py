@@ -0,0 +1,32 @@
+# protest/management/commands/generate_synthetic_data.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from protest.synthetic import load_synthetic_data
+
+
+class Command(BaseCommand):
+    help = "Fill the benchmark database (finalyear.settings_bench) with synthetic Nairobi data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10000, help='Protest events (1k to 1M)')
+        parser.add_argument('--roads', type=int, default=5000, help='Road segments')
+        parser.add_argument('--police', type=int, default=60, help='Police stations')
+        parser.add_argument('--hospitals', type=int, default=300, help='Hospitals')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = load_synthetic_data(
+            events=options['events'],
+            roads_count=options['roads'],
+            police=options['police'],
+            hospital_count=options['hospitals'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        )
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {total} synthetic rows in {time.perf_counter() - started:.1f}s (seed {options['seed']})"
+        ))
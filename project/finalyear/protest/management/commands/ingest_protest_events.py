@@ -0,0 +1,382 @@
+# protest/management/commands/ingest_protest_events.py
+import csv
+import hashlib
+import io
+import json
+import os
+import struct
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from protest.live import record_change
+from protest.models import ProtestEvents
+from protest.sync import prune_change_log
+from protest.triggers import install_triggers
+
+
+TABLE = ProtestEvents._meta.db_table
+STAGING_TABLE = 'protest_events_staging'
+STAGING_COLUMNS = ('event_date', 'year', 'latitude', 'longitude', 'fatalities', 'timestamp', 'geom', 'source_event_id')
+
+# Events already loaded are detected by source_event_id, a column migration 0007 (or
+# protest/sql/add_source_event_id.sql) adds to the table; the ORM does not map it. It
+# holds the export's own event id, or failing that a hash of what identifies an event in
+# ACLED-style exports, so two different events at the same place on the same day are
+# both kept. Fatalities and the export timestamp are left
+# out of the hash because re-exports revise them.
+SOURCE_KEY = 'source_event_id'
+SOURCE_ID_FIELDS = ('event_id_cnty', 'event_id', 'source_event_id', 'id')
+IDENTITY_FIELDS = ('event_type', 'sub_event_type', 'actor1', 'assoc_actor_1', 'actor2', 'assoc_actor_2', 'notes')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d %B %Y', '%d/%m/%Y', '%Y/%m/%d', '%d-%b-%Y')
+
+# Hex EWKB header for a little-endian POINT with SRID 4326
+EWKB_POINT_4326 = '0101000020E6100000'
+
+
+def parse_decimal(value, places):
+    """
+    Parse a coordinate into a Decimal rounded to the column's precision
+    """
+    if value is None or value == '':
+        return None
+    try:
+        return round(Decimal(str(value).strip()), places)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def parse_int(value):
+    """
+    Parse an integer column, accepting floats such as '2.0'
+    """
+    if value is None or value == '':
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_timestamp(value):
+    """
+    Normalize epoch seconds/milliseconds or ISO strings to an aware UTC datetime
+    """
+    if value is None or value == '':
+        return None
+
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            value = float(value)
+        except ValueError:
+            try:
+                parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                return None
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=dt_timezone.utc)
+            return parsed.astimezone(dt_timezone.utc)
+
+    try:
+        seconds = float(value)
+        # Values this large are milliseconds since the epoch
+        if abs(seconds) > 1e11:
+            seconds /= 1000.0
+        return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def parse_date(value):
+    """
+    Parse an event date in any of the formats found in the source exports
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).date()
+    except ValueError:
+        return None
+
+
+def point_hexewkb(longitude, latitude):
+    """
+    Encode a WGS84 point as hex EWKB, which PostGIS accepts directly in COPY
+    """
+    return EWKB_POINT_4326 + struct.pack('<dd', longitude, latitude).hex().upper()
+
+
+def source_event_id(record, latitude, longitude, event_date):
+    """
+    The record's own event id, or a hash of its location, date and IDENTITY_FIELDS
+    """
+    for field in SOURCE_ID_FIELDS:
+        value = record.get(field)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    identity = [str(latitude), str(longitude), event_date.isoformat() if event_date else '']
+    identity += [str(record.get(field) or '').strip() for field in IDENTITY_FIELDS]
+    return 'sha1:' + hashlib.sha1('\x1f'.join(identity).encode('utf-8')).hexdigest()
+
+
+def normalize_record(record):
+    """
+    Turn a raw CSV/JSON record into a tuple of staging column values.
+    Returns None when the record has no usable location.
+    """
+    latitude = parse_decimal(record.get('latitude'), 8)
+    longitude = parse_decimal(record.get('longitude'), 8)
+    if latitude is None or longitude is None:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+
+    timestamp = parse_timestamp(record.get('timestamp'))
+    event_date = parse_date(record.get('event_date'))
+    if event_date is None and timestamp is not None:
+        event_date = timestamp.date()
+
+    year = parse_int(record.get('year'))
+    if year is None and event_date is not None:
+        year = event_date.year
+
+    return (
+        event_date,
+        year,
+        latitude,
+        longitude,
+        parse_int(record.get('fatalities')),
+        timestamp,
+        point_hexewkb(float(longitude), float(latitude)),
+        source_event_id(record, latitude, longitude, event_date),
+    )
+
+
+def iter_records(path, file_format):
+    """
+    Stream raw records from a CSV, JSON Lines, JSON array or GeoJSON file
+    """
+    if file_format == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            yield from csv.DictReader(handle)
+        return
+
+    if file_format == 'jsonl':
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield flatten_feature(json.loads(line))
+        return
+
+    # Plain JSON has to be parsed whole; use JSON Lines for very large files
+    with open(path, encoding='utf-8') as handle:
+        payload = json.load(handle)
+    if isinstance(payload, dict):
+        payload = payload.get('features', payload.get('results', []))
+    for item in payload:
+        yield flatten_feature(item)
+
+
+def flatten_feature(item):
+    """
+    Accept GeoJSON features as well as flat records
+    """
+    if item.get('type') != 'Feature':
+        return item
+    record = dict(item.get('properties') or {})
+    if item.get('id') is not None and 'id' not in record:
+        record['id'] = item['id']
+    geometry = item.get('geometry') or {}
+    if geometry.get('type') == 'Point' and 'latitude' not in record:
+        record['longitude'], record['latitude'] = geometry['coordinates'][:2]
+    return record
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension in ('.json', '.geojson'):
+        return 'json'
+    raise CommandError(f"Cannot infer format of {path}; pass --format")
+
+
+def copy_value(value):
+    """
+    Render a value in PostgreSQL COPY text format
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def copy_into(cursor, sql, buffer):
+    """
+    Run COPY ... FROM STDIN with either psycopg2 or psycopg 3
+    """
+    raw_cursor = cursor.cursor
+    buffer.seek(0)
+    if hasattr(raw_cursor, 'copy_expert'):
+        raw_cursor.copy_expert(sql, buffer)
+    else:
+        with raw_cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+class Command(BaseCommand):
+    help = "Bulk-load protest events from CSV/JSON files using COPY, normalizing and deduplicating on the way in"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='CSV, JSON, JSON Lines or GeoJSON files to ingest')
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl'], help='Override format detection')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows buffered per COPY batch')
+        parser.add_argument('--dry-run', action='store_true', help='Parse and stage rows, then roll back')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        chunk_size = max(options['chunk_size'], 1)
+        stats = {'read': 0, 'staged': 0, 'invalid': 0}
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                self.prepare_tables(cursor)
+
+                for path in options['paths']:
+                    if not os.path.exists(path):
+                        raise CommandError(f"File not found: {path}")
+                    file_format = options['format'] or detect_format(path)
+                    self.stage_file(cursor, path, file_format, chunk_size, stats)
+
+                inserted_gids = self.merge_staging(cursor)
+                inserted = len(inserted_gids)
+
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            elif inserted:
+                # The insert trigger bumps the data version; pushed to live subscribers once
+                # the transaction commits
+                record_change(ProtestEvents, inserted_gids)
+
+        if inserted and not options['dry_run']:
+            # Fold the new rows into the hexbin pyramid now rather than on the next map request
+            from protest.hexbins import get_hex_pyramid
+
+            get_hex_pyramid()
+
+        if not options['dry_run']:
+            # Ingest is the regular write path, so it also keeps the change log bounded
+            retention = getattr(settings, 'PROTEST_CHANGE_LOG_RETENTION_DAYS', 30)
+            prune_change_log(timezone.now() - timedelta(days=retention))
+
+        elapsed = time.perf_counter() - started
+        duplicates = stats['staged'] - inserted
+        summary = (
+            f"Read {stats['read']} records, skipped {stats['invalid']} without valid coordinates, "
+            f"skipped {duplicates} duplicates, inserted {inserted} events in {elapsed:.2f}s"
+        )
+        if options['dry_run']:
+            summary += ' (dry run, rolled back)'
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def prepare_tables(self, cursor):
+        cursor.execute(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s "
+            "AND column_name IN ('timestamp', %s)",
+            [TABLE, SOURCE_KEY],
+        )
+        column_types = dict(cursor.fetchall())
+        timestamp_type = column_types.get('timestamp')
+        if timestamp_type is not None and not timestamp_type.startswith('timestamp'):
+            raise CommandError(
+                f"{TABLE}.timestamp is {timestamp_type}, not timestamptz; convert it once with "
+                f"protest/sql/convert_timestamp_column.sql before ingesting"
+            )
+        if SOURCE_KEY not in column_types:
+            raise CommandError(
+                f"{TABLE}.{SOURCE_KEY} is missing; run migrate, or protest/sql/add_source_event_id.sql "
+                f"if the table was loaded after the migrations ran"
+            )
+
+        # The table may have been loaded outside Django after the migrations ran
+        install_triggers(connection)
+        cursor.execute(
+            f'CREATE TEMP TABLE {STAGING_TABLE} ('
+            f'event_date date, year integer, latitude numeric(10, 8), longitude numeric(11, 8), '
+            f'fatalities integer, "timestamp" timestamptz, geom geometry(Point, 4326), {SOURCE_KEY} text'
+            f') ON COMMIT DROP'
+        )
+
+    def stage_file(self, cursor, path, file_format, chunk_size, stats):
+        """
+        Normalize records and COPY them into the staging table chunk by chunk
+        """
+        columns = ', '.join(f'"{column}"' for column in STAGING_COLUMNS)
+        copy_sql = f"COPY {STAGING_TABLE} ({columns}) FROM STDIN"
+        buffer = io.StringIO()
+        pending = 0
+
+        for record in iter_records(path, file_format):
+            stats['read'] += 1
+            row = normalize_record(record)
+            if row is None:
+                stats['invalid'] += 1
+                continue
+            buffer.write('\t'.join(copy_value(value) for value in row))
+            buffer.write('\n')
+            pending += 1
+
+            if pending >= chunk_size:
+                copy_into(cursor, copy_sql, buffer)
+                stats['staged'] += pending
+                buffer = io.StringIO()
+                pending = 0
+
+        if pending:
+            copy_into(cursor, copy_sql, buffer)
+            stats['staged'] += pending
+
+        self.stdout.write(f"Staged {path} ({stats['staged']} rows so far)")
+
+    def merge_staging(self, cursor):
+        """
+        Insert staged rows that are new by source_event_id (keeping the latest revision of
+        each), in a single set-based statement. Rows loaded before source_event_id existed
+        (or created outside this command) have no key and are matched on latitude, longitude
+        and event_date instead. Returns the gids of the inserted rows.
+        """
+        columns = ', '.join(f'"{column}"' for column in STAGING_COLUMNS)
+        staged_columns = ', '.join(f's."{column}"' for column in STAGING_COLUMNS)
+        cursor.execute(
+            f"INSERT INTO {TABLE} ({columns}) "
+            f"SELECT DISTINCT ON (s.{SOURCE_KEY}) {staged_columns} "
+            f"FROM {STAGING_TABLE} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {TABLE} e WHERE e.{SOURCE_KEY} = s.{SOURCE_KEY}) "
+            f"AND NOT EXISTS ("
+            f"SELECT 1 FROM {TABLE} e WHERE e.{SOURCE_KEY} IS NULL "
+            f"AND e.latitude = s.latitude AND e.longitude = s.longitude "
+            f"AND e.event_date IS NOT DISTINCT FROM s.event_date) "
+            f"ORDER BY s.{SOURCE_KEY}, s.\"timestamp\" DESC NULLS LAST "
+            f"RETURNING gid"
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,21 @@
+# protest/management/commands/install_triggers.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from protest.triggers import EVENTS_TABLE, VERSIONED_TABLES, install_triggers
+
+
+class Command(BaseCommand):
+    help = "Install the data-version and change-log triggers on the GIS tables (run after loading them outside Django)"
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The triggers need PostgreSQL')
+        installed = install_triggers(connection)
+        for table in VERSIONED_TABLES:
+            if table in installed:
+                self.stdout.write(self.style.SUCCESS(f'Triggers installed on {table}'))
+            else:
+                self.stdout.write(self.style.WARNING(f'{table} does not exist yet; run this again after loading it'))
+        if EVENTS_TABLE not in installed:
+            raise CommandError(f'{EVENTS_TABLE} does not exist; ?since= deltas stay unavailable until it is loaded')
@@ -0,0 +1,97 @@
+# protest/management/commands/load_test.py
+import json
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from protest.loadtest import run_load, start_scrape_stub
+
+
+class Command(BaseCommand):
+    help = "Replay the dashboard's request pattern with concurrent virtual users against a running server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test')
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+        parser.add_argument('--visits', type=int, default=None, help='Stop each user after this many visits')
+        parser.add_argument('--ramp-up', type=float, default=0, help='Seconds over which users are started')
+        parser.add_argument('--think-time', type=float, default=1.0, help='Pause between a user\'s visits')
+        parser.add_argument('--timeout', type=float, default=120, help='Per-request timeout')
+        parser.add_argument('--stub-port', type=int, default=getattr(settings, 'PROTEST_SCRAPE_STUB_PORT', None),
+                            help='Serve the trending-hashtags scrape targets locally on this port')
+        parser.add_argument('--no-stub', action='store_true', help='Do not start the scrape stub')
+        parser.add_argument('--output', default=None, help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+
+        stub = None
+        if options['stub_port'] and not options['no_stub']:
+            try:
+                stub = start_scrape_stub(options['stub_port'])
+            except OSError as e:
+                raise CommandError(f"Cannot start the scrape stub on port {options['stub_port']}: {e}")
+            self.stdout.write(f"Scrape stub listening on 127.0.0.1:{options['stub_port']}")
+
+        self.stdout.write(
+            f"{options['users']} users against {options['url']} for {options['duration']:g}s "
+            f"(think time {options['think_time']:g}s, ramp-up {options['ramp_up']:g}s)"
+        )
+        try:
+            stats, elapsed = run_load(
+                options['url'],
+                options['users'],
+                options['duration'],
+                think_time=options['think_time'],
+                ramp_up=options['ramp_up'],
+                visits=options['visits'],
+                timeout=options['timeout'],
+            )
+        finally:
+            if stub is not None:
+                stub.shutdown()
+
+        results = stats.summary(elapsed)
+        self.write_table(results, elapsed)
+        if options['output']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps({
+                'meta': {
+                    'created': datetime.now().isoformat(),
+                    'url': options['url'],
+                    'users': options['users'],
+                    'duration': elapsed,
+                    'think_time': options['think_time'],
+                    'ramp_up': options['ramp_up'],
+                },
+                'results': results,
+            }, indent=2))
+            self.stdout.write(f"Results written to {output}")
+
+    def write_table(self, results, elapsed):
+        def ms(value):
+            return f"{value * 1000:.0f}" if value is not None else '-'
+
+        self.stdout.write(
+            f"\n{'endpoint':<24} {'requests':>9} {'errors':>7} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        total = errors = 0
+        for name, result in results.items():
+            line = (
+                f"{name:<24} {result['count']:>9} {result['errors']:>7} {result['throughput']:>8.2f} "
+                f"{ms(result['p50']):>8} {ms(result['p95']):>8} {ms(result['p99']):>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+            if name != 'visit':
+                total += result['count']
+                errors += result['errors']
+        self.stdout.write(f"\n{total} requests ({errors} failed) in {elapsed:.1f}s: {total / elapsed:.1f} req/s")
+        for name, result in results.items():
+            for kind, count in result['error_kinds'].items():
+                self.stdout.write(self.style.WARNING(f"{name}: {count} x {kind}"))
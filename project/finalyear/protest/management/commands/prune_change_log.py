@@ -0,0 +1,22 @@
+# protest/management/commands/prune_change_log.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from protest.sync import prune_change_log
+
+
+class Command(BaseCommand):
+    help = "Delete protest_event_change rows older than the retention period (run daily, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=getattr(settings, 'PROTEST_CHANGE_LOG_RETENTION_DAYS', 30),
+                            help='Keep this many days of changes; older sync tokens get a full reload')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days cannot be negative')
+        deleted = prune_change_log(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} change log rows older than {options['days']:g} days"))
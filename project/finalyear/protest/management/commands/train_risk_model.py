@@ -0,0 +1,38 @@
+# protest/management/commands/train_risk_model.py
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from protest.forecast import FEATURE_NAMES, model_path, train_risk_model
+
+
+class Command(BaseCommand):
+    help = "Train the ward protest risk model, save it for the API and benchmark training/scoring time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--score-repeats', type=int, default=1000,
+                            help='Times to score the full ward matrix when timing the scoring path')
+
+    def handle(self, *args, **options):
+        model, timings = train_risk_model()
+        metadata = model.metadata
+        self.stdout.write(
+            f"Trained on {metadata['training_rows']} ward-months ({metadata['first_month']} to "
+            f"{metadata['last_month']}), holdout D² {metadata['holdout_d2']}"
+        )
+        for name in FEATURE_NAMES:
+            self.stdout.write(f"  {name:>14} {metadata['coefficients'][name]:>8.4f}")
+
+        X = np.random.default_rng(0).normal(size=(metadata['ward_count'], len(FEATURE_NAMES)))
+        X = X * model.scale + model.mean
+        repeats = max(options['score_repeats'], 1)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            model.score(X)
+        score_seconds = (time.perf_counter() - started) / repeats
+
+        self.stdout.write(f"{'panel build (s)':>18} {timings['panel_seconds']:>10.3f}")
+        self.stdout.write(f"{'fit (s)':>18} {timings['fit_seconds']:>10.3f}")
+        self.stdout.write(f"{'score wards (ms)':>18} {score_seconds * 1000:>10.4f}")
+        self.stdout.write(self.style.SUCCESS(f"Saved {model_path()}"))
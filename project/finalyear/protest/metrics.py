@@ -0,0 +1,223 @@
+# protest/metrics.py
+"""
+In-process request metrics exposed in Prometheus text format at /api/_metrics.
+
+MetricsMiddleware records, per view: latency, SQL query count and time (through a
+connection execute_wrapper), and response bytes. span()/timed() add named stages inside
+a request (serialization, KDE, scraping) to a per-view stage histogram. Each observation
+is a bisect and an update under a per-histogram lock, so it is cheap enough to leave on.
+
+Metrics are per process; with several workers each one reports its own counters and
+Prometheus should scrape every worker (or sum the series by instance).
+
+The endpoint answers staff users and scrapers that send settings.PROTEST_METRICS_TOKEN
+as `Authorization: Bearer <token>` (Prometheus' `authorization` scrape option); everyone
+else gets a 403, and it is a 404 while PROTEST_METRICS_ENABLED is off.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+def metrics_enabled():
+    return getattr(settings, 'PROTEST_METRICS_ENABLED', True)
+
+
+def metrics_access_allowed(request):
+    """
+    True for staff users and for requests carrying the configured bearer token
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    token = getattr(settings, 'PROTEST_METRICS_TOKEN', '')
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        credentials.strip().encode(), token.encode()
+    )
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram keyed by a tuple of label values
+    """
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        position = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[position] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound:g}"'
+                lines.append(f'{self.name}_bucket{format_labels(self.label_names, label_values, le)} {cumulative}')
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {float(values[-1])!r}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'protest_request_duration_seconds', 'Request latency by view', ('view', 'method', 'status'), LATENCY_BUCKETS
+)
+SQL_QUERIES = Histogram(
+    'protest_request_sql_queries', 'SQL queries per request by view', ('view',), QUERY_COUNT_BUCKETS
+)
+SQL_SECONDS = Histogram(
+    'protest_request_sql_duration_seconds', 'Time spent in SQL per request by view', ('view',), LATENCY_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    'protest_response_bytes', 'Response body size by view', ('view',), BYTES_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    'protest_stage_duration_seconds', 'Time spent in named stages (serialization, KDE, scraping) by view',
+    ('view', 'stage'), LATENCY_BUCKETS
+)
+HISTOGRAMS = (REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, RESPONSE_BYTES, STAGE_SECONDS)
+
+
+class RequestMetrics:
+    """
+    Per-request SQL totals, filled in by the execute_wrapper
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+_current = ContextVar('protest_request_metrics', default=None)
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a block as `stage` of the current request's view ('-' outside a request)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics_enabled():
+            current = _current.get()
+            STAGE_SECONDS.observe((current.view if current else '-', stage), time.perf_counter() - started)
+
+
+def timed(stage):
+    """
+    Decorator form of span()
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def counted_stream(chunks, view):
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    RESPONSE_BYTES.observe((view,), size)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL and response size for every request routed to a view
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics_enabled():
+            return self.get_response(request)
+
+        current = RequestMetrics('unmatched')
+        token = _current.set(current)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(current.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+
+        view = current.view
+        REQUEST_SECONDS.observe((view, request.method, response.status_code), elapsed)
+        SQL_QUERIES.observe((view,), current.queries)
+        SQL_SECONDS.observe((view,), current.sql_seconds)
+        if not response.streaming:
+            RESPONSE_BYTES.observe((view,), len(response.content))
+        elif not getattr(response, 'is_async', False):
+            response.streaming_content = counted_stream(response.streaming_content, view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Label by route name so metrics stay low-cardinality whatever the URL parameters
+        current = _current.get()
+        if current is not None and request.resolver_match is not None:
+            current.view = request.resolver_match.view_name or view_func.__name__
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,75 @@
+from django.db import migrations, models
+
+
+# Statement-level triggers with transition tables log a bulk insert of N rows with one
+# INSERT ... SELECT rather than N trigger calls. protest_events is unmanaged, so the
+# triggers are only created where the table exists.
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION protest_event_log_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO protest_event_change (gid, deleted, txid, changed_at)
+        SELECT gid, true, pg_current_xact_id()::text::bigint, now() FROM old_rows;
+    ELSE
+        INSERT INTO protest_event_change (gid, deleted, txid, changed_at)
+        SELECT gid, false, pg_current_xact_id()::text::bigint, now() FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF to_regclass('protest_events') IS NOT NULL THEN
+        CREATE TRIGGER protest_events_log_insert AFTER INSERT ON protest_events
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION protest_event_log_change();
+        CREATE TRIGGER protest_events_log_update AFTER UPDATE ON protest_events
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION protest_event_log_change();
+        CREATE TRIGGER protest_events_log_delete AFTER DELETE ON protest_events
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION protest_event_log_change();
+    END IF;
+END;
+$$;
+"""
+
+DROP_TRIGGERS = """
+DO $$
+BEGIN
+    IF to_regclass('protest_events') IS NOT NULL THEN
+        DROP TRIGGER IF EXISTS protest_events_log_insert ON protest_events;
+        DROP TRIGGER IF EXISTS protest_events_log_update ON protest_events;
+        DROP TRIGGER IF EXISTS protest_events_log_delete ON protest_events;
+    END IF;
+END;
+$$;
+DROP FUNCTION IF EXISTS protest_event_log_change();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('protest', '0003_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProtestEventChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('gid', models.IntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('txid', models.BigIntegerField(db_index=True)),
+                ('changed_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Protest Event Change',
+                'verbose_name_plural': 'Protest Event Changes',
+                'db_table': 'protest_event_change',
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,90 @@
+from django.db import migrations, models
+
+
+# The SQL is frozen here rather than taken from protest.triggers, so later edits to that
+# module do not change what this migration applied. 0004 only created the change-log
+# triggers if protest_events already existed; (re)create them now along with the TRUNCATE
+# trigger that moves the new horizon. Tables created later get their triggers from
+# protest.triggers.install_triggers (synthetic.ensure_tables, manage.py install_triggers).
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION protest_event_log_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO protest_event_change (gid, deleted, txid, changed_at)
+        SELECT gid, true, pg_current_xact_id()::text::bigint, now() FROM old_rows;
+    ELSE
+        INSERT INTO protest_event_change (gid, deleted, txid, changed_at)
+        SELECT gid, false, pg_current_xact_id()::text::bigint, now() FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION protest_event_log_truncate() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO protest_change_log_horizon (table_name, txid, changed_at)
+    VALUES (TG_TABLE_NAME, pg_current_xact_id()::text::bigint, now())
+    ON CONFLICT (table_name) DO UPDATE SET
+        txid = GREATEST(protest_change_log_horizon.txid, EXCLUDED.txid),
+        changed_at = GREATEST(protest_change_log_horizon.changed_at, EXCLUDED.changed_at);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF to_regclass('protest_events') IS NOT NULL THEN
+        DROP TRIGGER IF EXISTS protest_events_log_insert ON protest_events;
+        DROP TRIGGER IF EXISTS protest_events_log_update ON protest_events;
+        DROP TRIGGER IF EXISTS protest_events_log_delete ON protest_events;
+        DROP TRIGGER IF EXISTS protest_events_log_truncate ON protest_events;
+        CREATE TRIGGER protest_events_log_insert AFTER INSERT ON protest_events
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION protest_event_log_change();
+        CREATE TRIGGER protest_events_log_update AFTER UPDATE ON protest_events
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION protest_event_log_change();
+        CREATE TRIGGER protest_events_log_delete AFTER DELETE ON protest_events
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION protest_event_log_change();
+        CREATE TRIGGER protest_events_log_truncate AFTER TRUNCATE ON protest_events
+            FOR EACH STATEMENT EXECUTE FUNCTION protest_event_log_truncate();
+    END IF;
+END;
+$$;
+"""
+
+DROP_TRUNCATE_TRIGGER = """
+DO $$
+BEGIN
+    IF to_regclass('protest_events') IS NOT NULL THEN
+        DROP TRIGGER IF EXISTS protest_events_log_truncate ON protest_events;
+    END IF;
+END;
+$$;
+DROP FUNCTION IF EXISTS protest_event_log_truncate();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('protest', '0004_protesteventchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogHorizon',
+            fields=[
+                ('table_name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('txid', models.BigIntegerField()),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Change Log Horizon',
+                'verbose_name_plural': 'Change Log Horizons',
+                'db_table': 'protest_change_log_horizon',
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRUNCATE_TRIGGER),
+    ]
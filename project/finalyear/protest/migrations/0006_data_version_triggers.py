@@ -0,0 +1,92 @@
+from django.db import migrations
+
+
+# Bump protest_data_version from statement-level triggers on every tracked GIS table, so
+# queryset update(), bulk_create and loads made outside Django invalidate cached results.
+# The SQL is frozen here rather than taken from protest.triggers; the GIS tables are
+# unmanaged, so only those that exist get triggers.
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION protest_bump_data_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF NOT EXISTS (SELECT 1 FROM old_rows) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF TG_OP <> 'TRUNCATE' THEN
+        IF NOT EXISTS (SELECT 1 FROM new_rows) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    INSERT INTO protest_data_version (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now())
+    ON CONFLICT (table_name) DO UPDATE SET
+        version = protest_data_version.version + 1,
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tracked text;
+BEGIN
+    FOREACH tracked IN ARRAY ARRAY['nairobi', 'roads', 'policestn', 'protest_events', 'hospitals', 'merged_wards'] LOOP
+        IF to_regclass(tracked) IS NOT NULL THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tracked || '_bump_version_insert', tracked);
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tracked || '_bump_version_update', tracked);
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tracked || '_bump_version_delete', tracked);
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tracked || '_bump_version_truncate', tracked);
+            EXECUTE format(
+                'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+                'FOR EACH STATEMENT EXECUTE FUNCTION protest_bump_data_version()',
+                tracked || '_bump_version_insert', tracked
+            );
+            EXECUTE format(
+                'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS new_rows '
+                'FOR EACH STATEMENT EXECUTE FUNCTION protest_bump_data_version()',
+                tracked || '_bump_version_update', tracked
+            );
+            EXECUTE format(
+                'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+                'FOR EACH STATEMENT EXECUTE FUNCTION protest_bump_data_version()',
+                tracked || '_bump_version_delete', tracked
+            );
+            EXECUTE format(
+                'CREATE TRIGGER %I AFTER TRUNCATE ON %I '
+                'FOR EACH STATEMENT EXECUTE FUNCTION protest_bump_data_version()',
+                tracked || '_bump_version_truncate', tracked
+            );
+        END IF;
+    END LOOP;
+END;
+$$;
+"""
+
+DROP_TRIGGERS = """
+DO $$
+DECLARE
+    tracked text;
+BEGIN
+    FOREACH tracked IN ARRAY ARRAY['nairobi', 'roads', 'policestn', 'protest_events', 'hospitals', 'merged_wards'] LOOP
+        IF to_regclass(tracked) IS NOT NULL THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tracked || '_bump_version_insert', tracked);
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tracked || '_bump_version_update', tracked);
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tracked || '_bump_version_delete', tracked);
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tracked || '_bump_version_truncate', tracked);
+        END IF;
+    END LOOP;
+END;
+$$;
+DROP FUNCTION IF EXISTS protest_bump_data_version();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('protest', '0005_changeloghorizon'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# The key columns ingest_protest_events deduplicates on, as in
+# protest/sql/add_source_event_id.sql. protest_events is unmanaged, so they are only
+# added where the table exists; the reverse keeps the column and its loaded values.
+ADD_SOURCE_KEY = """
+DO $$
+BEGIN
+    IF to_regclass('protest_events') IS NOT NULL THEN
+        ALTER TABLE protest_events ADD COLUMN IF NOT EXISTS source_event_id text;
+        CREATE UNIQUE INDEX IF NOT EXISTS protest_events_source_event_id_key
+            ON protest_events (source_event_id);
+        CREATE INDEX IF NOT EXISTS protest_events_natural_key_idx
+            ON protest_events (latitude, longitude, event_date)
+            WHERE source_event_id IS NULL;
+    END IF;
+END;
+$$;
+"""
+
+DROP_SOURCE_KEY_INDEXES = """
+DROP INDEX IF EXISTS protest_events_natural_key_idx;
+DROP INDEX IF EXISTS protest_events_source_event_id_key;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('protest', '0006_data_version_triggers'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ADD_SOURCE_KEY, DROP_SOURCE_KEY_INDEXES),
+    ]
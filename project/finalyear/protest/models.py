@@ -352,3 +352,62 @@ class MergedWards(models.Model):
 
 
 
+
+
+class DataVersion(models.Model):
+    """
+    Per-table version counter used to key cached and precomputed analysis results.
+    Bumped by statement-level triggers on every write to the table (protest/triggers.py)
+    and explicitly by bump_data_version.
+    """
+    table_name = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'protest_data_version'
+        verbose_name = 'Data Version'
+        verbose_name_plural = 'Data Versions'
+
+    def __str__(self):
+        return f"{self.table_name} v{self.version}"
+
+
+class ProtestEventChange(models.Model):
+    """
+    Change log of protest_events, written by database triggers (protest/triggers.py) so that
+    every insert, update and delete is recorded, including loads made outside Django.
+    txid is the writing transaction's id; sync tokens are snapshot xmins compared against it.
+    """
+    id = models.BigAutoField(primary_key=True)
+    gid = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    txid = models.BigIntegerField(db_index=True)
+    changed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'protest_event_change'
+        verbose_name = 'Protest Event Change'
+        verbose_name_plural = 'Protest Event Changes'
+
+    def __str__(self):
+        return f"{'Deleted' if self.deleted else 'Changed'} protest event {self.gid}"
+
+
+class ChangeLogHorizon(models.Model):
+    """
+    How far back protest_event_change is complete. Pruning (sync.prune_change_log) and
+    TRUNCATE (a trigger, see protest/triggers.py) move it forward; a `since` at or
+    before it can no longer be answered with a delta.
+    """
+    table_name = models.CharField(max_length=100, primary_key=True)
+    txid = models.BigIntegerField()
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'protest_change_log_horizon'
+        verbose_name = 'Change Log Horizon'
+        verbose_name_plural = 'Change Log Horizons'
+
+    def __str__(self):
+        return f"{self.table_name} complete after txid {self.txid}"
@@ -0,0 +1,139 @@
+# protest/point_clusters.py
+"""
+Hierarchical grid clustering of protest events for map display.
+
+Events are bucketed into square cells of CLUSTER_RADIUS_PX screen pixels in Web Mercator
+at MAX_CLUSTER_ZOOM, and every coarser zoom merges the 2x2 child cells of the level below,
+so all zoom levels come from one pass over the points. Each level is kept sorted by x so
+a bbox query is a binary search plus a mask. The index is built once per data version.
+"""
+import math
+
+import numpy as np
+
+from .models import ProtestEvents
+from .snapshot import Snapshot, get_event_snapshot
+
+
+CLUSTER_RADIUS_PX = 64
+TILE_SIZE = 256
+MAX_CLUSTER_ZOOM = 16
+NO_DATE = np.iinfo(np.int64).min
+
+
+def mercator_unit(lon, lat):
+    """
+    Web Mercator coordinates scaled to [0, 1) with y pointing south
+    """
+    x = (np.asarray(lon) + 180) / 360
+    sin_lat = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def cell_size(zoom):
+    return CLUSTER_RADIUS_PX / (TILE_SIZE * 2 ** zoom)
+
+
+class ClusterLevel:
+    """
+    Clusters of one zoom level, sorted by x
+    """
+
+    def __init__(self, columns, rows, count, fatalities, sum_x, sum_y, latest, gid):
+        order = np.argsort(sum_x / count, kind='stable')
+        self.columns, self.rows = columns[order], rows[order]
+        self.count, self.fatalities = count[order], fatalities[order]
+        self.sum_x, self.sum_y = sum_x[order], sum_y[order]
+        self.latest, self.gid = latest[order], gid[order]
+        self.x = self.sum_x / self.count
+        self.y = self.sum_y / self.count
+        self.lon = self.x * 360 - 180
+        self.lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * self.y))))
+
+    def merge(self, columns, rows):
+        """
+        Aggregate these clusters into the cells (columns, rows) of the next coarser level
+        """
+        keys = columns * (1 << 32) + rows
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        size = len(unique_keys)
+        count = np.bincount(inverse, weights=self.count, minlength=size).astype(np.int64)
+        latest = np.full(size, NO_DATE, dtype=np.int64)
+        np.maximum.at(latest, inverse, self.latest)
+        return ClusterLevel(
+            columns[first], rows[first], count,
+            np.bincount(inverse, weights=self.fatalities, minlength=size).astype(np.int64),
+            np.bincount(inverse, weights=self.sum_x, minlength=size),
+            np.bincount(inverse, weights=self.sum_y, minlength=size),
+            latest,
+            np.where(count == 1, self.gid[first], -1),
+        )
+
+    def query(self, bbox):
+        if bbox is None:
+            return np.arange(len(self.count))
+        west, south, east, north = bbox
+        (x_min, x_max), (y_max, y_min) = mercator_unit([west, east], [south, north])
+        start = int(np.searchsorted(self.x, x_min, side='left'))
+        stop = int(np.searchsorted(self.x, x_max, side='right'))
+        inside = (self.y[start:stop] >= y_min) & (self.y[start:stop] <= y_max)
+        return np.flatnonzero(inside) + start
+
+
+class PointClusterIndex:
+    """
+    Cluster levels for zooms 0..MAX_CLUSTER_ZOOM built bottom-up from event column arrays
+    """
+
+    def __init__(self, events):
+        x, y = mercator_unit(events['lon'], events['lat'])
+        dates = events['dates']
+        latest = np.where(np.isnat(dates), NO_DATE, dates.astype('datetime64[D]').astype(np.int64))
+        size = cell_size(MAX_CLUSTER_ZOOM)
+        points = ClusterLevel(
+            np.floor(x / size).astype(np.int64), np.floor(y / size).astype(np.int64),
+            np.ones(len(x), dtype=np.int64), events['fatalities'].astype(np.int64),
+            x, y, latest, events['gids'].astype(np.int64),
+        )
+        self.levels = {MAX_CLUSTER_ZOOM: points.merge(points.columns, points.rows)}
+        for zoom in range(MAX_CLUSTER_ZOOM - 1, -1, -1):
+            finer = self.levels[zoom + 1]
+            self.levels[zoom] = finer.merge(finer.columns >> 1, finer.rows >> 1)
+
+    def features(self, zoom, bbox=None):
+        level = self.levels[int(min(max(zoom, 0), MAX_CLUSTER_ZOOM))]
+        selected = level.query(bbox)
+        latest = level.latest[selected]
+        dates = np.where(
+            latest != NO_DATE, np.datetime_as_string(np.where(latest != NO_DATE, latest, 0).astype('datetime64[D]')), None
+        ).tolist()
+
+        # Plain lists keep the per-feature loop free of NumPy scalar access
+        features = []
+        for lon, lat, count, fatalities, gid, date in zip(
+            np.round(level.lon[selected], 6).tolist(), np.round(level.lat[selected], 6).tolist(),
+            level.count[selected].tolist(), level.fatalities[selected].tolist(), level.gid[selected].tolist(), dates,
+        ):
+            point = {'type': 'Point', 'coordinates': [lon, lat]}
+            if count == 1:
+                features.append({
+                    'type': 'Feature',
+                    'id': gid,
+                    'geometry': point,
+                    'properties': {'cluster': False, 'gid': gid, 'fatalities': fatalities, 'event_date': date},
+                })
+            else:
+                features.append({
+                    'type': 'Feature',
+                    'geometry': point,
+                    'properties': {'cluster': True, 'point_count': count, 'fatalities': fatalities, 'latest_date': date},
+                })
+        return features
+
+
+_index = Snapshot((ProtestEvents,), lambda: PointClusterIndex(get_event_snapshot()))
+
+
+def get_point_cluster_index():
+    return _index.get()
@@ -0,0 +1,32 @@
+# protest/police_weights.py
+"""
+Police-proximity weighting shared by the KDE risk surface (protest.analysis) and the
+space-time risk cube (protest.risk_cube).
+"""
+import numpy as np
+from scipy.spatial.distance import cdist
+
+
+def calculate_police_proximity_weights(grid_points, police_coords):
+    """
+    Calculate proximity weights based on distance to nearest police station
+    """
+    if len(police_coords) == 0:
+        return np.ones(len(grid_points))
+
+    # Calculate distance to nearest police station for each grid point
+    distances = cdist(grid_points, police_coords)
+    min_distances = np.min(distances, axis=1)
+
+    # Convert to weights (closer = higher weight)
+    max_distance = np.max(min_distances)
+    weights = 1 - (min_distances / max_distance)
+
+    return weights
+
+
+def risk_factor(grid_points, police_coords):
+    """
+    Multiplier turning density into the weighted risk surface (higher when police are far)
+    """
+    return 1 / (calculate_police_proximity_weights(grid_points, police_coords) + 0.1)
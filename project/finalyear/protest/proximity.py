@@ -0,0 +1,124 @@
+# protest/proximity.py
+"""
+Protest-to-police proximity using a haversine BallTree over station coordinates.
+"""
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from .columns import EARTH_RADIUS_KM, event_coordinates, station_table
+from .encoders import dumps
+
+
+# Events are queried against the tree in chunks so memory stays flat for large event sets
+PROXIMITY_CHUNK_SIZE = 10000
+
+
+def iter_proximity_chunks(event_lon, event_lat, station_lon, station_lat, radius_km):
+    """
+    Yield (start, nearest_idx, nearest_km, within_idx, within_km) per chunk of events.
+    within_idx/within_km are object arrays of per-event index/distance arrays sorted by distance.
+    """
+    tree = BallTree(np.radians(np.column_stack([station_lat, station_lon])), metric='haversine')
+    radius = radius_km / EARTH_RADIUS_KM
+
+    for start in range(0, len(event_lon), PROXIMITY_CHUNK_SIZE):
+        stop = start + PROXIMITY_CHUNK_SIZE
+        points = np.radians(np.column_stack([event_lat[start:stop], event_lon[start:stop]]))
+        nearest_dist, nearest_idx = tree.query(points, k=1)
+        within_idx, within_dist = tree.query_radius(points, r=radius, return_distance=True, sort_results=True)
+        yield (
+            start,
+            nearest_idx[:, 0],
+            nearest_dist[:, 0] * EARTH_RADIUS_KM,
+            within_idx,
+            [distances * EARTH_RADIUS_KM for distances in within_dist],
+        )
+
+
+class ProximitySummary:
+    """
+    Running totals accumulated while streaming chunks
+    """
+
+    def __init__(self, station_count):
+        self.total_events = 0
+        self.events_within_radius = 0
+        self.nearest_km_sum = 0.0
+        self.nearest_km_max = 0.0
+        self.station_event_counts = np.zeros(station_count, dtype=np.int64)
+
+    def add(self, nearest_km, within_idx):
+        counts = np.fromiter((len(idx) for idx in within_idx), dtype=np.int64, count=len(within_idx))
+        self.total_events += len(nearest_km)
+        self.events_within_radius += int(np.count_nonzero(counts))
+        self.nearest_km_sum += float(nearest_km.sum())
+        if len(nearest_km):
+            self.nearest_km_max = max(self.nearest_km_max, float(nearest_km.max()))
+        if counts.any():
+            np.add.at(self.station_event_counts, np.concatenate(within_idx).astype(np.int64), 1)
+
+    def as_dict(self, station_gids, station_names, top=10):
+        busiest = np.argsort(self.station_event_counts)[::-1][:top]
+        return {
+            'total_events': self.total_events,
+            'events_within_radius': self.events_within_radius,
+            'events_outside_radius': self.total_events - self.events_within_radius,
+            'mean_nearest_km': round(self.nearest_km_sum / self.total_events, 3) if self.total_events else None,
+            'max_nearest_km': round(self.nearest_km_max, 3) if self.total_events else None,
+            'busiest_stations': [
+                {'gid': int(station_gids[i]), 'name': station_names[i], 'events_within_radius': int(self.station_event_counts[i])}
+                for i in busiest if self.station_event_counts[i] > 0
+            ],
+        }
+
+
+def proximity_inputs(start_date=None, end_date=None):
+    """
+    Run every query behind the /api/proximity/ document: (event columns, station columns)
+    """
+    return event_coordinates(start_date, end_date), station_table()
+
+
+def stream_proximity_json(radius_km, events, stations, summary_only=False):
+    """
+    Generate the /api/proximity/ JSON document in byte chunks from proximity_inputs().
+    Nothing here touches the database, so no query can fail once the response has started.
+    """
+    event_gids, event_lon, event_lat = events
+    station_gids, station_names, station_lon, station_lat = stations
+    summary = ProximitySummary(len(station_gids))
+
+    yield b'{"success":true,"radius_km":%s,"stations":%s,"events":[' % (
+        dumps(radius_km),
+        dumps([
+            {'gid': int(gid), 'name': name, 'lon': float(lon), 'lat': float(lat)}
+            for gid, name, lon, lat in zip(station_gids, station_names, station_lon, station_lat)
+        ]),
+    )
+
+    if len(station_gids) and len(event_gids):
+        first = True
+        for start, nearest_idx, nearest_km, within_idx, within_km in iter_proximity_chunks(
+            event_lon, event_lat, station_lon, station_lat, radius_km
+        ):
+            summary.add(nearest_km, within_idx)
+            if summary_only:
+                continue
+            events = [
+                {
+                    'gid': int(event_gids[start + i]),
+                    'lon': float(event_lon[start + i]),
+                    'lat': float(event_lat[start + i]),
+                    'nearest': {'gid': int(station_gids[nearest_idx[i]]), 'distance_km': round(float(nearest_km[i]), 3)},
+                    'within': [
+                        [int(station_gids[j]), round(float(d), 3)] for j, d in zip(within_idx[i], within_km[i])
+                    ],
+                }
+                for i in range(len(nearest_idx))
+            ]
+            chunk = dumps(events)[1:-1]
+            if chunk:
+                yield chunk if first else b',' + chunk
+                first = False
+
+    yield b'],"summary":%s}' % dumps(summary.as_dict(station_gids, station_names))
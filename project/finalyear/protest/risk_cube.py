@@ -0,0 +1,325 @@
+# protest/risk_cube.py
+"""
+Space-time cube of protest density (events per km²) on a fixed lon/lat grid, one slice
+per month or week, stored as memory-mapped arrays under PROTEST_CACHE_DIR/risk_cube/.
+
+Next to the density slices the cube keeps a running (prefix) sum, so any range of
+slices sums with a single subtraction. A small JSON index records the grid, the
+bandwidth (Scott's rule over the dated events) and a per-slice fingerprint of the events. When the events change, only the
+slices from the previously newest one onwards are recomputed, as long as every older
+slice still has the same fingerprint; otherwise the cube is rebuilt.
+
+Updates are serialised across processes by an flock on the cube directory and never
+write into files a reader may have mapped: each update copies the unchanged slices into
+a new generation of files and then swaps the index. The previous generation is kept
+for readers that read the old index just before the swap.
+"""
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: updates are only serialised within the process
+    fcntl = None
+
+from .bandwidth import project_to_metres, scott_bandwidth
+from .hotspots import time_step_index
+from .models import ProtestEvents
+from .police_weights import risk_factor
+from .snapshot import get_event_snapshot, get_police_snapshot
+from .versioning import get_data_version
+
+
+CUBE_GRID_SIZE = 50
+GRID_PADDING_DEGREES = 0.05
+
+
+def cube_directory(time_step):
+    return os.path.join(settings.PROTEST_CACHE_DIR, 'risk_cube', time_step)
+
+
+def step_label(step, time_step):
+    if time_step == 'month':
+        return str(np.datetime64(int(step), 'M'))
+    return str(np.datetime64(int(step) * 7 - 3, 'D'))
+
+
+def slice_fingerprints(steps, gids, lon, lat, slices):
+    """
+    Per-slice event count and sums that change whenever a slice gains, loses or moves an event
+    """
+    return np.column_stack([
+        np.bincount(steps, minlength=slices),
+        np.bincount(steps, weights=gids, minlength=slices),
+        np.round(np.bincount(steps, weights=lon + 1000 * lat, minlength=slices), 6),
+    ]).tolist()
+
+
+def slice_density(x, y, grid_x, grid_y, bandwidth):
+    """
+    Gaussian kernel intensity (events per km²) on the grid; the kernel is separable on a
+    regular projected grid, so this is one (ny x k) @ (k x nx) product
+    """
+    if not len(x):
+        return np.zeros((len(grid_y), len(grid_x)), dtype=np.float32)
+    kernel_x = np.exp(-(grid_x[None, :] - x[:, None]) ** 2 / (2 * bandwidth ** 2))
+    kernel_y = np.exp(-(grid_y[:, None] - y[None, :]) ** 2 / (2 * bandwidth ** 2))
+    return (kernel_y @ kernel_x * (1e6 / (2 * math.pi * bandwidth ** 2))).astype(np.float32)
+
+
+def open_arrays(directory, index, mode):
+    """
+    Density slices and their prefix sums (one extra leading zero slice) for the index's generation
+    """
+    generation, capacity, ny, nx = index['generation'], index['capacity'], index['ny'], index['nx']
+    density = np.memmap(
+        os.path.join(directory, f'density_{generation}.f32'), dtype=np.float32, mode=mode, shape=(capacity, ny, nx)
+    )
+    cumulative = np.memmap(
+        os.path.join(directory, f'cumulative_{generation}.f64'), dtype=np.float64, mode=mode, shape=(capacity + 1, ny, nx)
+    )
+    return density, cumulative
+
+
+class RiskCube:
+    """
+    Read-only view of the cube; slices and range sums come straight from the memmaps
+    """
+
+    def __init__(self, directory, index):
+        self.index = index
+        self.density, self.cumulative = open_arrays(directory, index, 'r')
+        self.risk_factor = np.asarray(index['risk_factor'], dtype=np.float32).reshape(index['ny'], index['nx'])
+
+    @property
+    def slices(self):
+        return self.index['slices']
+
+    def slice(self, position):
+        return self.density[position]
+
+    def range_sum(self, start, stop):
+        """
+        Sum of slices [start, stop)
+        """
+        return self.cumulative[stop] - self.cumulative[start]
+
+
+def read_index(directory):
+    try:
+        with open(os.path.join(directory, 'index.json')) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def write_index(directory, index):
+    temporary_path = os.path.join(directory, 'index.json.tmp')
+    with open(temporary_path, 'w') as handle:
+        json.dump(index, handle)
+    os.replace(temporary_path, os.path.join(directory, 'index.json'))
+
+
+def remove_other_generations(directory, generations):
+    """
+    Delete the array files of every generation not in `generations`; call with the
+    directory locked, so no other writer is creating files
+    """
+    keep = set()
+    for generation in generations:
+        keep.update({f'density_{generation}.f32', f'cumulative_{generation}.f64'})
+    for name in os.listdir(directory):
+        if name.startswith(('density_', 'cumulative_')) and name not in keep:
+            os.remove(os.path.join(directory, name))
+
+
+def clear_cube(directory):
+    """
+    Remove the index and every generation; call with the directory locked
+    """
+    try:
+        os.remove(os.path.join(directory, 'index.json'))
+    except FileNotFoundError:
+        pass
+    remove_other_generations(directory, ())
+
+
+_update_lock = threading.Lock()
+
+
+@contextmanager
+def locked_directory(directory):
+    """
+    Exclusive lock on the cube directory for threads of this process and, where fcntl
+    exists, for other processes (released when the lock file is closed)
+    """
+    with _update_lock, open(os.path.join(directory, '.lock'), 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+
+def cube_bandwidth(lon, lat):
+    """
+    Scott's rule bandwidth in metres for the dated events, or None where it is undefined:
+    fewer than two events, or all of them at (nearly) one point
+    """
+    if len(lon) < 2:
+        return None
+    x, y, _ = project_to_metres(lon, lat)
+    bandwidth = round(scott_bandwidth(x, y), 1)
+    return bandwidth if math.isfinite(bandwidth) and bandwidth > 0 else None
+
+
+def new_index(time_step, lon, lat, first_step, generation, bandwidth):
+    """
+    Grid and police risk factor for a full rebuild
+    """
+    bounds = [
+        float(lon.min()) - GRID_PADDING_DEGREES, float(lat.min()) - GRID_PADDING_DEGREES,
+        float(lon.max()) + GRID_PADDING_DEGREES, float(lat.max()) + GRID_PADDING_DEGREES,
+    ]
+    xx, yy = np.meshgrid(
+        np.linspace(bounds[0], bounds[2], CUBE_GRID_SIZE),
+        np.linspace(bounds[1], bounds[3], CUBE_GRID_SIZE),
+    )
+    police = get_police_snapshot()
+    factor = risk_factor(np.c_[xx.ravel(), yy.ravel()], np.column_stack([police['lon'], police['lat']]))
+    _, _, origin = project_to_metres(lon, lat)
+    return {
+        'time_step': time_step,
+        'bounds': bounds,
+        'nx': CUBE_GRID_SIZE,
+        'ny': CUBE_GRID_SIZE,
+        'origin': list(origin),
+        'bandwidth_m': bandwidth,
+        'first_step': first_step,
+        'generation': generation,
+        'capacity': 0,
+        'slices': 0,
+        'risk_factor': np.round(factor, 6).tolist(),
+    }
+
+
+def covers(index, lon, lat, steps):
+    west, south, east, north = index['bounds']
+    return bool(
+        lon.min() >= west and lat.min() >= south and lon.max() <= east and lat.max() <= north
+        and steps.min() >= index['first_step']
+    )
+
+
+def update_risk_cube(time_step):
+    """
+    Bring the on-disk cube up to date with the events. Returns (index, recomputed slice count).
+    """
+    directory = cube_directory(time_step)
+    os.makedirs(directory, exist_ok=True)
+    with locked_directory(directory):
+        version = get_data_version(ProtestEvents)
+        index = read_index(directory)
+        if index is not None and index['events_version'] == version:
+            # Another process brought it up to date while this one waited for the lock
+            return index, 0
+        events = get_event_snapshot()
+        dated = ~np.isnat(events['dates'])
+        gids, lon, lat = events['gids'][dated], events['lon'][dated], events['lat'][dated]
+        absolute_steps = time_step_index(events['dates'][dated], time_step)
+        previous_generation = index['generation'] if index else None
+
+        # Incremental only if every slice before the previously newest one is unchanged
+        rebuild_from = 0
+        if index is not None and index['slices'] and len(gids) and covers(index, lon, lat, absolute_steps):
+            steps = absolute_steps - index['first_step']
+            slices = int(steps.max()) + 1
+            fingerprints = slice_fingerprints(steps, gids, lon, lat, slices)
+            kept = index['slices'] - 1
+            if kept < slices and fingerprints[:kept] == index['fingerprints'][:kept]:
+                rebuild_from = kept
+
+        if rebuild_from == 0:
+            bandwidth = cube_bandwidth(lon, lat)
+            if bandwidth is None:
+                # No kernel to smooth with; drop any older cube rather than serve it
+                clear_cube(directory)
+                return None, 0
+            index = new_index(
+                time_step, lon, lat, int(absolute_steps.min()), index['generation'] if index else -1, bandwidth
+            )
+            steps = absolute_steps - index['first_step']
+            slices = int(steps.max()) + 1
+            fingerprints = slice_fingerprints(steps, gids, lon, lat, slices)
+
+        # Always a new generation of files; readers keep the old ones mapped until they see the new index
+        previous = open_arrays(directory, index, 'r') if rebuild_from else None
+        index['generation'] += 1
+        index['capacity'] = slices
+        density, cumulative = open_arrays(directory, index, 'w+')
+        if previous is not None:
+            density[:rebuild_from] = previous[0][:rebuild_from]
+            cumulative[:rebuild_from + 1] = previous[1][:rebuild_from + 1]
+            del previous
+
+        nx, ny = index['nx'], index['ny']
+        west, south, east, north = index['bounds']
+        lon0, lat0 = index['origin']
+        grid_x, _, _ = project_to_metres(np.linspace(west, east, nx), np.full(nx, lat0), index['origin'])
+        _, grid_y, _ = project_to_metres(np.full(ny, lon0), np.linspace(south, north, ny), index['origin'])
+        x, y, _ = project_to_metres(lon, lat, index['origin'])
+
+        order = np.argsort(steps, kind='stable')
+        edges = np.searchsorted(steps[order], np.arange(slices + 1))
+        for position in range(rebuild_from, slices):
+            members = order[edges[position]:edges[position + 1]]
+            density[position] = slice_density(x[members], y[members], grid_x, grid_y, index['bandwidth_m'])
+            cumulative[position + 1] = cumulative[position] + density[position]
+        density.flush()
+        cumulative.flush()
+
+        index.update({
+            'slices': slices,
+            'labels': [step_label(index['first_step'] + position, time_step) for position in range(slices)],
+            'event_counts': [int(row[0]) for row in fingerprints],
+            'fingerprints': fingerprints,
+            'events_version': version,
+        })
+        write_index(directory, index)
+        remove_other_generations(directory, {index['generation'], previous_generation})
+    return index, slices - rebuild_from
+
+
+_cubes = {}
+_cube_lock = threading.Lock()
+
+
+def get_risk_cube(time_step='month'):
+    """
+    Return the process-wide memmapped cube for time_step, updating it first when the
+    protest events data version has moved on
+    """
+    version = get_data_version(ProtestEvents)
+    cube = _cubes.get(time_step)
+    if cube is not None and cube.index['events_version'] == version:
+        return cube
+    with _cube_lock:
+        cube = _cubes.get(time_step)
+        if cube is None or cube.index['events_version'] != version:
+            directory = cube_directory(time_step)
+            index = read_index(directory)
+            if index is None or index['events_version'] != version:
+                index, _ = update_risk_cube(time_step)
+            try:
+                cube = RiskCube(directory, index) if index else None
+            except FileNotFoundError:
+                # Two updates by other processes retired this index's generation meanwhile
+                index = read_index(directory)
+                cube = RiskCube(directory, index) if index else None
+            _cubes[time_step] = cube
+    return cube
@@ -0,0 +1,328 @@
+# protest/routing.py
+"""
+In-process road network routing over the roads table.
+
+The network is compacted into CSR adjacency arrays: graph nodes are road
+junctions and line ends, and chains of intermediate vertices are folded
+into single edges that keep their geometry for drawing the route. The
+arrays are cached on disk per roads data version and queried with the
+compiled Dijkstra in scipy.sparse.csgraph.
+"""
+import math
+import os
+import threading
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from scipy.spatial import cKDTree
+
+from django.conf import settings
+from django.contrib.gis.geos import LineString, MultiLineString
+
+from .models import NairobiRoads
+from .versioning import get_data_version
+
+
+EARTH_RADIUS_M = 6371008.8
+
+# Free-flow speeds (km/h) by OSM highway class
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 80,
+    'trunk': 70,
+    'primary': 60,
+    'secondary': 50,
+    'tertiary': 40,
+    'unclassified': 30,
+    'residential': 25,
+    'living_street': 10,
+    'service': 15,
+    'road': 30,
+    'track': 15,
+}
+LINK_SPEED_FACTOR = 0.8
+DEFAULT_SPEED_KMH = 20
+
+# Vertices are matched on coordinates rounded to ~1 cm
+COORDINATE_SCALE = 1e7
+
+GRAPH_ARRAYS = (
+    'node_lon', 'node_lat', 'node_in_main', 'indptr', 'targets', 'weights', 'lengths',
+    'edge_geometry', 'edge_reversed', 'geometry_offsets', 'geometry_coords',
+)
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """
+    Great-circle distance in metres; works on scalars or NumPy arrays
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(value) for value in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def road_speed_kmh(highway, lanes):
+    """
+    Estimate a free-flow speed from the highway class, with a small bonus for extra lanes
+    """
+    highway = (highway or '').lower()
+    if highway.endswith('_link'):
+        speed = HIGHWAY_SPEEDS_KMH.get(highway[:-5], DEFAULT_SPEED_KMH) * LINK_SPEED_FACTOR
+    else:
+        speed = HIGHWAY_SPEEDS_KMH.get(highway, DEFAULT_SPEED_KMH)
+
+    try:
+        lane_count = int(float(str(lanes).split(';')[0]))
+    except (TypeError, ValueError):
+        lane_count = 1
+    if lane_count > 1:
+        speed *= min(1 + 0.05 * (lane_count - 1), 1.2)
+    return speed
+
+
+def vertex_keys(coords):
+    """
+    Pack rounded lon/lat into one int64 per vertex so shared vertices compare equal
+    """
+    rounded = np.round(coords * COORDINATE_SCALE).astype(np.int64)
+    return (rounded[:, 0] << 32) ^ (rounded[:, 1] & 0xFFFFFFFF)
+
+
+def iter_road_lines():
+    """
+    Yield (coords array, speed m/s) for every linestring part in the roads table
+    """
+    for highway, lanes, geom in NairobiRoads.objects.filter(geom__isnull=False).values_list('highway', 'lanes', 'geom'):
+        speed_ms = road_speed_kmh(highway, lanes) / 3.6
+        if isinstance(geom, LineString):
+            parts = [geom]
+        elif isinstance(geom, MultiLineString):
+            parts = list(geom)
+        else:
+            continue
+        for part in parts:
+            coords = np.asarray(part.coords, dtype=np.float64)[:, :2]
+            if len(coords) >= 2:
+                yield coords, speed_ms
+
+
+def build_graph_arrays(lines):
+    """
+    Build the compact CSR road graph from (coords, speed m/s) pairs
+    """
+    lines = list(lines)
+    if not lines:
+        raise ValueError("The roads table has no line geometries to build a network from")
+
+    # A vertex is a junction if it ends a line or appears more than once across the network
+    all_keys = np.concatenate([vertex_keys(coords) for coords, _ in lines])
+    unique_keys, counts = np.unique(all_keys, return_counts=True)
+
+    from_keys, to_keys, lengths, weights = [], [], [], []
+    junction_keys, junction_coords = [], []
+    geometry_parts, geometry_sizes = [], []
+
+    for coords, speed_ms in lines:
+        keys = vertex_keys(coords)
+        is_junction = counts[np.searchsorted(unique_keys, keys)] > 1
+        is_junction[0] = is_junction[-1] = True
+        positions = np.flatnonzero(is_junction)
+        segment_lengths = haversine_m(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+        junction_keys.append(keys[positions])
+        junction_coords.append(coords[positions])
+
+        for start, end in zip(positions[:-1], positions[1:]):
+            if keys[start] == keys[end]:
+                continue
+            length = float(segment_lengths[start:end].sum())
+            from_keys.append(keys[start])
+            to_keys.append(keys[end])
+            lengths.append(length)
+            weights.append(length / speed_ms)
+            geometry_parts.append(coords[start:end + 1])
+            geometry_sizes.append(end + 1 - start)
+
+    node_keys, first_seen = np.unique(np.concatenate(junction_keys), return_index=True)
+    node_coords = np.concatenate(junction_coords)[first_seen]
+    sources = np.searchsorted(node_keys, np.asarray(from_keys, dtype=np.int64))
+    destinations = np.searchsorted(node_keys, np.asarray(to_keys, dtype=np.int64))
+    edge_count = len(sources)
+    node_count = len(node_keys)
+
+    # Roads carry no oneway attribute, so every edge is traversable both ways.
+    # Parallel edges are reduced to the fastest one so (node, neighbour) is unique.
+    edge_ids = np.arange(edge_count, dtype=np.int64)
+    all_sources = np.concatenate([sources, destinations])
+    all_targets = np.concatenate([destinations, sources])
+    all_weights = np.concatenate([weights, weights])
+    order = np.lexsort((all_weights, all_targets, all_sources))
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (np.diff(all_sources[order]) != 0) | (np.diff(all_targets[order]) != 0)
+    order = order[keep]
+
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(all_sources[order], minlength=node_count))
+
+    # Only the largest connected component is used for snapping, so routes always exist
+    adjacency = csr_matrix((np.ones(edge_count), (sources, destinations)), shape=(node_count, node_count))
+    _, labels = connected_components(adjacency, directed=False)
+    main_label = np.bincount(labels).argmax()
+
+    return {
+        'node_lon': node_coords[:, 0],
+        'node_lat': node_coords[:, 1],
+        'node_in_main': labels == main_label,
+        'indptr': indptr,
+        'targets': all_targets[order],
+        'weights': all_weights[order],
+        'lengths': np.concatenate([lengths, lengths])[order],
+        'edge_geometry': np.concatenate([edge_ids, edge_ids])[order],
+        'edge_reversed': np.concatenate([np.zeros(edge_count, bool), np.ones(edge_count, bool)])[order],
+        'geometry_offsets': np.concatenate([[0], np.cumsum(geometry_sizes)]).astype(np.int64),
+        'geometry_coords': np.concatenate(geometry_parts),
+    }
+
+
+class RoadGraph:
+    """
+    CSR road graph with nearest-node snapping and shortest paths by travel time
+    """
+
+    def __init__(self, arrays, version):
+        self.version = version
+        self.arrays = arrays
+        self.node_lon = arrays['node_lon']
+        self.node_lat = arrays['node_lat']
+        self.indptr = arrays['indptr']
+        self.targets = arrays['targets']
+        self.weights = arrays['weights']
+        self.lengths = arrays['lengths']
+        self.edge_geometry = arrays['edge_geometry']
+        self.edge_reversed = arrays['edge_reversed']
+        self.geometry_offsets = arrays['geometry_offsets']
+        self.geometry_coords = arrays['geometry_coords']
+        self.matrix = csr_matrix(
+            (self.weights, self.targets, self.indptr), shape=(len(self.node_lon), len(self.node_lon))
+        )
+
+        # Snap in a local equirectangular projection, which is accurate at city scale
+        self.snap_nodes = np.flatnonzero(arrays['node_in_main'])
+        self.lon_scale = math.cos(math.radians(float(np.mean(self.node_lat))))
+        self.snap_tree = cKDTree(np.column_stack([
+            self.node_lon[self.snap_nodes] * self.lon_scale,
+            self.node_lat[self.snap_nodes],
+        ]))
+
+    @property
+    def node_count(self):
+        return len(self.node_lon)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def snap(self, lon, lat):
+        """
+        Return (node index, snap distance in metres) for the closest routable node
+        """
+        _, position = self.snap_tree.query([lon * self.lon_scale, lat])
+        node = int(self.snap_nodes[position])
+        return node, float(haversine_m(lon, lat, self.node_lon[node], self.node_lat[node]))
+
+    def edge_position(self, node, neighbour):
+        """
+        CSR position of the edge node -> neighbour
+        """
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return start + int(np.flatnonzero(self.targets[start:end] == neighbour)[0])
+
+    def shortest_path(self, source, target):
+        """
+        Return the CSR edge positions of the fastest path, or None if target is unreachable
+        """
+        costs, predecessors = dijkstra(self.matrix, indices=source, return_predecessors=True)
+        if not np.isfinite(costs[target]):
+            return None
+
+        positions = []
+        node = target
+        while node != source:
+            previous = int(predecessors[node])
+            positions.append(self.edge_position(previous, node))
+            node = previous
+        positions.reverse()
+        return positions
+
+    def path_geometry(self, positions):
+        """
+        Concatenate the stored edge geometries along a path into one coordinate list
+        """
+        coordinates = []
+        for position in positions:
+            edge = int(self.edge_geometry[position])
+            part = self.geometry_coords[self.geometry_offsets[edge]:self.geometry_offsets[edge + 1]]
+            if self.edge_reversed[position]:
+                part = part[::-1]
+            coordinates.extend(part[1:].tolist() if coordinates else part.tolist())
+        return coordinates
+
+    def route(self, from_lon, from_lat, to_lon, to_lat):
+        """
+        Route between two coordinates; returns None when no path exists
+        """
+        source, source_snap = self.snap(from_lon, from_lat)
+        target, target_snap = self.snap(to_lon, to_lat)
+        positions = [] if source == target else self.shortest_path(source, target)
+        if positions is None:
+            return None
+
+        if positions:
+            coordinates = self.path_geometry(positions)
+        else:
+            coordinates = [[float(self.node_lon[source]), float(self.node_lat[source])]] * 2
+        return {
+            'distance_m': round(float(self.lengths[positions].sum()), 1),
+            'duration_s': round(float(self.weights[positions].sum()), 1),
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'snap_distance_m': {'origin': round(source_snap, 1), 'destination': round(target_snap, 1)},
+            'edges': len(positions),
+        }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def graph_cache_path(version):
+    return os.path.join(settings.PROTEST_CACHE_DIR, f'road_graph_{version}.npz')
+
+
+def load_or_build_graph(version):
+    """
+    Load the graph for this roads version from disk, building and saving it if missing
+    """
+    path = graph_cache_path(version)
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            return RoadGraph({name: cached[name] for name in GRAPH_ARRAYS}, version)
+
+    arrays = build_graph_arrays(iter_road_lines())
+    os.makedirs(settings.PROTEST_CACHE_DIR, exist_ok=True)
+    temporary_path = path + '.tmp.npz'
+    np.savez(temporary_path, **arrays)
+    os.replace(temporary_path, path)
+    return RoadGraph(arrays, version)
+
+
+def get_road_graph():
+    """
+    Return the process-wide road graph, reloading it when the roads data version changes
+    """
+    global _graph
+    version = get_data_version(NairobiRoads)
+    if _graph is not None and _graph.version == version:
+        return _graph
+    with _graph_lock:
+        if _graph is None or _graph.version != version:
+            _graph = load_or_build_graph(version)
+    return _graph
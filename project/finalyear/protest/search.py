@@ -0,0 +1,152 @@
+# protest/search.py
+"""
+Name search / autocomplete over roads, wards, subcounties, hospitals and police stations.
+
+Names are loaded once per data version into an in-memory index: a sorted list of name
+words for prefix lookups with bisect, plus a trigram index used as a fuzzy fallback when
+no name matches every typed prefix. Road segments sharing a name, and the wards of a
+subcounty, are merged into one result with a combined bbox.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+
+from .models import MergedWards, NairobiHospitals, NairobiRoads, PoliceStn
+from .snapshot import Snapshot
+
+
+SEARCH_TYPES = ('road', 'ward', 'subcounty', 'hospital', 'police')
+# Earlier types rank first when scores tie
+TYPE_PRIORITY = {search_type: rank for rank, search_type in enumerate(('subcounty', 'ward', 'police', 'hospital', 'road'))}
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode().lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def grouped_extents(table, name_column):
+    """
+    (name, first gid, row count, xmin, ymin, xmax, ymax, lon, lat) per distinct name,
+    with (lon, lat) a point on the named features
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT {name_column}, min(gid), count(*),
+                   ST_XMin(ST_Extent(geom)), ST_YMin(ST_Extent(geom)),
+                   ST_XMax(ST_Extent(geom)), ST_YMax(ST_Extent(geom)),
+                   ST_X(ST_PointOnSurface(ST_Collect(geom))), ST_Y(ST_PointOnSurface(ST_Collect(geom)))
+            FROM {table}
+            WHERE geom IS NOT NULL AND {name_column} IS NOT NULL AND {name_column} <> ''
+            GROUP BY 1
+        """)
+        return cursor.fetchall()
+
+
+class SearchIndex:
+    """
+    Ranked lookup over result entries (dicts with type, name, gid, features, bbox, centroid)
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.names = [normalize(entry['name']) for entry in entries]
+        words = sorted(
+            (word, position) for position, name in enumerate(self.names) for word in set(name.split())
+        )
+        self.words = [word for word, _ in words]
+        self.word_entries = [position for _, position in words]
+        self.trigram_entries = defaultdict(list)
+        self.trigram_counts = []
+        for position, name in enumerate(self.names):
+            name_trigrams = trigrams(name)
+            self.trigram_counts.append(len(name_trigrams))
+            for trigram in name_trigrams:
+                self.trigram_entries[trigram].append(position)
+
+    def prefix_matches(self, prefix):
+        matches = set()
+        start = bisect_left(self.words, prefix)
+        for i in range(start, len(self.words)):
+            if not self.words[i].startswith(prefix):
+                break
+            matches.add(self.word_entries[i])
+        return matches
+
+    def score(self, position, query):
+        name = self.names[position]
+        if name == query:
+            return 3.0
+        if name.startswith(query):
+            return 2.0 + len(query) / len(name)
+        return 1.0 + len(query) / len(name)
+
+    def search(self, text, types=SEARCH_TYPES, limit=10):
+        query = normalize(text)
+        if not query:
+            return []
+        tokens = query.split()
+
+        # Every typed word must prefix some word of the name
+        candidates = None
+        for token in tokens:
+            matches = self.prefix_matches(token)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                break
+        scored = [(self.score(position, query), position) for position in candidates or ()]
+
+        if not scored:
+            query_trigrams = trigrams(query)
+            shared = defaultdict(int)
+            for trigram in query_trigrams:
+                for position in self.trigram_entries.get(trigram, ()):
+                    shared[position] += 1
+            for position, common in shared.items():
+                similarity = common / (len(query_trigrams) + self.trigram_counts[position] - common)
+                if similarity >= MIN_TRIGRAM_SIMILARITY:
+                    scored.append((similarity, position))
+
+        scored = [(score, position) for score, position in scored if self.entries[position]['type'] in types]
+        scored.sort(key=lambda item: (
+            -item[0], TYPE_PRIORITY[self.entries[item[1]]['type']], -self.entries[item[1]]['features'], self.names[item[1]]
+        ))
+        return [{**self.entries[position], 'score': round(score, 3)} for score, position in scored[:limit]]
+
+
+def load_search_index():
+    sources = (
+        ('road', NairobiRoads, 'name'),
+        ('ward', MergedWards, 'ward'),
+        ('subcounty', MergedWards, 'subcounty'),
+        ('hospital', NairobiHospitals, 'name'),
+        ('police', PoliceStn, 'name'),
+    )
+    entries = []
+    for search_type, model, column in sources:
+        for name, gid, count, xmin, ymin, xmax, ymax, lon, lat in grouped_extents(model._meta.db_table, column):
+            entries.append({
+                'type': search_type,
+                'name': name,
+                'gid': gid,
+                'features': count,
+                'bbox': [round(xmin, 6), round(ymin, 6), round(xmax, 6), round(ymax, 6)],
+                'centroid': [round(lon, 6), round(lat, 6)],
+            })
+    return SearchIndex(entries)
+
+
+_index = Snapshot((NairobiRoads, MergedWards, NairobiHospitals, PoliceStn), load_search_index)
+
+
+def get_search_index():
+    return _index.get()
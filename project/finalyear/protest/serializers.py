@@ -1,10 +1,8 @@
 # protests/serializers.py
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
-from datetime import datetime
-from django.utils.timezone import make_aware
+from .encoders import legacy_timestamp
 from .models import Nairobi, NairobiRoads, PoliceStn, ProtestEvents, NairobiHospitals, MergedWards
 from rest_framework import serializers as drf_serializers
-import pytz
 
 class NairobiSerializer(GeoFeatureModelSerializer):
     class Meta:
@@ -24,32 +22,14 @@ class PoliceStnSerializer(GeoFeatureModelSerializer):
         geo_field = 'geom'
         fields = '__all__'
 
+class LegacyDateTimeField(drf_serializers.DateTimeField):
+    # Until protest/sql/convert_timestamp_column.sql has run on a legacy table, timestamp
+    # holds epoch floats, which DateTimeField cannot render
+    def to_representation(self, value):
+        return super().to_representation(legacy_timestamp(value))
+
 class ProtestEventsSerializer(GeoFeatureModelSerializer):
-    # Override the timestamp field to handle float values
-    timestamp = drf_serializers.DateTimeField(required=False, allow_null=True)
-    
-    def to_representation(self, instance):
-        # Clean any float datetime values before serialization
-        if hasattr(instance, 'timestamp') and instance.timestamp is not None:
-            if isinstance(instance.timestamp, (int, float)):
-                try:
-                    # Convert float/int timestamp to datetime
-                    instance.timestamp = datetime.fromtimestamp(instance.timestamp, tz=pytz.UTC)
-                except (ValueError, OSError):
-                    # If conversion fails, set to None
-                    instance.timestamp = None
-        
-        try:
-            return super().to_representation(instance)
-        except AttributeError as e:
-            if "'float' object has no attribute 'utcoffset'" in str(e):
-                # Log the problematic instance for debugging
-                print(f"Skipping problematic record with ID: {instance.gid}")
-                print(f"Timestamp value: {instance.timestamp}, type: {type(instance.timestamp)}")
-                # Set problematic timestamp to None and try again
-                instance.timestamp = None
-                return super().to_representation(instance)
-            raise e
+    timestamp = LegacyDateTimeField(required=False, allow_null=True)
 
     class Meta:
         model = ProtestEvents
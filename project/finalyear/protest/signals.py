@@ -0,0 +1,25 @@
+# protest/signals.py
+from django.db.models.signals import post_delete, post_save
+
+from .live import record_change
+from .versioning import TRACKED_MODELS
+
+
+# Data versions are bumped by database triggers (protest/triggers.py), which also see
+# queryset update(), bulk_create and loads made outside Django
+
+
+def push_change_on_save(sender, instance, **kwargs):
+    """
+    Send the changed row (protest events) and the new data version to live subscribers
+    """
+    record_change(sender, [instance.pk])
+
+
+def push_change_on_delete(sender, instance, **kwargs):
+    record_change(sender, [instance.pk], deleted=True)
+
+
+for tracked_model in TRACKED_MODELS:
+    post_save.connect(push_change_on_save, sender=tracked_model, dispatch_uid=f'push_{tracked_model.__name__}_save')
+    post_delete.connect(push_change_on_delete, sender=tracked_model, dispatch_uid=f'push_{tracked_model.__name__}_delete')
@@ -0,0 +1,109 @@
+# protest/snapshot.py
+"""
+Process-wide columnar snapshots of the tables the analysis views read on every request.
+
+Each snapshot is loaded once with values_list() into NumPy arrays (no model instances or
+GEOS geometries) and reloaded only when the data version of its tables changes.
+"""
+import threading
+
+import numpy as np
+
+from django.db.models import FloatField, Func
+
+from .columns import load_events, station_table
+from .models import MergedWards, PoliceStn, ProtestEvents
+from .versioning import get_data_version
+
+
+WARD_COLUMNS = (
+    'pop2009', 'poverty_ra', 'youth_unem', 'slum_house', 'avg_educat',
+    'pop_densit', 'dist_to_ci', 'protest_de',
+)
+
+
+class CentroidX(Func):
+    template = 'ST_X(ST_Centroid(%(expressions)s))'
+    output_field = FloatField()
+
+
+class CentroidY(Func):
+    template = 'ST_Y(ST_Centroid(%(expressions)s))'
+    output_field = FloatField()
+
+
+class Snapshot:
+    """
+    Column arrays built by loader(), cached per data version of the given models
+    """
+
+    def __init__(self, models, loader):
+        self.models = models
+        self.loader = loader
+        self.version = None
+        self.columns = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = get_data_version(*self.models)
+        if self.version == version:
+            return self.columns
+        with self.lock:
+            if self.version != version:
+                self.columns = self.loader()
+                self.version = version
+        return self.columns
+
+
+def load_wards():
+    """
+    Ward attributes as arrays (NaN for missing values) plus centroids and the
+    categorical properties of MergedWards, evaluated once per load
+    """
+    rows = list(
+        MergedWards.objects.filter(geom__isnull=False)
+        .annotate(centroid_lon=CentroidX('geom'), centroid_lat=CentroidY('geom'))
+        .values('gid', 'county', 'subcounty', 'ward', 'centroid_lon', 'centroid_lat', *WARD_COLUMNS)
+    )
+    columns = {
+        'gids': np.array([row['gid'] for row in rows], dtype=np.int64),
+        'centroid_lon': np.array([row['centroid_lon'] for row in rows], dtype=np.float64),
+        'centroid_lat': np.array([row['centroid_lat'] for row in rows], dtype=np.float64),
+    }
+    for name in WARD_COLUMNS:
+        columns[name] = np.array([np.nan if row[name] is None else row[name] for row in rows], dtype=np.float64)
+
+    # Unsaved, geometry-free instances reuse the model's category logic
+    wards = [
+        MergedWards(**{key: value for key, value in row.items() if not key.startswith('centroid_')})
+        for row in rows
+    ]
+    columns['full_location'] = [ward.full_location for ward in wards]
+    columns['risk_assessment'] = [ward.risk_assessment for ward in wards]
+    columns['protest_density_level'] = [ward.protest_density_level for ward in wards]
+    return columns
+
+
+def load_police():
+    gids, names, lon, lat = station_table()
+    return {'gids': gids, 'names': names, 'lon': lon, 'lat': lat}
+
+
+_events = Snapshot((ProtestEvents,), load_events)
+_police = Snapshot((PoliceStn,), load_police)
+_wards = Snapshot((MergedWards,), load_wards)
+
+
+def get_event_snapshot():
+    """
+    gids, lon, lat, fatalities and dates of every event with a geometry, ordered by gid
+    """
+    return _events.get()
+
+
+def get_police_snapshot():
+    return _police.get()
+
+
+def get_ward_snapshot():
+    return _wards.get()
@@ -0,0 +1,164 @@
+# protest/spatial_metrics.py
+"""
+City-wide spatial summary metrics computed in PostGIS with geography (metre-accurate) functions.
+"""
+import numpy as np
+
+from django.db import connection
+
+from .facilities import FACILITY_MODELS
+from .models import MergedWards, NairobiRoads, NairobiHospitals, PoliceStn
+from .versioning import versioned_cache_get_or_set
+
+
+def fetch_rows(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params or [])
+        return cursor.fetchall()
+
+
+def distance_stats(distances_m):
+    """
+    Summary statistics in kilometres for a list of distances in metres
+    """
+    values = np.asarray([d for d in distances_m if d is not None], dtype=np.float64) / 1000
+    if not len(values):
+        return None
+    return {
+        'mean_km': round(float(values.mean()), 3),
+        'median_km': round(float(np.median(values)), 3),
+        'min_km': round(float(values.min()), 3),
+        'max_km': round(float(values.max()), 3),
+        'count': int(len(values)),
+    }
+
+
+def ward_areas(ward_table):
+    return fetch_rows(f"""
+        SELECT gid, ward, subcounty, ST_Area(geom::geography)
+        FROM {ward_table}
+        WHERE geom IS NOT NULL
+        ORDER BY gid
+    """)
+
+
+def facilities_per_ward(ward_table, facility_table):
+    return dict(fetch_rows(f"""
+        SELECT w.gid, count(f.gid)
+        FROM {ward_table} w
+        LEFT JOIN {facility_table} f
+            ON f.geom IS NOT NULL AND ST_Covers(w.geom, ST_PointOnSurface(f.geom))
+        WHERE w.geom IS NOT NULL
+        GROUP BY w.gid
+    """))
+
+
+def road_length_by_class(road_table):
+    return [
+        {'highway': highway, 'segments': segments, 'length_km': round(length_m / 1000, 3)}
+        for highway, segments, length_m in fetch_rows(f"""
+            SELECT COALESCE(highway, 'unknown'), count(*), COALESCE(sum(ST_Length(geom::geography)), 0)
+            FROM {road_table}
+            WHERE geom IS NOT NULL
+            GROUP BY 1
+            ORDER BY 3 DESC
+        """)
+    ]
+
+
+def facility_nearest_neighbour_m(facility_table):
+    """
+    Distance from each facility to its nearest other facility of the same type (KNN + geography)
+    """
+    return [row[0] for row in fetch_rows(f"""
+        SELECT nn.distance_m
+        FROM {facility_table} a
+        CROSS JOIN LATERAL (
+            SELECT ST_Distance(a.geom::geography, b.geom::geography) AS distance_m
+            FROM {facility_table} b
+            WHERE b.gid <> a.gid AND b.geom IS NOT NULL
+            ORDER BY a.geom <-> b.geom
+            LIMIT 1
+        ) nn
+        WHERE a.geom IS NOT NULL
+    """)]
+
+
+def ward_to_nearest_facility_m(ward_table, facility_table):
+    """
+    Distance from each ward's interior point to the nearest facility
+    """
+    return [row[0] for row in fetch_rows(f"""
+        SELECT nn.distance_m
+        FROM {ward_table} w
+        CROSS JOIN LATERAL (
+            SELECT ST_Distance(ST_PointOnSurface(w.geom)::geography, f.geom::geography) AS distance_m
+            FROM {facility_table} f
+            WHERE f.geom IS NOT NULL
+            ORDER BY ST_PointOnSurface(w.geom) <-> f.geom
+            LIMIT 1
+        ) nn
+        WHERE w.geom IS NOT NULL
+    """)]
+
+
+def compute_spatial_metrics():
+    ward_table = MergedWards._meta.db_table
+    wards = ward_areas(ward_table)
+    total_area_km2 = sum(area for _, _, _, area in wards) / 1e6
+
+    per_type = {}
+    ward_counts = {}
+    for facility_type, model in FACILITY_MODELS.items():
+        facility_table = model._meta.db_table
+        count = model.objects.filter(geom__isnull=False).count()
+        ward_counts[facility_type] = facilities_per_ward(ward_table, facility_table)
+        per_type[facility_type] = {
+            'count': count,
+            'density_per_km2': round(count / total_area_km2, 4) if total_area_km2 else None,
+            'nearest_neighbour': distance_stats(facility_nearest_neighbour_m(facility_table)),
+            'ward_to_nearest': distance_stats(ward_to_nearest_facility_m(ward_table, facility_table)),
+        }
+
+    ward_rows = []
+    for gid, ward, subcounty, area_m2 in wards:
+        area_km2 = area_m2 / 1e6
+        row = {'gid': gid, 'ward': ward, 'subcounty': subcounty, 'area_km2': round(area_km2, 3)}
+        for facility_type in FACILITY_MODELS:
+            count = ward_counts[facility_type].get(gid, 0)
+            row[f'{facility_type}_count'] = count
+            row[f'{facility_type}_density_per_km2'] = round(count / area_km2, 4) if area_km2 else None
+        ward_rows.append(row)
+
+    roads = road_length_by_class(NairobiRoads._meta.db_table)
+    road_length_km = sum(road['length_km'] for road in roads)
+    hospitals = per_type['hospital']
+    police = per_type['police']
+
+    return {
+        'total_area_km2': round(total_area_km2, 3),
+        'ward_count': len(wards),
+        'road_length_km': round(road_length_km, 3),
+        'road_length_by_class': roads,
+        'facilities': per_type,
+        'wards': ward_rows,
+        # Same keys as calculateSpatialMetrics in the dashboard
+        'dashboard': {
+            'totalArea': round(total_area_km2, 3),
+            'roadLength': round(road_length_km, 3),
+            'hospitalDensity': hospitals['density_per_km2'] or 0,
+            'policeDensity': police['density_per_km2'] or 0,
+            'avgHospitalDistance': hospitals['nearest_neighbour']['mean_km'] if hospitals['nearest_neighbour'] else 0,
+        },
+    }
+
+
+def get_spatial_metrics():
+    """
+    Spatial metrics computed once per ward/road/facility data version
+    """
+    return versioned_cache_get_or_set(
+        'spatial-metrics',
+        (MergedWards, NairobiRoads, NairobiHospitals, PoliceStn),
+        compute_spatial_metrics,
+    )
@@ -0,0 +1,17 @@
+-- protest/sql/add_source_event_id.sql
+--
+-- Adds the protest_events.source_event_id column and the two indexes that
+-- ingest_protest_events deduplicates against. Migration 0007 runs the same statements,
+-- so this script is only needed when protest_events was (re)loaded outside Django after
+-- the migrations ran. The ALTER and CREATE INDEX take an exclusive lock on the table;
+-- run it once, in a maintenance window:
+--
+--     psql -d protest_db -f protest/sql/add_source_event_id.sql
+--
+-- Until it has run, ingest_protest_events refuses to load into the table.
+ALTER TABLE protest_events ADD COLUMN IF NOT EXISTS source_event_id text;
+CREATE UNIQUE INDEX IF NOT EXISTS protest_events_source_event_id_key
+    ON protest_events (source_event_id);
+CREATE INDEX IF NOT EXISTS protest_events_natural_key_idx
+    ON protest_events (latitude, longitude, event_date)
+    WHERE source_event_id IS NULL;
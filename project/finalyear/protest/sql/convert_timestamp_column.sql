@@ -0,0 +1,31 @@
+-- protest/sql/convert_timestamp_column.sql
+--
+-- One-off conversion of a legacy protest_events.timestamp column holding epoch seconds
+-- (or milliseconds, for values above 1e11) to timestamptz, the type ingest_protest_events
+-- writes. Run it once per database, in a maintenance window: the ALTER rewrites the
+-- table under an exclusive lock.
+--
+--     psql -d protest_db -f protest/sql/convert_timestamp_column.sql
+--
+-- It does nothing if the column is already a timestamp. Until it has run, the events
+-- serializer and GeoJSON encoder convert numeric timestamps as they read them, and
+-- ingest_protest_events refuses to load into the table.
+DO $$
+DECLARE
+    column_type text;
+BEGIN
+    SELECT data_type INTO column_type
+    FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'protest_events' AND column_name = 'timestamp';
+
+    IF column_type IS NOT NULL AND column_type NOT LIKE 'timestamp%' THEN
+        ALTER TABLE protest_events ALTER COLUMN "timestamp" TYPE timestamptz
+        USING CASE
+            WHEN "timestamp" IS NULL THEN NULL
+            WHEN abs("timestamp"::double precision) > 1e11 THEN to_timestamp("timestamp"::double precision / 1000)
+            ELSE to_timestamp("timestamp"::double precision)
+        END;
+        RAISE NOTICE 'Converted protest_events.timestamp from % to timestamptz', column_type;
+    END IF;
+END;
+$$;
@@ -0,0 +1,133 @@
+# protest/sync.py
+"""
+Delta sync for the protest events layer, read from the protest_event_change log.
+
+A sync token is the xmin of a database snapshot: every transaction with a lower id had
+finished when the token was issued. The changes since a token are the log rows written by
+transactions with txid >= token, so a transaction still running when the token was taken
+is picked up by the next sync rather than skipped. A change can therefore be sent twice
+across syncs, which is harmless for upserts and tombstones. Tokens are handed out as
+'t<xmin>' so that a bare number such as a year is never mistaken for one.
+
+The log is pruned after PROTEST_CHANGE_LOG_RETENTION_DAYS (prune_change_log); a `since`
+from before the pruned horizon raises SinceExpired and the client reloads the layer.
+"""
+from datetime import datetime, time
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ChangeLogHorizon, ProtestEventChange, ProtestEvents
+from .triggers import cached_triggers_installed
+from .versioning import get_data_version
+
+TOKEN_PREFIX = 't'
+
+
+class SinceExpired(Exception):
+    """
+    The changes since the requested point are no longer all in the log
+    """
+
+
+def change_log_installed():
+    """
+    True if the protest_events change-log triggers are in place; the catalog lookup is
+    cached per process and repeated when the events data version changes
+    """
+    return cached_triggers_installed(connection, get_data_version(ProtestEvents))
+
+
+def snapshot_token():
+    """
+    Sync token of the current snapshot; take it before reading the rows it is handed out with
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return f"{TOKEN_PREFIX}{cursor.fetchone()[0]}"
+
+
+def current_sync_token():
+    """
+    snapshot_token(), or None while the change-log triggers are missing, as no delta
+    could be answered for the token
+    """
+    if not change_log_installed():
+        return None
+    return snapshot_token()
+
+
+def parse_since(value):
+    """
+    Return (token, None) for a sync token or (None, aware datetime) for an ISO
+    date/datetime; raises ValueError otherwise
+    """
+    value = value.strip()
+    if value.startswith(TOKEN_PREFIX) and value[len(TOKEN_PREFIX):].isdigit():
+        return int(value[len(TOKEN_PREFIX):]), None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError('since must be a sync token (as returned in X-Sync-Token) or an ISO date/datetime')
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return None, moment
+
+
+def check_horizon(token=None, moment=None):
+    """
+    Raise SinceExpired if log rows at or after the token/moment were pruned or truncated away
+    """
+    horizon = ChangeLogHorizon.objects.filter(table_name=ProtestEvents._meta.db_table).first()
+    if horizon is None:
+        return
+    if token is not None and token <= horizon.txid:
+        raise SinceExpired('sync token is older than the change log')
+    if moment is not None and moment <= horizon.changed_at:
+        raise SinceExpired(f'since is older than the change log (complete after {horizon.changed_at.isoformat()})')
+
+
+def changes_since(token=None, moment=None):
+    """
+    (upserted gids, deleted gids) from the log, each gid classified by its latest change
+    """
+    changes = ProtestEventChange.objects.order_by('id')
+    if token is not None:
+        changes = changes.filter(txid__gte=token)
+    else:
+        changes = changes.filter(changed_at__gte=moment)
+
+    latest = {}
+    for gid, deleted in changes.values_list('gid', 'deleted').iterator():
+        latest[gid] = deleted
+    # After reading the log, so a prune that commits in between is caught here
+    check_horizon(token, moment)
+    upserted = sorted(gid for gid, deleted in latest.items() if not deleted)
+    deleted = sorted(gid for gid, deleted in latest.items() if deleted)
+    return upserted, deleted
+
+
+def prune_change_log(before):
+    """
+    Delete the log rows written before `before` and move the horizon past them.
+    Returns the number of rows deleted.
+    """
+    table = ProtestEvents._meta.db_table
+    with transaction.atomic():
+        old = ProtestEventChange.objects.filter(changed_at__lt=before)
+        pruned = old.aggregate(txid=Max('txid'), changed_at=Max('changed_at'))
+        if pruned['txid'] is None:
+            return 0
+        horizon, created = ChangeLogHorizon.objects.select_for_update().get_or_create(
+            table_name=table, defaults=pruned
+        )
+        if not created:
+            horizon.txid = max(horizon.txid, pruned['txid'])
+            horizon.changed_at = max(horizon.changed_at, pruned['changed_at'])
+            horizon.save()
+        deleted, _ = old.delete()
+    return deleted
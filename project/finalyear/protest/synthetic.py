@@ -0,0 +1,290 @@
+# protest/synthetic.py
+"""
+Synthetic Nairobi data for the benchmark and load-test commands.
+
+Wards tile the Nairobi bounding box as a grid of rectangles grouped into subcounties,
+roads form a connected street grid with jittered intersections, and protest events are
+a mix of Gaussian hotspots and uniform background noise over ten years. Everything is
+generated from a seed, so runs at the same scale load identical data.
+
+Only for the stand-in database of finalyear.settings_bench: loading truncates the tables.
+"""
+import itertools
+import math
+import random
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.gis.geos import LineString, Point, Polygon
+from django.core.management.base import CommandError
+from django.core.management.color import no_style
+from django.db import connection
+
+from .models import MergedWards, Nairobi, NairobiHospitals, NairobiRoads, PoliceStn, ProtestEvents
+from .triggers import install_triggers
+from .versioning import TRACKED_MODELS
+
+
+NAIROBI_BBOX = (36.65, -1.45, 37.10, -1.16)
+WARD_GRID = (10, 9)
+WARDS_PER_SUBCOUNTY = 5
+HOTSPOT_COUNT = 12
+HOTSPOT_SHARE = 0.7
+FIRST_EVENT_DATE = date(2015, 1, 1)
+EVENT_DAYS = 3650
+BATCH_SIZE = 5000
+
+ROAD_NAMES = (
+    'Moi', 'Kenyatta', 'Ngong', 'Langata', 'Waiyaki', 'Thika', 'Jogoo', 'Mombasa', 'Uhuru',
+    'Haile Selassie', 'Kimathi', 'Tom Mboya', 'Ronald Ngala', 'Kirinyaga', 'Juja', 'Outer Ring',
+    'Argwings Kodhek', 'Valley', 'Limuru', 'Kiambu', 'Parklands', 'Riverside', 'Dennis Pritt', 'Likoni',
+)
+ROAD_SUFFIXES = ('Road', 'Avenue', 'Street', 'Way', 'Drive', 'Lane')
+HIGHWAY_TYPES = ('trunk', 'primary', 'secondary', 'tertiary', 'residential', 'residential', 'unclassified')
+ARTERIAL_TYPES = HIGHWAY_TYPES[:3]
+# Street grid: intersection jitter as a share of the block size, midpoint bend in degrees,
+# and the spacing of arterials in grid lines
+STREET_JITTER = 0.2
+STREET_BEND = 0.0005
+STREET_ARTERIAL_EVERY = 5
+
+
+def require_benchmark_database():
+    if not getattr(settings, 'PROTEST_BENCHMARK_DATABASE', False):
+        raise CommandError(
+            'Synthetic data is only loaded into the benchmark database; '
+            'run with DJANGO_SETTINGS_MODULE=finalyear.settings_bench'
+        )
+
+
+def random_point(rng, bbox=NAIROBI_BBOX):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat)
+
+
+def clamp_to_bbox(lon, lat, bbox=NAIROBI_BBOX):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return min(max(lon, min_lon), max_lon), min(max(lat, min_lat), max_lat)
+
+
+def county():
+    yield Nairobi(
+        gid=1, objectid=1, area=Decimal('0.0572'), perimeter=Decimal('1.2'), county3=Decimal('47'),
+        county3_id=Decimal('47'), county='Nairobi', shape_leng=Decimal('1.2'), shape_area=Decimal('0.0572'),
+        geom=Polygon.from_bbox(NAIROBI_BBOX),
+    )
+
+
+def wards(rng):
+    columns, rows = WARD_GRID
+    min_lon, min_lat, max_lon, max_lat = NAIROBI_BBOX
+    width, height = (max_lon - min_lon) / columns, (max_lat - min_lat) / rows
+    for index in range(columns * rows):
+        column, row = index % columns, index // columns
+        west, south = min_lon + column * width, min_lat + row * height
+        yield MergedWards(
+            gid=index + 1,
+            pop2009=rng.randint(10000, 120000),
+            county='Nairobi',
+            subcounty=f'Subcounty {index // WARDS_PER_SUBCOUNTY + 1}',
+            ward=f'Ward {index + 1}',
+            shape_leng=2 * (width + height),
+            shape_area=width * height,
+            poverty_ra=rng.uniform(5, 75),
+            youth_unem=rng.uniform(5, 55),
+            slum_house=rng.uniform(0, 80),
+            avg_educat=rng.uniform(4, 14),
+            pop_densit=rng.lognormvariate(8.5, 0.8),
+            dist_to_ci=rng.uniform(0.5, 25),
+            protest_de=rng.expovariate(1.5),
+            geom=Polygon.from_bbox((west, south, west + width, south + height)),
+        )
+
+
+def street_grid(rng, count):
+    """
+    Intersections and block edges of a jittered street grid with at least `count` edges:
+    (nodes {(column, row): (lon, lat)}, edges [((column, row), (column, row), axis, line)])
+    """
+    size = max(2, math.isqrt(count + 1))
+    while 2 * size * (size - 1) < count:
+        size += 1
+    min_lon, min_lat, max_lon, max_lat = NAIROBI_BBOX
+    step_lon, step_lat = (max_lon - min_lon) / (size - 1), (max_lat - min_lat) / (size - 1)
+    nodes = {
+        (column, row): clamp_to_bbox(
+            min_lon + column * step_lon + rng.gauss(0, STREET_JITTER * step_lon),
+            min_lat + row * step_lat + rng.gauss(0, STREET_JITTER * step_lat),
+        )
+        for column in range(size) for row in range(size)
+    }
+    edges = [((column, row), (column + 1, row), 'x', row) for row in range(size) for column in range(size - 1)]
+    edges += [((column, row), (column, row + 1), 'y', column) for column in range(size) for row in range(size - 1)]
+    return nodes, edges
+
+
+def connected_edges(rng, edges, count):
+    """
+    `count` of the grid edges: a random spanning tree first (randomised Kruskal), so the
+    network is one component, then random extra edges that close blocks
+    """
+    parent = {}
+
+    def root(node):
+        while parent.get(node, node) != node:
+            parent[node] = parent.get(parent[node], parent[node])
+            node = parent[node]
+        return node
+
+    rng.shuffle(edges)
+    tree, extra = [], []
+    for edge in edges:
+        a, b = root(edge[0]), root(edge[1])
+        if a == b:
+            extra.append(edge)
+        else:
+            parent[a] = b
+            tree.append(edge)
+    return (tree + extra)[:count]
+
+
+def roads(rng, count):
+    """
+    A connected street grid with jittered intersections and slightly bent blocks. Each road
+    is one block between two intersections, which share exact coordinates with the
+    neighbouring blocks so the routing graph joins them. Every STREET_ARTERIAL_EVERY-th grid
+    line is a named arterial; the rest are minor streets.
+    """
+    if count <= 0:
+        return
+    names = [f'{name} {suffix}' for name in ROAD_NAMES for suffix in ROAD_SUFFIXES]
+    nodes, edges = street_grid(rng, count)
+    line_names = {(axis, line): rng.choice(names) for _, _, axis, line in edges}
+    for gid, (start, end, axis, line) in enumerate(connected_edges(rng, edges, count), start=1):
+        (start_lon, start_lat), (end_lon, end_lat) = nodes[start], nodes[end]
+        # Bend the block at its midpoint, across the direction of travel
+        bend = rng.gauss(0, STREET_BEND)
+        middle = clamp_to_bbox(
+            (start_lon + end_lon) / 2 + (bend if axis == 'y' else 0),
+            (start_lat + end_lat) / 2 + (bend if axis == 'x' else 0),
+        )
+        arterial = line % STREET_ARTERIAL_EVERY == 0
+        yield NairobiRoads(
+            gid=gid,
+            name=line_names[axis, line] if arterial or rng.random() < 0.6 else None,
+            highway=rng.choice(ARTERIAL_TYPES if arterial else HIGHWAY_TYPES[3:]),
+            lanes=rng.choice(('2', '3', '4')) if arterial else rng.choice(('1', '2', None)),
+            geom=LineString([nodes[start], middle, nodes[end]], srid=4326),
+        )
+
+
+def police_stations(rng, count):
+    for gid in range(1, count + 1):
+        lon, lat = random_point(rng)
+        yield PoliceStn(
+            gid=gid,
+            name=f'Police Station {gid}',
+            descriptio=f'Synthetic police station {gid}',
+            visibility=1,
+            tessellate=-1,
+            extrude=0,
+            draworder=None,
+            altitudemo=Decimal('0'),
+            geom=Point(lon, lat, srid=4326),
+        )
+
+
+def hospitals(rng, count):
+    for gid in range(1, count + 1):
+        lon, lat = random_point(rng)
+        yield NairobiHospitals(
+            gid=gid,
+            name=f'Hospital {gid}',
+            amenity=rng.choice(('hospital', 'clinic', 'doctors')),
+            healthcare=rng.choice(('hospital', 'clinic', 'centre')),
+            operator_t=rng.choice(('public', 'private', 'ngo', None)),
+            addr_city='Nairobi',
+            geom=Point(lon, lat, srid=4326),
+        )
+
+
+def protest_events(rng, count):
+    hotspots = [(random_point(rng), rng.uniform(0.005, 0.02)) for _ in range(HOTSPOT_COUNT)]
+    for gid in range(1, count + 1):
+        if rng.random() < HOTSPOT_SHARE:
+            (centre_lon, centre_lat), spread = rng.choice(hotspots)
+            lon, lat = clamp_to_bbox(rng.gauss(centre_lon, spread), rng.gauss(centre_lat, spread))
+        else:
+            lon, lat = random_point(rng)
+        event_date = FIRST_EVENT_DATE + timedelta(days=rng.randrange(EVENT_DAYS))
+        yield ProtestEvents(
+            gid=gid,
+            event_date=event_date,
+            year=event_date.year,
+            latitude=Decimal(f'{lat:.8f}'),
+            longitude=Decimal(f'{lon:.8f}'),
+            fatalities=rng.choice((0, 0, 0, 0, 1, 1, 2, 5)),
+            timestamp=datetime(event_date.year, event_date.month, event_date.day, 12, tzinfo=dt_timezone.utc),
+            geom=Point(lon, lat, srid=4326),
+        )
+
+
+def ensure_tables(models):
+    """
+    Create the unmanaged GIS tables that do not exist yet in the benchmark database,
+    with the change-log triggers on protest_events
+    """
+    existing = set(connection.introspection.table_names())
+    with connection.schema_editor() as editor:
+        for model in models:
+            if model._meta.db_table not in existing:
+                editor.create_model(model)
+    install_triggers(connection)
+
+
+def empty_table(model):
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'TRUNCATE {table} RESTART IDENTITY')
+        else:
+            cursor.execute(f'DELETE FROM {table}')
+
+
+def load_synthetic_data(events=10000, roads_count=5000, police=60, hospital_count=300, seed=42, log=print):
+    """
+    Replace the GIS tables' contents with synthetic data. Returns {table: rows}.
+    """
+    require_benchmark_database()
+    ensure_tables(TRACKED_MODELS)
+    rng = random.Random(seed)
+    sources = (
+        (Nairobi, county()),
+        (MergedWards, wards(rng)),
+        (NairobiRoads, roads(rng, roads_count)),
+        (PoliceStn, police_stations(rng, police)),
+        (NairobiHospitals, hospitals(rng, hospital_count)),
+        (ProtestEvents, protest_events(rng, events)),
+    )
+    counts = {}
+    for model, instances in sources:
+        started = time.perf_counter()
+        empty_table(model)
+        # Batches keep memory flat at a million events
+        total = 0
+        while True:
+            batch = list(itertools.islice(instances, BATCH_SIZE))
+            if not batch:
+                break
+            model.objects.bulk_create(batch)
+            total += len(batch)
+        counts[model._meta.db_table] = total
+        log(f'{model._meta.db_table}: {total} rows in {time.perf_counter() - started:.1f}s')
+
+    # Rows were inserted with explicit gids; move the sequences past them
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model for model, _ in sources]):
+            cursor.execute(sql)
+    return counts
@@ -1,3 +1,1198 @@
-from django.test import TestCase
+# protest/tests.py
+import json
+import os
+import shutil
+import socket
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+from scipy import sparse
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import LineString, Point, Polygon
+from django.core.management import CommandError, call_command
+from django.test import (
+    LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from sklearn.cluster import DBSCAN
+
+from .autocorrelation import conditional_draws, folded_p_values, global_moran, local_moran, row_standardize
+from .analysis import perform_kde_analysis
+from .bandwidth import (
+    bin_counts, compute_kde_bandwidth, cv_bandwidth, loo_log_likelihood, project_to_metres, scott_bandwidth,
+    silverman_bandwidth,
+)
+from .clustering import EARTH_RADIUS_KM, NOISE, dbscan_full, dbscan_insert, to_radians
+from .encoders import encode_feature_collection, format_datetime, legacy_timestamp
+from .forecast import (
+    FEATURE_NAMES, MIN_HISTORY_MONTHS, WARD_FEATURES, RiskModel, compute_forecast_features, lag_features, model_path,
+    poisson_d2, train_risk_model,
+)
+from .hexbins import HEX_SIZES_M, NO_DATE, bin_events, hex_axial, hex_centres, to_mercator
+from .hotspots import CubeTooLarge, gi_star, mann_kendall, queen_weights
+from .isochrones import compute_isochrones
+from .loadtest import VISIT
+from .management.commands.bench_event_serialization import synthetic_events
+from .management.commands.bench_startup import parse_importtime
+from .admin_performance import ANNOTATION_PREFIX
+from .models import MergedWards, NairobiHospitals, NairobiRoads, PoliceStn, ProtestEvents
+from .point_clusters import MAX_CLUSTER_ZOOM, PointClusterIndex
+from .proximity import stream_proximity_json
+from .spatial_metrics import compute_spatial_metrics
+from .risk_cube import RiskCube, cube_bandwidth, cube_directory, update_risk_cube
+from .routing import EARTH_RADIUS_M, RoadGraph, build_graph_arrays, haversine_m
+from .search import SearchIndex
+from .serializers import LegacyDateTimeField, ProtestEventsSerializer
+from .sync import prune_change_log
+from .synthetic import ensure_tables, load_synthetic_data
+from .triggers import VERSIONED_TABLES, install_triggers
+from .versioning import TRACKED_MODELS, get_data_version
+
+try:
+    from channels.db import database_sync_to_async
+    from channels.testing import WebsocketCommunicator
+except ImportError:  # Channels is optional
+    WebsocketCommunicator = None
+
+
+def random_events(rng, size, first_gid=1, hotspots=8):
+    """
+    Column arrays shaped like columns.load_events(): a few tight hotspots plus noise
+    """
+    centres = rng.uniform([36.7, -1.4], [37.0, -1.2], (hotspots, 2))
+    points = centres[rng.integers(0, hotspots, size)] + rng.normal(0, 0.003, (size, 2))
+    points[: size // 4] = rng.uniform([36.7, -1.4], [37.0, -1.2], (size // 4, 2))
+    return events_from_points(points, first_gid)
+
+
+def events_from_points(points, first_gid=1):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return {
+        'gids': np.arange(first_gid, first_gid + len(points), dtype=np.int64),
+        'lon': points[:, 0],
+        'lat': points[:, 1],
+        'fatalities': np.zeros(len(points), dtype=np.int64),
+        'dates': np.full(len(points), np.datetime64('2024-01-01'), dtype='datetime64[D]'),
+    }
+
+
+def degrees_east(metres, lat=-1.28):
+    """
+    Longitude offset spanning the given great-circle distance along a parallel (~ at city scale)
+    """
+    return float(np.degrees(metres / (EARTH_RADIUS_M * np.cos(np.radians(lat)))))
+
+
+class LegacyTimestampTests(SimpleTestCase):
+
+    def test_epoch_seconds_and_milliseconds(self):
+        moment = datetime(2024, 6, 25, 7, 20, tzinfo=dt_timezone.utc)
+        self.assertEqual(legacy_timestamp(1719300000.0), moment)
+        self.assertEqual(legacy_timestamp(1719300000000), moment)
+        self.assertEqual(format_datetime(1719300000.0), format_datetime(moment))
+
+    def test_other_values_pass_through(self):
+        moment = datetime(2024, 6, 25, tzinfo=dt_timezone.utc)
+        self.assertIs(legacy_timestamp(moment), moment)
+        self.assertIsNone(legacy_timestamp(None))
+        self.assertIsNone(legacy_timestamp(1e300))
+
+    def test_serializer_field_renders_epoch_values(self):
+        moment = datetime(2024, 6, 25, 7, 20, tzinfo=dt_timezone.utc)
+        field = LegacyDateTimeField()
+        self.assertEqual(field.to_representation(1719300000.0), format_datetime(moment))
+        self.assertEqual(field.to_representation(moment), format_datetime(moment))
+        self.assertIsNone(field.to_representation(None))
+
+
+class IncrementalDbscanTests(SimpleTestCase):
+    eps_rad = 0.4 / EARTH_RADIUS_KM
+    min_samples = 4
+
+    def assert_matches_batch(self, state):
+        """
+        Same core points, same noise and the same grouping of core points as sklearn's
+        DBSCAN over all events (border points next to two clusters may go either way)
+        """
+        batch = DBSCAN(eps=self.eps_rad, min_samples=self.min_samples, metric='haversine', algorithm='ball_tree')
+        labels = batch.fit_predict(to_radians(state['lon'], state['lat']))
+        core = np.zeros(len(labels), dtype=bool)
+        core[batch.core_sample_indices_] = True
+
+        np.testing.assert_array_equal(state['core'], core)
+        np.testing.assert_array_equal(state['labels'] == NOISE, labels == NOISE)
+        self.assertEqual(self.core_groups(state['labels'], core), self.core_groups(labels, core))
+
+    def core_groups(self, labels, core):
+        groups = {}
+        for position in np.flatnonzero(core):
+            groups.setdefault(labels[position], []).append(position)
+        return sorted(tuple(group) for group in groups.values())
+
+    def test_appends_match_batch_dbscan(self):
+        rng = np.random.default_rng(7)
+        for _ in range(10):
+            state = dbscan_full(random_events(rng, 300), self.eps_rad, self.min_samples)
+            for _ in range(5):
+                new_events = random_events(rng, int(rng.integers(1, 60)), first_gid=state['gids'].max() + 1)
+                state = dbscan_insert(state, new_events, self.eps_rad, self.min_samples)
+                self.assert_matches_batch(state)
+
+    def test_append_without_promotions(self):
+        # One tight cluster of core points, then an isolated event far away
+        cluster = [(36.80 + 0.0005 * i, -1.28) for i in range(6)]
+        state = dbscan_full(events_from_points(cluster), self.eps_rad, self.min_samples)
+        self.assertTrue(state['core'].all())
+
+        state = dbscan_insert(state, events_from_points([(36.95, -1.35)], first_gid=7), self.eps_rad, self.min_samples)
+        self.assertEqual(state['labels'][-1], NOISE)
+        self.assert_matches_batch(state)
+
+        # A border event next to the cluster promotes nothing either
+        state = dbscan_insert(state, events_from_points([(36.8001, -1.2801)], first_gid=8), self.eps_rad, self.min_samples)
+        self.assertEqual(state['labels'][-1], state['labels'][0])
+        self.assert_matches_batch(state)
+
+
+class PointClusterIndexTests(SimpleTestCase):
+
+    def test_counts_sum_to_event_total_at_every_zoom(self):
+        rng = np.random.default_rng(11)
+        events = random_events(rng, 3000)
+        events['fatalities'] = rng.integers(0, 4, 3000)
+        index = PointClusterIndex(events)
+        for zoom in range(MAX_CLUSTER_ZOOM + 1):
+            features = index.features(zoom)
+            counts = [feature['properties'].get('point_count', 1) for feature in features]
+            self.assertEqual(sum(counts), 3000, f'zoom {zoom}')
+            self.assertEqual(
+                sum(feature['properties']['fatalities'] for feature in features), int(events['fatalities'].sum())
+            )
+            singles = [feature['id'] for feature in features if not feature['properties']['cluster']]
+            self.assertEqual(len(singles), len(set(singles)))
+
+    def test_bbox_halves_partition_the_events(self):
+        index = PointClusterIndex(random_events(np.random.default_rng(12), 1000))
+        for zoom in (4, 10, MAX_CLUSTER_ZOOM):
+            halves = [index.features(zoom, (36.6, -1.5, 36.85, -1.1)), index.features(zoom, (36.85, -1.5, 37.1, -1.1))]
+            self.assertEqual(sum(feature['properties'].get('point_count', 1) for half in halves for feature in half), 1000)
+
+
+def lattice_weights(rows, columns):
+    """
+    Binary rook contiguity of a rows x columns lattice, cells numbered row by row
+    """
+    cells = np.arange(rows * columns).reshape(rows, columns)
+    pairs = np.concatenate([
+        np.column_stack([cells[:, :-1].ravel(), cells[:, 1:].ravel()]),
+        np.column_stack([cells[:-1, :].ravel(), cells[1:, :].ravel()]),
+    ])
+    size = rows * columns
+    return sparse.csr_matrix(
+        (np.ones(2 * len(pairs)), (np.r_[pairs[:, 0], pairs[:, 1]], np.r_[pairs[:, 1], pairs[:, 0]])),
+        shape=(size, size),
+    )
+
+
+class MoranTests(SimpleTestCase):
+
+    def test_global_moran_matches_hand_computed_values(self):
+        # Path 1-2-3-4: z = (-1.5, -0.5, 0.5, 1.5), lags (-0.5, -0.5, 0.5, 0.5), so I = 2 / 5
+        weights, _ = row_standardize(lattice_weights(1, 4))
+        z = np.array([1.0, 2.0, 3.0, 4.0]) - 2.5
+        moran = global_moran(z, weights, 99, np.random.default_rng(0))
+        self.assertAlmostEqual(moran['I'], 0.4)
+        self.assertAlmostEqual(moran['expected_I'], -1 / 3, places=6)
+
+        # A checkerboard is perfectly dispersed: every neighbour is of the other colour
+        weights, _ = row_standardize(lattice_weights(3, 3))
+        x = np.array([1.0, 0, 1, 0, 1, 0, 1, 0, 1])
+        self.assertAlmostEqual(global_moran(x - x.mean(), weights, 99, np.random.default_rng(0))['I'], -1.0)
+
+    def test_lisa_quadrants_and_p_values(self):
+        rng = np.random.default_rng(4)
+        x = rng.normal(0, 0.1, (6, 6))
+        x[:3, :3] += 10
+        z = (x - x.mean()).ravel()
+        weights, neighbour_counts = row_standardize(lattice_weights(6, 6))
+        permutations = 199
+        local_i, lag, p_values, quadrant = local_moran(
+            z, weights, neighbour_counts, permutations, np.random.default_rng(11)
+        )
+
+        self.assertEqual(quadrant[1 * 6 + 1], 1)  # inside the high block
+        self.assertEqual(quadrant[4 * 6 + 4], 3)  # in the low background
+        self.assertEqual(quadrant[0 * 6 + 3], 2)  # low cell next to the block
+        self.assertEqual(quadrant[2 * 6 + 2], 1)
+        self.assertLess(p_values[1 * 6 + 1], 0.05)
+        np.testing.assert_allclose(local_i, z * lag / (z @ z / len(z)))
+
+        # Brute force: one ward at a time over the same draws
+        draws = conditional_draws(np.random.default_rng(11), len(z), permutations, int(neighbour_counts.max()))
+        expected = np.empty(len(z))
+        for i, k in enumerate(neighbour_counts):
+            indices = draws[:, :k] + (draws[:, :k] >= i)
+            simulated = z[i] * z[indices].mean(axis=1) / (z @ z / len(z))
+            expected[i] = folded_p_values(local_i[i], simulated, permutations)
+        np.testing.assert_allclose(p_values, expected)
+
+    def test_request_validation(self):
+        for params in ({'indicator': 'gid'}, {'contiguity': 'bishop'}, {'permutations': 'many'},
+                       {'permutations': '98'}, {'permutations': '10000'}):
+            self.assertEqual(self.client.get('/api/ward-autocorrelation/', params).status_code, 400, params)
+
+        with mock.patch('protest.autocorrelation.get_autocorrelation', side_effect=ValueError('too few wards')):
+            self.assertEqual(self.client.get('/api/ward-autocorrelation/').status_code, 400)
+
+
+class BandwidthTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(9)
+        # Tight clusters plus background: Scott's rule oversmooths this
+        centres = rng.uniform(-5000, 5000, (6, 2))
+        points = centres[rng.integers(0, 6, 400)] + rng.normal(0, 150, (400, 2))
+        points[:60] = rng.uniform(-6000, 6000, (60, 2))
+        self.x, self.y = points[:, 0], points[:, 1]
+
+    def test_closed_form_rules(self):
+        n = len(self.x)
+        sigma = np.sqrt((np.var(self.x, ddof=1) + np.var(self.y, ddof=1)) / 2)
+        self.assertAlmostEqual(scott_bandwidth(self.x, self.y), sigma * n ** (-1 / 6))
+
+        robust = [
+            min(np.std(values, ddof=1), (np.percentile(values, 75) - np.percentile(values, 25)) / 1.349)
+            for values in (self.x, self.y)
+        ]
+        expected = np.sqrt((robust[0] ** 2 + robust[1] ** 2) / 2) * n ** (-1 / 6)
+        self.assertAlmostEqual(silverman_bandwidth(self.x, self.y), expected)
+
+    def test_binned_likelihood_matches_direct_sum(self):
+        counts, cell = bin_counts(self.x, self.y, cells=64)
+        bandwidth = 3 * cell
+        radius = int(np.ceil(4 * bandwidth / cell))
+        rows, columns = np.nonzero(counts)
+        n = counts.sum()
+        expected = 0.0
+        for row, column in zip(rows, columns):
+            # Same truncated kernel as the FFT, over the other points in range
+            close = (np.abs(rows - row) <= radius) & (np.abs(columns - column) <= radius)
+            d2 = ((rows[close] - row) ** 2 + (columns[close] - column) ** 2) * cell ** 2
+            density = (counts[rows[close], columns[close]] * np.exp(-d2 / (2 * bandwidth ** 2))).sum()
+            density = (density - 1) / (2 * np.pi * bandwidth ** 2) / (n - 1)
+            expected += counts[row, column] * np.log(max(density, 1e-300))
+        self.assertAlmostEqual(loo_log_likelihood(counts, cell, bandwidth), expected, delta=abs(expected) * 1e-6)
+
+    def test_cv_picks_the_best_candidate(self):
+        bandwidth, curve = cv_bandwidth(self.x, self.y)
+        scores = [point['log_likelihood'] for point in curve]
+        self.assertEqual(round(bandwidth, 1), curve[int(np.argmax(scores))]['bandwidth_m'])
+        self.assertGreater(np.argmax(scores), 0)
+        self.assertLess(np.argmax(scores), len(scores) - 1)
+        self.assertLess(bandwidth, scott_bandwidth(self.x, self.y))
+
+    def test_compute_kde_bandwidth(self):
+        lon, lat = 36.8 + self.x / 111320, -1.28 + self.y / 110574
+        with mock.patch('protest.bandwidth.get_event_snapshot', return_value={'lon': lon, 'lat': lat}):
+            scott = compute_kde_bandwidth('scott')
+            cv = compute_kde_bandwidth('cv')
+        x, y, _ = project_to_metres(lon, lat)
+        self.assertEqual(scott['bandwidth_m'], round(scott_bandwidth(x, y), 1))
+        self.assertIsNone(scott['cv_scores'])
+        self.assertEqual(cv['bandwidth_m'], round(cv_bandwidth(x, y)[0], 1))
+
+        with mock.patch('protest.bandwidth.get_event_snapshot', return_value={'lon': lon[:1], 'lat': lat[:1]}):
+            self.assertIsNone(compute_kde_bandwidth('scott')['bandwidth_m'])
+
+    def test_kde_density_is_per_square_degree(self):
+        rng = np.random.default_rng(3)
+        coords = np.column_stack([36.82 + rng.normal(0, 0.004, 300), -1.28 + rng.normal(0, 0.004, 300)])
+        result = perform_kde_analysis(coords, np.empty((0, 2)), bandwidth={'method': 'scott', 'bandwidth_m': 300})
+        bounds = result['grid_bounds']
+        cell = (bounds['x_max'] - bounds['x_min']) / 49 * (bounds['y_max'] - bounds['y_min']) / 49
+        self.assertAlmostEqual(np.sum(result['density_grid']) * cell, 1, delta=0.05)
+
+    def test_unknown_method_is_rejected(self):
+        response = self.client.get('/api/spatial-analysis/', {'bandwidth_method': 'plugin'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RiskForecastTests(SimpleTestCase):
+    ward_count, months, first_month = 30, 24, 2023 * 12
+
+    def setUp(self):
+        rng = np.random.default_rng(12)
+        self.static = rng.normal(size=(self.ward_count, len(WARD_FEATURES)))
+        self.static[0, 2] = np.nan
+        # Wards with a higher first indicator protest more
+        rate = np.exp(0.5 + 0.8 * self.static[:, 0])
+        self.counts = rng.poisson(rate[:, None], (self.ward_count, self.months)).astype(np.float64)
+        self.fatalities = rng.binomial(self.counts.astype(np.int64), 0.1).astype(np.float64)
+        self.gids = np.arange(1, self.ward_count + 1)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        cache_settings = override_settings(PROTEST_CACHE_DIR=cache_dir)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+        names = [f'Ward {gid}' for gid in self.gids]
+        for patch in (
+            mock.patch('protest.forecast.ward_table', return_value=(self.gids, names, self.static)),
+            mock.patch('protest.forecast.monthly_ward_counts',
+                       return_value=(self.counts, self.fatalities, self.first_month)),
+            mock.patch('protest.forecast.get_data_version', return_value='test'),
+            # Forget any model another test loaded into the process
+            mock.patch('protest.forecast._model', None),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_lag_features(self):
+        counts = np.array([[1.0, 2, 3, 4, 5]])
+        fatalities = np.array([[0.0, 1, 0, 2, 1]])
+        np.testing.assert_allclose(lag_features(counts, fatalities, 4), np.log1p([[4, 3, 2, 2.5, 3]]))
+        np.testing.assert_allclose(lag_features(counts, fatalities, 1), np.log1p([[1, 0, 0, 1, 0]]))
+
+    def test_poisson_d2(self):
+        y = np.array([0.0, 1, 2, 5])
+        self.assertAlmostEqual(poisson_d2(y, y, y.mean()), 1)
+        self.assertAlmostEqual(poisson_d2(y, np.full(4, y.mean()), y.mean()), 0)
+
+    def test_training_and_scoring(self):
+        model, _ = train_risk_model()
+        metadata = model.metadata
+        self.assertEqual(metadata['training_rows'], self.ward_count * (self.months - MIN_HISTORY_MONTHS))
+        self.assertEqual((metadata['first_month'], metadata['last_month']), ('2023-01', '2024-12'))
+        self.assertGreater(metadata['holdout_d2'], 0.2)
+        self.assertGreater(metadata['coefficients'][FEATURE_NAMES[0]], 0)
+
+        # The saved artifact scores exactly like the fitted model
+        features = compute_forecast_features()
+        self.assertEqual(features['forecast_month'], '2025-01')
+        loaded = RiskModel.load(model_path())
+        np.testing.assert_allclose(loaded.score(features['X']), model.score(features['X']))
+
+        with mock.patch('protest.forecast.get_forecast_features', return_value=(features, 'v1')):
+            response = self.client.get('/api/risk-forecast/')
+        self.assertEqual(response.status_code, 200)
+        wards = json.loads(response.content)['wards']
+        expected = model.score(features['X'])
+        for ward, rate in zip(wards, expected):
+            self.assertAlmostEqual(ward['expected_events'], rate, places=4)
+            self.assertAlmostEqual(ward['probability'], 1 - np.exp(-rate), places=4)
+
+    def test_untrained_model_is_unavailable(self):
+        self.assertEqual(self.client.get('/api/risk-forecast/').status_code, 503)
+
+
+class HexbinTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(6)
+        self.events = random_events(rng, 600)
+        self.events['fatalities'] = rng.integers(0, 3, 600)
+        self.events['dates'] = np.datetime64('2023-01-01') + rng.integers(0, 700, 600).astype('timedelta64[D]')
+        self.events['dates'][::50] = np.datetime64('NaT')
+
+    def test_every_level_counts_every_event(self):
+        days = self.events['dates'].astype('datetime64[D]').astype(np.int64)
+        dated = ~np.isnat(self.events['dates'])
+        x, y = to_mercator(self.events['lon'], self.events['lat'])
+        for size, cells in zip(HEX_SIZES_M, bin_events(self.events)):
+            self.assertEqual(cells['count'].sum(), len(self.events['gids']))
+            self.assertEqual(cells['fatalities'].sum(), self.events['fatalities'].sum())
+
+            q, r = hex_axial(x, y, size)
+            for i in range(len(cells['q'])):
+                members = (q == cells['q'][i]) & (r == cells['r'][i])
+                self.assertEqual(cells['count'][i], members.sum())
+                member_days = days[members & dated]
+                self.assertEqual(cells['latest'][i], member_days.max() if len(member_days) else NO_DATE)
+
+    def test_events_fall_in_the_nearest_hexagon(self):
+        x, y = to_mercator(self.events['lon'], self.events['lat'])
+        # Axial offsets of the six neighbouring hexagons
+        offsets = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, -1), (-1, 1))
+        for size in HEX_SIZES_M:
+            q, r = hex_axial(x, y, size)
+            own_x, own_y = hex_centres(q, r, size)
+            own = np.hypot(x - own_x, y - own_y)
+            # No point is further from its centre than a hexagon's circumradius
+            self.assertTrue(np.all(own <= size * (1 + 1e-9)))
+            for dq, dr in offsets:
+                other_x, other_y = hex_centres(q + dq, r + dr, size)
+                self.assertTrue(np.all(own <= np.hypot(x - other_x, y - other_y) + 1e-6))
+
+    def test_incremental_merge_matches_full_build(self):
+        head = {key: values[:400] for key, values in self.events.items()}
+        tail = {key: values[400:] for key, values in self.events.items()}
+        for merged, full in zip(bin_events(tail, bin_events(head)), bin_events(self.events)):
+            for key in ('q', 'r', 'count', 'fatalities', 'latest'):
+                np.testing.assert_array_equal(merged[key], full[key])
+
+    def test_request_validation(self):
+        for params in ({'zoom': 'near'}, {'zoom': '11.5'}, {'in_bbox': '36.7,-1.4,37.0'},
+                       {'in_bbox': '36.7,-1.4,east,-1.2'}):
+            self.assertEqual(self.client.get('/api/protest-hexbins/', params).status_code, 400, params)
+
+
+class HotspotTests(SimpleTestCase):
+
+    def test_gi_star_matches_brute_force(self):
+        nx, ny, steps = 4, 3, 5
+        cube = np.random.default_rng(2).poisson(2, (steps, nx * ny)).astype(np.float64)
+        n = cube.size
+        mean, std = cube.mean(), cube.std()
+
+        for time_window in (1, 3):
+            z_scores = gi_star(cube, queen_weights(nx, ny), time_window)
+            for step in range(steps):
+                for cell in range(nx * ny):
+                    row, column = divmod(cell, nx)
+                    neighbours = [
+                        other for other in range(nx * ny)
+                        if abs(other // nx - row) <= 1 and abs(other % nx - column) <= 1
+                    ]
+                    window = range(max(step - time_window + 1, 0), step + 1)
+                    values = [cube[t, other] for t in window for other in neighbours]
+                    w = len(values)
+                    expected = (sum(values) - mean * w) / (std * np.sqrt((n * w - w ** 2) / (n - 1)))
+                    self.assertAlmostEqual(z_scores[step, cell], expected, places=9)
+
+    def test_gi_star_of_a_constant_cube_is_zero(self):
+        np.testing.assert_array_equal(gi_star(np.ones((3, 4)), queen_weights(2, 2), 1), 0)
+
+    def test_mann_kendall_matches_pairwise_sum(self):
+        series = np.random.default_rng(5).normal(size=(9, 40))
+        series[:, 0] = np.arange(9)  # strictly increasing
+        z, p = mann_kendall(series)
+        variance = 9 * 8 * 23 / 18
+        for column in range(series.shape[1]):
+            values = series[:, column]
+            s = sum(np.sign(values[j] - values[i]) for i in range(9) for j in range(i + 1, 9))
+            self.assertAlmostEqual(z[column], (s - np.sign(s)) / np.sqrt(variance))
+        self.assertAlmostEqual(z[0], 35 / np.sqrt(variance))
+        self.assertLess(p[0], 0.001)
+
+    def test_request_validation(self):
+        for params in ({'time_step': 'day'}, {'cell_size_m': 'large'}, {'cell_size_m': '99'},
+                       {'cell_size_m': '499', 'time_step': 'week'}, {'cell_size_m': '10001'},
+                       {'time_window': '0'}, {'time_window': '13'}):
+            self.assertEqual(self.client.get('/api/emerging-hotspots/', params).status_code, 400, params)
+
+        with mock.patch('protest.hotspots.get_emerging_hotspots', side_effect=CubeTooLarge('too many cells')):
+            self.assertEqual(self.client.get('/api/emerging-hotspots/').status_code, 400)
+
+
+class IsochroneTests(SimpleTestCase):
+    # Nine 0.01° (~1.1 km) segments at 10 m/s, ~111 s each, with a station at each end
+    segment_count = 9
+
+    def road_graph(self):
+        lon = 36.8 + 0.01 * np.arange(self.segment_count + 1)
+        lines = [
+            (np.array([[lon[i], -1.28], [lon[i + 1], -1.28]]), 10.0)
+            for i in range(self.segment_count)
+        ]
+        return RoadGraph(build_graph_arrays(lines), 'test')
+
+    def compute(self, minutes):
+        graph = self.road_graph()
+        stations = [(1, 'West', 36.8, -1.28), (2, 'East', 36.8 + 0.01 * self.segment_count, -1.28)]
+        # Features carry the CSR positions of their edges instead of buffered polygons
+        with mock.patch('protest.isochrones.get_road_graph', return_value=graph), \
+                mock.patch('protest.isochrones.facility_locations', return_value=stations), \
+                mock.patch('protest.isochrones.edges_polygon', lambda graph, positions: positions if len(positions) else None), \
+                mock.patch('protest.isochrones.isochrone_feature', lambda positions, properties: {**properties, 'positions': positions}):
+            return compute_isochrones('police', minutes)
+
+    def test_reachable_edges_and_catchments(self):
+        features = self.compute((5, 15))
+        edges = {
+            (feature['minutes'], feature['scope'], feature.get('facility_gid')): len(feature['positions'])
+            for feature in features
+        }
+        # 5 min (300 s) reaches two segments from each end; 15 min reaches every segment,
+        # split at the node closer to the west station
+        self.assertEqual(edges, {
+            (5, 'all', None): 4, (5, 'facility', 1): 2, (5, 'facility', 2): 2,
+            (15, 'all', None): 9, (15, 'facility', 1): 5, (15, 'facility', 2): 4,
+        })
+
+    def test_request_validation(self):
+        with mock.patch('protest.isochrones.get_isochrones', return_value=([], 'v1')):
+            for params in ({'minutes': '5,ten'}, {'minutes': '0'}, {'minutes': '61'},
+                           {'minutes': '5,10,15,20'}, {'type': 'fire'}, {'scope': 'ward'}):
+                self.assertEqual(self.client.get('/api/isochrones/', params).status_code, 400, params)
+
+            response = self.client.get('/api/isochrones/', {'minutes': '15,5,5,10,15'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)['minutes'], [5, 10, 15])
+
+
+class ProximityTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(8)
+        events = random_events(rng, 250, first_gid=100)
+        self.events = (events['gids'], events['lon'], events['lat'])
+        station_lon, station_lat = rng.uniform([36.7, -1.4], [37.0, -1.2], (12, 2)).T
+        self.stations = (np.arange(1, 13), [f'Station {gid}' for gid in range(1, 13)], station_lon, station_lat)
+
+    def document(self, radius_km, summary_only=False):
+        # Small chunks so the document is stitched together from several of them
+        with mock.patch('protest.proximity.PROXIMITY_CHUNK_SIZE', 64):
+            return json.loads(b''.join(stream_proximity_json(radius_km, self.events, self.stations, summary_only)))
+
+    def test_stream_matches_brute_force(self):
+        radius_km = 3
+        document = self.document(radius_km)
+        gids, lon, lat = self.events
+        station_gids, _, station_lon, station_lat = self.stations
+        distance_km = haversine_m(lon[:, None], lat[:, None], station_lon[None, :], station_lat[None, :]) / 1000
+
+        self.assertEqual([event['gid'] for event in document['events']], gids.tolist())
+        for event, distances in zip(document['events'], distance_km):
+            self.assertEqual(event['nearest']['gid'], station_gids[distances.argmin()])
+            self.assertAlmostEqual(event['nearest']['distance_km'], distances.min(), delta=6e-4)
+            within = np.flatnonzero(distances <= radius_km)
+            within = within[np.argsort(distances[within])]
+            self.assertEqual([gid for gid, _ in event['within']], station_gids[within].tolist())
+
+        summary = document['summary']
+        within_counts = (distance_km <= radius_km).sum(axis=0)
+        self.assertEqual(summary['total_events'], len(gids))
+        self.assertEqual(summary['events_within_radius'], int((distance_km <= radius_km).any(axis=1).sum()))
+        self.assertAlmostEqual(summary['mean_nearest_km'], distance_km.min(axis=1).mean(), delta=6e-4)
+        self.assertEqual(summary['busiest_stations'][0]['events_within_radius'], within_counts.max())
+
+        summary_only = self.document(radius_km, summary_only=True)
+        self.assertEqual(summary_only['events'], [])
+        self.assertEqual(summary_only['summary'], summary)
+
+    def test_request_validation(self):
+        for params in ({'radius_km': '0'}, {'radius_km': '51'}, {'radius_km': 'nan'}, {'radius_km': 'far'},
+                       {'start_date': '2024-13-01'}, {'end_date': 'yesterday'}):
+            self.assertEqual(self.client.get('/api/proximity/', params).status_code, 400, params)
+
+
+class BenchEventSerializationTests(SimpleTestCase):
+
+    def test_both_paths_produce_the_same_document(self):
+        instances, rows = synthetic_events(10)
+        drf_output = JSONRenderer().render(ProtestEventsSerializer(instances, many=True).data)
+        self.assertEqual(json.loads(drf_output), json.loads(encode_feature_collection(rows)))
+
+    def test_command_runs_and_checks_each_size(self):
+        # The command raises CommandError if the two documents differ
+        out = StringIO()
+        call_command('bench_event_serialization', sizes=[10], skip_drf_above=None, check_rows=0, stdout=out)
+        self.assertRegex(out.getvalue(), r'\n\s+10\s+\d+\.\d+\s+\d+\.\d+\s+\S+x')
+
+
+class BenchStartupTests(SimpleTestCase):
+
+    def test_parse_importtime(self):
+        stderr = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |   numpy.core._multiarray_umath',
+            'import time:       380 |        500 | numpy',
+            'import time:        50 |         50 |     rest_framework.settings',
+            'import time:       200 |        250 |   protest.views',
+            'Some other warning on stderr',
+        ])
+        total, packages = parse_importtime(stderr)
+        self.assertAlmostEqual(total, 750e-6)
+        self.assertEqual(set(packages), {'numpy', 'rest_framework'})
+        self.assertAlmostEqual(packages['numpy'], 500e-6)
+        self.assertAlmostEqual(packages['rest_framework'], 50e-6)
+
+    def test_import_timing_run(self):
+        # No paths, so only the imports of a fresh interpreter are timed and no request is served
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        output = os.path.join(output_dir, 'startup.json')
+        call_command('bench_startup', runs=1, modes=[''], paths=[], output=output, stdout=StringIO())
+
+        with open(output) as f:
+            results = json.load(f)['results']
+        self.assertEqual(set(results), {'lazy'})
+        self.assertEqual(results['lazy']['first_request'], {})
+        self.assertGreater(results['lazy']['import']['total'], 0)
+        self.assertIn('django', results['lazy']['import']['packages'])
+
+def search_entry(search_type, name, gid=1, features=1):
+    return {
+        'type': search_type, 'name': name, 'gid': gid, 'features': features,
+        'bbox': [36.8, -1.3, 36.9, -1.2], 'centroid': [36.85, -1.25],
+    }
+
+
+class SearchIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = SearchIndex([
+            search_entry('road', 'Kenyatta Avenue', gid=1, features=12),
+            search_entry('road', 'Jomo Kenyatta Highway', gid=2, features=30),
+            search_entry('road', 'Kenyatta', gid=3),
+            search_entry('ward', 'Kilimani', gid=4),
+            search_entry('subcounty', 'Kilimani', gid=5, features=5),
+            search_entry('hospital', 'Kenyatta National Hospital', gid=6),
+            search_entry('police', 'Kilimani Police Station', gid=7),
+            search_entry('ward', 'Muthaiga Nord-Est', gid=8),
+        ])
+
+    def names(self, *args, **kwargs):
+        return [(result['type'], result['name']) for result in self.index.search(*args, **kwargs)]
+
+    def test_exact_match_ranks_above_prefix_above_inner_word(self):
+        results = self.index.search('kenyatta')
+        self.assertEqual([result['gid'] for result in results], [3, 1, 6, 2])
+        self.assertEqual(results[0]['score'], 3.0)
+        self.assertTrue(all(a['score'] >= b['score'] for a, b in zip(results, results[1:])))
+
+    def test_every_typed_word_must_prefix_a_name_word(self):
+        self.assertEqual(self.names('kenyatta av'), [('road', 'Kenyatta Avenue')])
+        self.assertEqual(self.names('jomo ken'), [('road', 'Jomo Kenyatta Highway')])
+        # No name has both words, so only fuzzy trigram matches (scores below 1) come back
+        self.assertTrue(all(result['score'] < 1 for result in self.index.search('kenyatta police')))
+
+    def test_type_priority_breaks_ties(self):
+        self.assertEqual(self.names('kilimani')[:2], [('subcounty', 'Kilimani'), ('ward', 'Kilimani')])
+        self.assertEqual(self.names('kilimani', types=('ward', 'police')),
+                         [('ward', 'Kilimani'), ('police', 'Kilimani Police Station')])
+
+    def test_case_accents_and_punctuation_are_ignored(self):
+        self.assertEqual(self.names('  KÉNYATTA   AVENUE!'), [('road', 'Kenyatta Avenue')])
+        self.assertEqual(self.names('nord est'), [('ward', 'Muthaiga Nord-Est')])
+
+    def test_misspelling_falls_back_to_trigrams(self):
+        results = self.index.search('kenyata avenue')
+        self.assertEqual(results[0]['name'], 'Kenyatta Avenue')
+        self.assertTrue(all(result['score'] < 1 for result in results))
+
+    def test_limit_and_empty_query(self):
+        self.assertEqual(len(self.index.search('k', limit=2)), 2)
+        self.assertEqual(self.index.search(' !? '), [])
+        self.assertEqual(self.index.search('zzzzqqq'), [])
+
+
+class GisTablesMixin:
+    """
+    The GIS tables are unmanaged, so the test database starts without them
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ensure_tables(TRACKED_MODELS)
+
+    def create_event(self, lon=36.82, lat=-1.28, fatalities=0, event_date=date(2024, 6, 25)):
+        return ProtestEvents.objects.create(
+            event_date=event_date, year=event_date.year, latitude=lat, longitude=lon,
+            fatalities=fatalities, geom=Point(lon, lat, srid=4326),
+        )
+
+
+class GisTablesTestCase(GisTablesMixin, TestCase):
+    pass
+
+
+class ClusteredListTests(GisTablesTestCase):
+
+    def test_non_finite_zoom_is_rejected(self):
+        for zoom in ('nan', 'inf', '-inf', 'eleven'):
+            response = self.client.get('/api/protest-events/', {'cluster': 'true', 'zoom': zoom})
+            self.assertEqual(response.status_code, 400, zoom)
+
+    def test_clusters_cover_every_event(self):
+        for position in range(20):
+            self.create_event(lon=36.8 + 0.001 * position, lat=-1.28)
+        response = self.client.get('/api/protest-events/', {'cluster': 'true', 'zoom': '11.7'})
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(response.content)
+        self.assertEqual(payload['zoom'], 11)
+        self.assertEqual(sum(feature['properties'].get('point_count', 1) for feature in payload['features']), 20)
+
+
+class NearestFacilityTests(GisTablesTestCase):
+    # Offsets east of the query point, nearest first once ranked
+    offsets = {'Far': 0.03, 'Near': 0.005, 'Middle': 0.012}
+
+    def setUp(self):
+        for name, offset in self.offsets.items():
+            NairobiHospitals.objects.create(name=name, geom=Point(36.82 + offset, -1.28, srid=4326))
+
+    def test_ranks_by_geodesic_distance(self):
+        response = self.client.get('/api/nearest/', {'lat': -1.28, 'lon': 36.82, 'type': 'hospital', 'k': 2})
+        self.assertEqual(response.status_code, 200)
+        facilities = json.loads(response.content)['facilities']
+        self.assertEqual([facility['name'] for facility in facilities], ['Near', 'Middle'])
+        for facility in facilities:
+            expected = haversine_m(36.82, -1.28, 36.82 + self.offsets[facility['name']], -1.28)
+            # Geography distances use the spheroid, the haversine a sphere
+            self.assertAlmostEqual(facility['distance_m'], expected, delta=expected * 0.005)
+
+    def test_batch_keeps_query_order(self):
+        response = self.client.post('/api/nearest/', json.dumps({
+            'type': 'hospital', 'k': 1,
+            'points': [{'lat': -1.28, 'lon': 36.86}, {'lat': -1.28, 'lon': 36.82}],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)['results']
+        self.assertEqual([result['facilities'][0]['name'] for result in results], ['Far', 'Near'])
+
+    def test_invalid_requests(self):
+        for params in ({'lat': -1.28}, {'lat': 'south', 'lon': 36.82}, {'lat': -1.28, 'lon': 36.82, 'k': 'all'},
+                       {'lat': -1.28, 'lon': 36.82, 'type': 'fire'}):
+            self.assertEqual(self.client.get('/api/nearest/', params).status_code, 400, params)
+        for body in ([], {'points': []}, {'points': [{'lat': -1.28}]},
+                     {'points': [{'lat': -1.28, 'lon': 36.82}] * 1001}):
+            response = self.client.post('/api/nearest/', json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+
+class CoverageBufferTests(GisTablesTestCase):
+
+    def setUp(self):
+        # Two hospitals 1 km apart inside one ward; the second ward is out of reach
+        for lon in (36.82, 36.82 + degrees_east(1000)):
+            NairobiHospitals.objects.create(name=f'Hospital {lon:.3f}', geom=Point(lon, -1.28, srid=4326))
+        for gid, (west, population) in enumerate(((36.78, 10000), (36.9, 5000)), start=1):
+            MergedWards.objects.create(
+                gid=gid, ward=f'Ward {gid}', pop2009=population,
+                geom=Polygon.from_bbox((west, -1.32, west + 0.08, -1.24)),
+            )
+
+    def test_dissolved_area_and_ward_shares(self):
+        response = self.client.get('/api/coverage-buffers/', {'type': 'hospital', 'radius_km': 1})
+        self.assertEqual(response.status_code, 200)
+        coverage = json.loads(response.content)
+
+        # Two unit discs 1 km apart overlap in a lens of 2·acos(1/2) − √3/2 km²
+        union_km2 = 2 * np.pi - (2 * np.arccos(0.5) - np.sqrt(3) / 2)
+        self.assertEqual(coverage['facility_count'], 2)
+        self.assertAlmostEqual(coverage['coverage_area_km2'], union_km2, delta=union_km2 * 0.02)
+
+        inside, outside = coverage['wards']
+        self.assertAlmostEqual(inside['covered_km2'], coverage['coverage_area_km2'], delta=0.01)
+        self.assertAlmostEqual(
+            inside['covered_population'], 10000 * inside['covered_km2'] / inside['area_km2'], delta=1
+        )
+        self.assertEqual(inside['covered_population'] + inside['uncovered_population'], 10000)
+        self.assertEqual((outside['covered_km2'], outside['covered_population']), (0, 0))
+        self.assertEqual(coverage['totals']['population'], 15000)
+        self.assertEqual(coverage['totals']['covered_population'], inside['covered_population'])
+
+    def test_invalid_requests(self):
+        for params in ({'type': 'fire'}, {'radius_km': '0'}, {'radius_km': '21'}, {'radius_km': 'nan'},
+                       {'radius_km': 'wide'}):
+            self.assertEqual(self.client.get('/api/coverage-buffers/', params).status_code, 400, params)
+
+
+class SpatialMetricsTests(GisTablesTestCase):
+    # The view takes no parameters, so there is no request validation to cover
+
+    def setUp(self):
+        self.ward_bbox = (36.78, -1.32, 36.86, -1.24)
+        MergedWards.objects.create(gid=1, ward='Ward 1', geom=Polygon.from_bbox(self.ward_bbox))
+        # Hospitals 1 km and then 2 km apart along a parallel
+        for name, metres in (('A', 0), ('B', 1000), ('C', 3000)):
+            NairobiHospitals.objects.create(name=name, geom=Point(36.8 + degrees_east(metres), -1.28, srid=4326))
+        PoliceStn.objects.create(name='Central', geom=Point(36.81, -1.29, srid=4326))
+        for highway, metres in (('primary', 1000), ('residential', 2000)):
+            NairobiRoads.objects.create(
+                highway=highway, geom=LineString((36.8, -1.3), (36.8 + degrees_east(metres, -1.3), -1.3), srid=4326)
+            )
+
+    def test_areas_densities_distances_and_road_lengths(self):
+        metrics = compute_spatial_metrics()
+
+        west, south, east, north = self.ward_bbox
+        width_m = haversine_m(west, -1.28, east, -1.28)
+        height_m = haversine_m(west, south, west, north)
+        area_km2 = width_m * height_m / 1e6
+        self.assertAlmostEqual(metrics['total_area_km2'], area_km2, delta=area_km2 * 0.01)
+
+        hospitals = metrics['facilities']['hospital']
+        self.assertEqual(hospitals['count'], 3)
+        self.assertAlmostEqual(hospitals['density_per_km2'], 3 / metrics['total_area_km2'], places=3)
+        # Nearest neighbours: A-B 1 km, B-A 1 km, C-B 2 km
+        nearest = hospitals['nearest_neighbour']
+        self.assertEqual(nearest['count'], 3)
+        for key, expected in (('mean_km', 4 / 3), ('median_km', 1), ('min_km', 1), ('max_km', 2)):
+            self.assertAlmostEqual(nearest[key], expected, delta=expected * 0.01)
+        self.assertEqual(metrics['facilities']['police']['nearest_neighbour'], None)
+
+        self.assertEqual([road['highway'] for road in metrics['road_length_by_class']], ['residential', 'primary'])
+        for road, expected in zip(metrics['road_length_by_class'], (2, 1)):
+            self.assertAlmostEqual(road['length_km'], expected, delta=expected * 0.01)
+        self.assertAlmostEqual(metrics['road_length_km'], 3, delta=0.03)
+
+        ward, = metrics['wards']
+        self.assertEqual((ward['hospital_count'], ward['police_count']), (3, 1))
+        self.assertEqual(metrics['dashboard']['avgHospitalDistance'], nearest['mean_km'])
+
+
+@override_settings(PROTEST_METRICS_ENABLED=True, PROTEST_METRICS_TOKEN='scrape-secret')
+class MetricsEndpointTests(TestCase):
+
+    def test_anonymous_request_is_refused(self):
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+        response = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_token_and_staff_are_allowed(self):
+        response = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+        user = get_user_model().objects.create_user('ops', password='unused', is_staff=True)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 200)
+
+    @override_settings(PROTEST_METRICS_TOKEN='')
+    def test_empty_token_allows_no_one(self):
+        response = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(PROTEST_METRICS_ENABLED=False)
+    def test_disabled_metrics_are_not_found(self):
+        response = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 404)
+
+
+class ChangelistAnnotationTests(GisTablesTestCase):
+    """
+    The changelist's SQL annotations must agree with the model properties they replace
+    """
+
+    def changelist_rows(self, model):
+        model_admin = admin.site._registry[model]
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        request = RequestFactory().get(url)
+        request.resolver_match = resolve(url)
+        return model_admin, list(model_admin.get_queryset(request))
+
+    def assert_annotations_match(self, model):
+        model_admin, rows = self.changelist_rows(model)
+        self.assertTrue(rows)
+        for name in model_admin.changelist_annotations:
+            for row in rows:
+                annotated = getattr(row, ANNOTATION_PREFIX + name)
+                expected = getattr(model.objects.get(pk=row.pk), name)
+                if name == 'has_fatalities':
+                    # the property returns the falsy fatalities value itself (0 or None)
+                    expected = None if expected is None else bool(expected)
+                self.assertEqual(annotated, expected, f'{name} of {model.__name__} {row.pk}')
+
+    def test_event_annotations_match_properties(self):
+        for fatalities in (None, 0, 1, 2, 3, 5, 6, 40):
+            self.create_event(fatalities=fatalities)
+        self.assert_annotations_match(ProtestEvents)
+
+    def test_ward_annotations_match_properties(self):
+        rng = np.random.default_rng(3)
+        # unknown values, every level threshold, and random values in between
+        values = {
+            'poverty_ra': (None, 0, 19.9, 20, 40, 60, 85),
+            'youth_unem': (None, 0, 15, 30, 45, 70),
+            'slum_house': (None, 0, 10, 50, 90),
+            'pop_densit': (None, 0, 1000, 5000, 12000),
+            'avg_educat': (None, 0, 5, 12, 15),
+            'protest_de': (None, 0, 0.5, 1.0, 2.0, 4.0),
+        }
+        for gid in range(1, 41):
+            fields = {field: choices[rng.integers(len(choices))] for field, choices in values.items()}
+            MergedWards.objects.create(gid=gid, ward=f'Ward {gid}', **fields)
+        for gid in range(41, 81):
+            fields = {field: float(rng.uniform(0.01, 1.5 * choices[-1])) for field, choices in values.items()}
+            MergedWards.objects.create(gid=gid, ward=f'Ward {gid}', **fields)
+        MergedWards.objects.create(gid=81, ward='Ward 81')
+        self.assert_annotations_match(MergedWards)
+
+
+class DataVersionTriggerTests(GisTablesTestCase):
+
+    def test_versioned_tables_are_the_tracked_tables(self):
+        self.assertEqual(set(VERSIONED_TABLES), {model._meta.db_table for model in TRACKED_MODELS})
+
+    def test_bulk_writes_bump_the_version(self):
+        writes = (
+            lambda: ProtestEvents.objects.bulk_create([
+                ProtestEvents(event_date=date(2024, 6, 25), year=2024, latitude=-1.28, longitude=36.82,
+                              fatalities=0, geom=Point(36.82, -1.28, srid=4326)),
+            ]),
+            lambda: ProtestEvents.objects.update(fatalities=4),
+            lambda: ProtestEvents.objects.all().delete(),
+        )
+        for write in writes:
+            before = get_data_version(ProtestEvents)
+            write()
+            self.assertNotEqual(get_data_version(ProtestEvents), before)
+
+    def test_statement_touching_no_rows_keeps_the_version(self):
+        self.create_event()
+        before = get_data_version(ProtestEvents)
+        ProtestEvents.objects.filter(fatalities=99).update(fatalities=100)
+        self.assertEqual(get_data_version(ProtestEvents), before)
+
+
+class RiskCubeTests(GisTablesTestCase):
+    """
+    Grid, origin and bandwidth are fixed when a cube is first built, so the appended
+    events keep the extent and mean of the first batch and the bandwidth is pinned
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def build(self, name):
+        with self.settings(PROTEST_CACHE_DIR=f'{self.cache_dir}/{name}'):
+            index, recomputed = update_risk_cube('month')
+            cube = RiskCube(cube_directory('month'), index)
+            return index, recomputed, np.array(cube.density), np.array(cube.cumulative)
+
+    @mock.patch('protest.risk_cube.cube_bandwidth', return_value=800.0)
+    def test_incremental_update_matches_full_rebuild(self, cube_bandwidth):
+        rng = np.random.default_rng(3)
+        points = rng.uniform([36.7, -1.4], [37.0, -1.2], (120, 2))
+        for position, (lon, lat) in enumerate(points):
+            self.create_event(lon=lon, lat=lat, event_date=date(2024, 1 + position % 6, 15))
+        self.assertEqual(self.build('incremental')[1], 6)
+
+        centre = points.mean(axis=0)
+        for offset in (0.01, 0.02, 0.03):
+            for sign in (1, -1):
+                lon, lat = centre + sign * offset
+                self.create_event(lon=lon, lat=lat, event_date=date(2024, 6, 20))
+                self.create_event(lon=lon, lat=lat, event_date=date(2024, 7, 2))
+
+        index, recomputed, density, cumulative = self.build('incremental')
+        full_index, full_recomputed, full_density, full_cumulative = self.build('full')
+        self.assertEqual((recomputed, full_recomputed), (2, 7))
+        self.assertEqual(index['bounds'], full_index['bounds'])
+        np.testing.assert_allclose(index['origin'], full_index['origin'])
+        np.testing.assert_allclose(density, full_density, rtol=1e-5, atol=1e-9)
+        np.testing.assert_allclose(cumulative, full_cumulative, rtol=1e-5, atol=1e-9)
+
+    def test_no_cube_without_a_bandwidth(self):
+        with self.settings(PROTEST_CACHE_DIR=self.cache_dir):
+            for lon in (36.80, 36.85, 36.90):
+                self.create_event(lon=lon, lat=-1.28, event_date=date(2024, 3, 1))
+            self.assertIsNotNone(update_risk_cube('month')[0])
+
+            ProtestEvents.objects.all().delete()
+            cases = (
+                ('no events', []),
+                ('one dated event', [(36.82, date(2024, 3, 1)), (36.95, None)]),
+                ('identical points', [(36.82, date(2024, 3, 1)), (36.82, date(2024, 4, 1)), (36.82, date(2024, 5, 1))]),
+            )
+            for label, events in cases:
+                ProtestEvents.objects.all().delete()
+                for lon, event_date in events:
+                    ProtestEvents.objects.create(
+                        event_date=event_date, year=event_date and event_date.year, latitude=-1.28, longitude=lon,
+                        fatalities=0, geom=Point(lon, -1.28, srid=4326),
+                    )
+                self.assertEqual(update_risk_cube('month'), (None, 0), label)
+                self.assertEqual(os.listdir(cube_directory('month')), ['.lock'], label)
+                response = self.client.get('/api/risk-cube/', {'slice': '2024-03'})
+                self.assertEqual(response.status_code, 404, label)
+
+    def test_bandwidth_is_scotts_rule_over_dated_events(self):
+        rng = np.random.default_rng(5)
+        lon, lat = rng.uniform(36.7, 37.0, 40), rng.uniform(-1.4, -1.2, 40)
+        x, y, _ = project_to_metres(lon, lat)
+        sigma = np.sqrt((x.var(ddof=1) + y.var(ddof=1)) / 2)
+        self.assertAlmostEqual(cube_bandwidth(lon, lat), sigma * 40 ** (-1 / 6), delta=0.05)
+        self.assertIsNone(cube_bandwidth(lon[:1], lat[:1]))
+        self.assertIsNone(cube_bandwidth(np.full(3, 36.8), np.full(3, -1.3)))
+
+
+class BenchApiTests(GisTablesTestCase):
+    """
+    The command's client sends Host: localhost, which the test runner does not allow by default
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        bench_settings = override_settings(
+            PROTEST_BENCHMARK_DATABASE=True, ALLOWED_HOSTS=['localhost'], PROTEST_CACHE_DIR=self.cache_dir,
+        )
+        bench_settings.enable()
+        self.addCleanup(bench_settings.disable)
+        load_synthetic_data(events=50, roads_count=50, police=5, hospital_count=5, log=lambda *args: None)
+
+    def test_cases_run_and_results_are_written(self):
+        output = os.path.join(self.cache_dir, 'bench.json')
+        cases = ['protest-events', 'nairobi-roads', 'serialize-protest-events', 'serialize-nairobi-roads']
+        call_command('bench_api', repeat=0, serializer_rows=5, cases=cases, output=output, stdout=StringIO())
+
+        with open(output) as f:
+            report = json.load(f)
+        results = report['results']
+        self.assertEqual(sorted(results), sorted(cases))
+        for name in ('protest-events', 'nairobi-roads'):
+            self.assertEqual(results[name]['status'], 200, results[name].get('error'))
+            self.assertGreater(results[name]['bytes'], 0)
+        for name in ('serialize-protest-events', 'serialize-nairobi-roads'):
+            self.assertEqual(results[name]['rows'], 5)
+        self.assertEqual(report['meta']['rows']['protest_events'], 50)
+
+    def test_unknown_case_is_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_api', repeat=0, cases=['no-such-case'], stdout=StringIO())
+
+
+class ProtestEventsDeltaSyncTests(GisTablesMixin, TransactionTestCase):
+    """
+    Sync tokens are snapshot xmins, so these need real commits rather than one test transaction
+    """
+
+    def tearDown(self):
+        ProtestEvents.objects.all().delete()
+        super().tearDown()
+
+    def delta(self, since):
+        response = self.client.get('/api/protest-events/', {'since': since})
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    def test_since_round_trip(self):
+        kept = self.create_event()
+        removed = self.create_event(lon=36.9)
+        response = self.client.get('/api/protest-events/')
+        token = response['X-Sync-Token']
+        self.assertEqual(self.delta(token)['features'], [])
+
+        ProtestEvents.objects.filter(gid=kept.gid).update(fatalities=3)
+        removed.delete()
+        added = self.create_event(lon=36.7)
+
+        delta = self.delta(token)
+        features = {feature['id']: feature for feature in delta['features']}
+        self.assertEqual(sorted(features), sorted([kept.gid, added.gid]))
+        self.assertEqual(features[kept.gid]['properties']['fatalities'], 3)
+        self.assertEqual(delta['deleted'], [removed.gid])
+
+        caught_up = self.delta(delta['sync_token'])
+        self.assertEqual((caught_up['features'], caught_up['deleted']), ([], []))
+
+    def test_iso_date_since(self):
+        event = self.create_event()
+        delta = self.delta(date.today().isoformat())
+        self.assertEqual([feature['id'] for feature in delta['features']], [event.gid])
+
+    def test_bare_year_is_not_a_token(self):
+        response = self.client.get('/api/protest-events/', {'since': '2024'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_trigger_check_is_cached_and_token_only_on_first_page(self):
+        ProtestEvents.objects.bulk_create([
+            ProtestEvents(event_date=date(2024, 6, 25), year=2024, latitude=-1.28, longitude=36.8 + 0.001 * position,
+                          fatalities=0, geom=Point(36.8 + 0.001 * position, -1.28, srid=4326))
+            for position in range(101)
+        ])
+        token = self.client.get('/api/protest-events/')['X-Sync-Token']
+        self.assertNotIn('X-Sync-Token', self.client.get('/api/protest-events/', {'page': 2}))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.delta(token)
+            self.delta(token)
+        self.assertFalse([query for query in queries if 'pg_trigger' in query['sql']])
+
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER protest_events_log_insert ON protest_events')
+        self.addCleanup(install_triggers, connection)
+        self.create_event()  # moves the data version on, so the check runs again
+        response = self.client.get('/api/protest-events/', {'since': token})
+        self.assertEqual(response.status_code, 503)
+
+    def test_pruned_token_needs_full_reload(self):
+        self.create_event()
+        token = self.client.get('/api/protest-events/')['X-Sync-Token']
+        self.create_event(lon=36.9)
+        self.assertEqual(prune_change_log(timezone.now() + timedelta(minutes=1)), 2)
+
+        response = self.client.get('/api/protest-events/', {'since': token})
+        self.assertEqual(response.status_code, 410)
+
+
+@skipIf(WebsocketCommunicator is None, 'Channels is not installed')
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class LoadTestCommandTests(GisTablesMixin, LiveServerTestCase):
+    """
+    One user, one visit against the live test server, with trending-hashtags scraping
+    the command's local stub instead of third-party sites
+    """
+
+    def setUp(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.stub_port = probe.getsockname()[1]
+        sources = override_settings(PROTEST_TRENDING_SOURCES=[f'http://127.0.0.1:{self.stub_port}/kenya/'])
+        sources.enable()
+        self.addCleanup(sources.disable)
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def test_one_visit_requests_every_endpoint_once(self):
+        output = os.path.join(self.output_dir, 'load.json')
+        call_command(
+            'load_test', url=self.live_server_url, users=1, visits=1, duration=60, think_time=0,
+            stub_port=self.stub_port, output=output, stdout=StringIO(),
+        )
+
+        with open(output) as f:
+            results = json.load(f)['results']
+        self.assertEqual(results['visit']['count'], 1)
+        for chain in VISIT:
+            for name, _ in chain:
+                self.assertEqual(results[name]['count'] + results[name]['errors'], 1, name)
+        self.assertEqual(results['trending-hashtags']['count'], 1, results['trending-hashtags']['error_kinds'])
+
+    def test_users_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            call_command('load_test', url=self.live_server_url, users=0, no_stub=True, stdout=StringIO())
+
+
+class ProtestEventsConsumerTests(GisTablesTestCase):
+
+    def save_event(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.create_event(fatalities=2)
+
+    async def test_save_pushes_feature_and_data_version(self):
+        from .consumers import ProtestEventsConsumer
+
+        communicator = WebsocketCommunicator(ProtestEventsConsumer.as_asgi(), '/ws/protest-events/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        hello = json.loads(await communicator.receive_from())
+        self.assertEqual(hello['type'], 'versions')
+
+        event = await database_sync_to_async(self.save_event)()
+        version = await database_sync_to_async(get_data_version)(ProtestEvents)
+
+        upsert = json.loads(await communicator.receive_from())
+        self.assertEqual((upsert['type'], upsert['action']), ('events', 'upsert'))
+        self.assertEqual([feature['id'] for feature in upsert['features']], [event.gid])
+        self.assertEqual(upsert['features'][0]['properties']['fatalities'], 2)
+        self.assertEqual(upsert['data_version'], version)
+
+        versions = json.loads(await communicator.receive_from())
+        self.assertEqual(versions['type'], 'versions')
+        self.assertEqual(versions['versions'][ProtestEvents._meta.db_table], version)
+        self.assertNotEqual(version, hello['versions'][ProtestEvents._meta.db_table])
+        await communicator.disconnect()
@@ -0,0 +1,212 @@
+# protest/triggers.py
+"""
+Database triggers on the GIS tables:
+
+- every tracked table bumps its row in protest_data_version on any insert, update,
+  delete or truncate, however the write is made (ORM, queryset update(), bulk_create,
+  psql, ogr2ogr), so cached results keyed by data version never outlive the data
+- protest_events also logs each changed gid in protest_event_change for delta sync
+
+The GIS tables are unmanaged: they are loaded with ogr2ogr/shp2pgsql or created by
+synthetic.ensure_tables, often after the migrations have run, so the triggers cannot
+live in a migration alone. Migrations 0005/0006 apply a frozen copy of this SQL to the
+tables that exist then; install_triggers() is idempotent and runs wherever the tables
+are created later (synthetic.ensure_tables, ingest_protest_events, manage.py
+install_triggers). The delta sync checks triggers_installed() (cached per process,
+see cached_triggers_installed) and refuses to answer without them rather than report an empty delta, and `manage.py check --database
+default` warns about tables that are missing theirs.
+
+Cost: every write statement on a tracked table updates that table's single
+protest_data_version row, and the row lock is held until commit. Concurrent
+transactions writing the same table therefore commit one after another. That suits
+these tables, which are loaded in bulk by one writer at a time; a workload with many
+concurrent small writers would need the bump moved out of the writing transaction.
+"""
+import time
+
+from django.core.checks import Warning as CheckWarning
+from django.db import connections
+
+EVENTS_TABLE = 'protest_events'
+
+# How long a process trusts its last triggers_installed() answer for the same data version
+TRIGGER_CHECK_SECONDS = 60
+
+# versioning.TRACKED_MODELS' tables, listed here because versioning imports the models
+VERSIONED_TABLES = ('nairobi', 'roads', 'policestn', EVENTS_TABLE, 'hospitals', 'merged_wards')
+
+# Statement-level triggers with transition tables handle a bulk insert of N rows with one
+# statement rather than N trigger calls, and let a statement that touched no rows skip the
+# version bump. TRUNCATE has no transition table, so on protest_events it moves the
+# change-log horizon instead: every earlier sync token then needs a full reload.
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION protest_bump_data_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF NOT EXISTS (SELECT 1 FROM old_rows) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF TG_OP <> 'TRUNCATE' THEN
+        IF NOT EXISTS (SELECT 1 FROM new_rows) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    INSERT INTO protest_data_version (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now())
+    ON CONFLICT (table_name) DO UPDATE SET
+        version = protest_data_version.version + 1,
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION protest_event_log_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO protest_event_change (gid, deleted, txid, changed_at)
+        SELECT gid, true, pg_current_xact_id()::text::bigint, now() FROM old_rows;
+    ELSE
+        INSERT INTO protest_event_change (gid, deleted, txid, changed_at)
+        SELECT gid, false, pg_current_xact_id()::text::bigint, now() FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION protest_event_log_truncate() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO protest_change_log_horizon (table_name, txid, changed_at)
+    VALUES (TG_TABLE_NAME, pg_current_xact_id()::text::bigint, now())
+    ON CONFLICT (table_name) DO UPDATE SET
+        txid = GREATEST(protest_change_log_horizon.txid, EXCLUDED.txid),
+        changed_at = GREATEST(protest_change_log_horizon.changed_at, EXCLUDED.changed_at);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# (event, clause) of the version triggers on each versioned table
+VERSION_EVENTS = (
+    ('INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('UPDATE', 'REFERENCING NEW TABLE AS new_rows'),
+    ('DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+    ('TRUNCATE', ''),
+)
+
+# (trigger name, event, clause, function) of the change-log triggers on protest_events
+CHANGE_LOG_TRIGGERS = (
+    ('protest_events_log_insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows', 'protest_event_log_change'),
+    ('protest_events_log_update', 'UPDATE', 'REFERENCING NEW TABLE AS new_rows', 'protest_event_log_change'),
+    ('protest_events_log_delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows', 'protest_event_log_change'),
+    ('protest_events_log_truncate', 'TRUNCATE', '', 'protest_event_log_truncate'),
+)
+
+
+def table_triggers(table):
+    """
+    (trigger name, event, clause, function) of every trigger that belongs on `table`
+    """
+    triggers = [
+        (f'{table}_bump_version_{event.lower()}', event, clause, 'protest_bump_data_version')
+        for event, clause in VERSION_EVENTS
+    ]
+    if table == EVENTS_TABLE:
+        triggers.extend(CHANGE_LOG_TRIGGERS)
+    return triggers
+
+
+def existing_tables(cursor):
+    cursor.execute(
+        'SELECT t FROM unnest(%s) AS t WHERE to_regclass(t) IS NOT NULL', [list(VERSIONED_TABLES)]
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def install_triggers(connection):
+    """
+    (Re)create the trigger functions, and the triggers on those of VERSIONED_TABLES that
+    exist. Returns the tables that now have their triggers.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(FUNCTIONS)
+        tables = [table for table in VERSIONED_TABLES if table in existing_tables(cursor)]
+        for table in tables:
+            for name, event, clause, function in table_triggers(table):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name} ON {table}')
+                cursor.execute(
+                    f'CREATE TRIGGER {name} AFTER {event} ON {table} {clause} '
+                    f'FOR EACH STATEMENT EXECUTE FUNCTION {function}()'
+                )
+    _trigger_checks.pop(connection.alias, None)
+    return tables
+
+
+def missing_triggers(connection, tables=VERSIONED_TABLES):
+    """
+    {table: [trigger names]} for those of `tables` that exist but lack enabled triggers
+    """
+    if connection.vendor != 'postgresql':
+        return {}
+    missing = {}
+    with connection.cursor() as cursor:
+        existing = existing_tables(cursor)
+        for table in [table for table in tables if table in existing]:
+            names = [name for name, *_ in table_triggers(table)]
+            cursor.execute(
+                "SELECT tgname FROM pg_trigger WHERE tgrelid = to_regclass(%s) "
+                "AND tgname = ANY(%s) AND tgenabled <> 'D'",
+                [table, names],
+            )
+            present = {row[0] for row in cursor.fetchall()}
+            if len(present) < len(names):
+                missing[table] = [name for name in names if name not in present]
+    return missing
+
+
+def triggers_installed(connection):
+    """
+    True if protest_events exists with its change-log and version triggers enabled
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        if EVENTS_TABLE not in existing_tables(cursor):
+            return False
+    return not missing_triggers(connection, [EVENTS_TABLE])
+
+
+# connection alias -> (key, checked at, installed)
+_trigger_checks = {}
+
+
+def cached_triggers_installed(connection, key):
+    """
+    triggers_installed(), remembered by this process for up to TRIGGER_CHECK_SECONDS
+    while `key` (the caller passes the protest_events data version) stays the same.
+    install_triggers() on the connection forgets the answer.
+    """
+    now = time.monotonic()
+    cached = _trigger_checks.get(connection.alias)
+    if cached is not None and cached[0] == key and now - cached[1] < TRIGGER_CHECK_SECONDS:
+        return cached[2]
+    installed = triggers_installed(connection)
+    _trigger_checks[connection.alias] = (key, now, installed)
+    return installed
+
+
+def check_triggers(app_configs=None, databases=None, **kwargs):
+    """
+    System check (database tag): warn about GIS tables loaded without their triggers
+    """
+    errors = []
+    for alias in databases or ():
+        for table, names in missing_triggers(connections[alias]).items():
+            errors.append(CheckWarning(
+                f"{table} is missing the triggers {', '.join(names)}; its data version will not "
+                f"change on writes" + (' and ?since= deltas are refused' if table == EVENTS_TABLE else ''),
+                hint='Run manage.py install_triggers after loading tables outside Django.',
+                id='protest.W001',
+            ))
+    return errors
@@ -10,7 +10,21 @@ from .views import (
     MergedWardsViewSet,
     trending_hashtags,
     spatial_analysis,
-    ward_statistics
+    ward_statistics,
+    nearest_facility,
+    road_route,
+    coverage_isochrones,
+    protest_police_proximity,
+    coverage_buffers,
+    spatial_metrics,
+    protest_clusters,
+    emerging_hotspots,
+    ward_autocorrelation,
+    protest_hexbins,
+    risk_forecast,
+    risk_cube,
+    search,
+    metrics
 )
 
 router = DefaultRouter()
@@ -29,4 +43,18 @@ urlpatterns = [
     path('trending-hashtags/', trending_hashtags, name='trending-hashtags'),
     path('spatial-analysis/', spatial_analysis, name='spatial-analysis'),
     path('ward-statistics/', ward_statistics, name='ward-statistics'),
+    path('nearest/', nearest_facility, name='nearest-facility'),
+    path('route/', road_route, name='road-route'),
+    path('isochrones/', coverage_isochrones, name='coverage-isochrones'),
+    path('proximity/', protest_police_proximity, name='protest-police-proximity'),
+    path('coverage-buffers/', coverage_buffers, name='coverage-buffers'),
+    path('spatial-metrics/', spatial_metrics, name='spatial-metrics'),
+    path('protest-clusters/', protest_clusters, name='protest-clusters'),
+    path('emerging-hotspots/', emerging_hotspots, name='emerging-hotspots'),
+    path('ward-autocorrelation/', ward_autocorrelation, name='ward-autocorrelation'),
+    path('protest-hexbins/', protest_hexbins, name='protest-hexbins'),
+    path('risk-forecast/', risk_forecast, name='risk-forecast'),
+    path('risk-cube/', risk_cube, name='risk-cube'),
+    path('search/', search, name='search'),
+    path('_metrics', metrics, name='metrics'),
 ]
@@ -0,0 +1,48 @@
+# protest/versioning.py
+"""
+Data versions for the GIS tables, used to key caches of derived results.
+Database triggers bump a table's version on every write (protest/triggers.py).
+"""
+from django.core.cache import caches
+from django.db.models import F
+
+from .models import Nairobi, NairobiRoads, PoliceStn, ProtestEvents, NairobiHospitals, MergedWards, DataVersion
+
+
+TRACKED_MODELS = (Nairobi, NairobiRoads, PoliceStn, ProtestEvents, NairobiHospitals, MergedWards)
+
+
+def get_data_version(*models):
+    """
+    Return a filename-safe token such as 'roads.3' or 'hospitals.1-policestn.4'
+    """
+    tables = [model._meta.db_table for model in models]
+    versions = dict(
+        DataVersion.objects.filter(table_name__in=tables).values_list('table_name', 'version')
+    )
+    return '-'.join(f"{table}.{versions.get(table, 0)}" for table in tables)
+
+
+def bump_data_version(*models):
+    """
+    Increment the version of each model's table so cached results are recomputed
+    """
+    for model in models:
+        table = model._meta.db_table
+        DataVersion.objects.get_or_create(table_name=table)
+        DataVersion.objects.filter(table_name=table).update(version=F('version') + 1)
+
+
+def versioned_cache_get_or_set(name, models, compute, *key_parts):
+    """
+    Return (value, version) for a result derived from the given models' tables.
+    The value is computed once per data version and shared through the 'analysis' cache.
+    """
+    version = get_data_version(*models)
+    key = ':'.join([name, *(str(part) for part in key_parts), version])
+    cache = caches['analysis']
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value, version
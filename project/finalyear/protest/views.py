@@ -3,25 +3,15 @@ os.environ['PROJ_LIB'] = r"C:\OSGeo4W\share\proj"
 os.environ['GDAL_DATA'] = r"C:\OSGeo4W\share\gdal"
 
 import json
-import re
-from datetime import datetime
-
-import numpy as np
-from scipy import stats
-from scipy.spatial.distance import cdist
-from sklearn.neighbors import KernelDensity
-
-import requests
-from bs4 import BeautifulSoup
+import math
+from datetime import date, datetime
 
 from rest_framework import viewsets
 from rest_framework_gis.pagination import GeoJsonPagination
 from rest_framework_gis.filters import InBBoxFilter
 from rest_framework.response import Response
 
-from django.contrib.gis.geos import GEOSGeometry, Point
-from django.contrib.gis.measure import Distance
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
@@ -34,14 +24,39 @@ from .serializers import (
     NairobiHospitalsSerializer,
     MergedWardsSerializer
 )
+from .encoders import dumps, protest_event_rows, encode_feature, encode_feature_collection
+from .facilities import FACILITY_MODELS, nearest_facilities
+from .coverage import get_coverage
+from .sync import SinceExpired, change_log_installed, changes_since, current_sync_token, parse_since, snapshot_token
+from .metrics import metrics_access_allowed, metrics_enabled, render_metrics, span
 
+# NumPy/SciPy/scikit-learn and the scraping libraries are imported inside the views that
+# use them (through .analysis, .scraping and the other analysis modules), so a process
+# serving only the GeoJSON layers never loads them; protest.warmup preloads them on demand.
 
 
 class GeoJsonPaginationClass(GeoJsonPagination):
     page_size = 100  
 
 
-class GeoBaseViewSet(viewsets.ReadOnlyModelViewSet):
+class TimedListMixin:
+    """
+    ListModelMixin.list with the rows fetched first, so the 'serialize' span measures
+    the serializer alone rather than the SQL it would otherwise trigger lazily
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objects = list(page if page is not None else queryset)
+        with span('serialize'):
+            data = self.get_serializer(objects, many=True).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class GeoBaseViewSet(TimedListMixin, viewsets.ReadOnlyModelViewSet):
     pagination_class = GeoJsonPaginationClass
     filter_backends = [InBBoxFilter]
     bbox_filter_field = 'geom' 
@@ -52,7 +67,7 @@ class NairobiViewSet(GeoBaseViewSet):
     queryset = Nairobi.objects.all()
     serializer_class = NairobiSerializer
 
-class NairobiRoadsViewSet(viewsets.ReadOnlyModelViewSet):
+class NairobiRoadsViewSet(TimedListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = NairobiRoads.objects.all()
     serializer_class = NairobiRoadsSerializer
     pagination_class = None  # disable pagination
@@ -67,6 +82,126 @@ class ProtestEventsViewSet(GeoBaseViewSet):
     queryset = ProtestEvents.objects.all()
     serializer_class = ProtestEventsSerializer
 
+    def list(self, request, *args, **kwargs):
+        """
+        Encode JSON list responses straight from values_list() tuples.
+        Other renderers (e.g. the browsable API) go through the serializer.
+        ?cluster=true&zoom=<z> returns clusters up to MAX_CLUSTER_ZOOM and raw points above it.
+        ?since=<sync token or ISO timestamp> returns only the changes since then (see delta_list).
+        Full responses (the first page, when paginated) carry an X-Sync-Token header to pass
+        as `since` next time.
+        """
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        since = request.query_params.get('since')
+        if since:
+            return self.delta_list(since)
+
+        if request.query_params.get('cluster', 'false').lower() == 'true':
+            response = self.clustered_list(request)
+            if response is not None:
+                return response
+
+        # Clients sync from the token of the first page of a full load
+        first_page = request.query_params.get(self.paginator.page_query_param, '1') == '1'
+        sync_token = current_sync_token() if first_page else None
+        rows = protest_event_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is None:
+            rows = list(rows)
+            with span('serialize'):
+                content = encode_feature_collection(rows)
+        else:
+            with span('serialize'):
+                content = encode_feature_collection(
+                    page,
+                    count=self.paginator.page.paginator.count,
+                    next_link=self.paginator.get_next_link(),
+                    previous_link=self.paginator.get_previous_link(),
+                    paginated=True,
+                )
+        response = HttpResponse(content, content_type='application/json')
+        if sync_token is not None:
+            response['X-Sync-Token'] = sync_token
+        return response
+
+    def delta_list(self, since):
+        """
+        Features inserted or updated since the token/timestamp, the gids deleted since then
+        and a new sync_token. Filters and pagination do not apply; the delta covers the layer.
+        """
+        try:
+            token, moment = parse_since(since)
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+
+        # Without the triggers the log silently misses every change; say so instead
+        if not change_log_installed():
+            return JsonResponse({
+                'success': False,
+                'error': 'The protest_events change log is not installed; run manage.py install_triggers'
+            }, status=503)
+
+        sync_token = snapshot_token()
+        try:
+            upserted, deleted = changes_since(token, moment)
+        except SinceExpired as e:
+            # The client reloads the whole layer and syncs from its X-Sync-Token
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=410)
+        rows = list(protest_event_rows(ProtestEvents.objects.filter(gid__in=upserted).order_by('gid')))
+        # Rows logged as changed but gone by now were deleted after the log was read
+        missing = set(upserted) - {row[0] for row in rows}
+        deleted = sorted(set(deleted) | missing)
+
+        with span('serialize'):
+            features = b','.join(encode_feature(row) for row in rows)
+        return HttpResponse(
+            b'{"type":"FeatureCollection","since":%s,"sync_token":%s,"deleted":%s,"features":[%s]}' % (
+                dumps(since), dumps(sync_token), dumps(deleted), features
+            ),
+            content_type='application/json',
+        )
+
+    def clustered_list(self, request):
+        """
+        Clusters in in_bbox from the cached cluster index, or None past MAX_CLUSTER_ZOOM
+        so the caller falls back to individual points
+        """
+        from .point_clusters import MAX_CLUSTER_ZOOM, get_point_cluster_index
+
+        try:
+            zoom = float(request.query_params.get('zoom', 0))
+            if not math.isfinite(zoom):
+                raise ValueError('zoom must be a finite number')
+            zoom = max(int(zoom), 0)
+            bbox = request.query_params.get('in_bbox')
+            bbox = tuple(float(value) for value in bbox.split(',')) if bbox else None
+            if bbox is not None and len(bbox) != 4:
+                raise ValueError('in_bbox needs west,south,east,north')
+            if bbox is not None and not all(math.isfinite(value) for value in bbox):
+                raise ValueError('in_bbox values must be finite numbers')
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Invalid query: {e}'
+            }, status=400)
+
+        if zoom > MAX_CLUSTER_ZOOM:
+            return None
+        features = get_point_cluster_index().features(zoom, bbox)
+        return HttpResponse(dumps({
+            'type': 'FeatureCollection',
+            'zoom': zoom,
+            'features': features
+        }), content_type='application/json')
+
 class HospitalViewSet(GeoBaseViewSet):
     """
     API endpoint that allows hospital data to be viewed as GeoJSON.
@@ -141,6 +276,13 @@ def trending_hashtags(request):
     """
     Get trending X (Twitter) hashtags for Kenya using web scraping and curated sources
     """
+    from .scraping import (
+        get_curated_kenya_hashtags,
+        get_emergency_fallback_hashtags,
+        get_kenya_news_hashtags,
+        scrape_trending_hashtags
+    )
+
     try:
         hashtags = []
         
@@ -194,166 +336,6 @@ def trending_hashtags(request):
             'source': 'emergency_fallback'
         }, status=200)
 
-def scrape_trending_hashtags():
-    """
-    Scrape trending hashtags from various trending sites
-    """
-    hashtags = []
-    
-    try:
-        # Scrape from trending hashtag sites
-        urls = [
-            'https://trendinalia.com/twitter-trending-topics/kenya.html',
-            'https://getdaytrends.com/kenya/',
-        ]
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        
-        for url in urls:
-            try:
-                response = requests.get(url, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Look for common hashtag patterns
-                    hashtag_elements = soup.find_all(['a', 'span', 'div'], string=re.compile(r'#\w+'))
-                    
-                    for element in hashtag_elements[:10]:
-                        text = element.get_text().strip()
-                        if text.startswith('#') and len(text) > 2:
-                            hashtags.append({
-                                'tag': text,
-                                'original_term': text[1:],  # Remove #
-                                'interest_score': 80 + len(hashtags) * 2,
-                                'trend': 'up',
-                                'risk': assess_risk_level(text),
-                                'source': 'scraped'
-                            })
-                            
-            except Exception:
-                continue
-                
-    except Exception:
-        pass
-    
-    return hashtags
-
-def get_kenya_news_hashtags():
-    """
-    Extract trending topics from Kenyan news sources
-    """
-    hashtags = []
-    
-    try:
-        # Common news keywords that could be trending
-        news_keywords = [
-            'Kenya', 'Nairobi', 'Ruto', 'Parliament', 'Elections', 'Politics',
-            'County', 'Governor', 'Senate', 'Assembly', 'Court', 'Police',
-            'University', 'Students', 'Youth', 'Economy', 'Budget', 'Tax'
-        ]
-        
-        for keyword in news_keywords:
-            hashtag = f"#{keyword.replace(' ', '')}"
-            
-            # Simulate relevance based on current events importance
-            base_score = 60
-            if keyword.lower() in ['ruto', 'parliament', 'elections', 'kenya']:
-                base_score = 90
-            elif keyword.lower() in ['nairobi', 'politics', 'youth', 'university']:
-                base_score = 75
-            
-            hashtags.append({
-                'tag': hashtag,
-                'original_term': keyword,
-                'interest_score': base_score + (hash(keyword) % 20),
-                'trend': get_trend_direction(len(hashtags)),
-                'risk': assess_risk_level(keyword),
-                'source': 'news_derived'
-            })
-            
-    except Exception:
-        pass
-    
-    return hashtags
-
-def get_curated_kenya_hashtags():
-    """
-    Get curated trending hashtags based on current Kenya events and politics
-    """
-    current_hashtags = [
-        {'tag': '#KenyaKwanza', 'term': 'Kenya Kwanza', 'score': 95, 'risk': 'high'},
-        {'tag': '#RutoAdministration', 'term': 'Ruto Administration', 'score': 90, 'risk': 'medium'},
-        {'tag': '#KenyaParliament', 'term': 'Kenya Parliament', 'score': 85, 'risk': 'medium'},
-        {'tag': '#NairobiCounty', 'term': 'Nairobi County', 'score': 80, 'risk': 'low'},
-        {'tag': '#KenyaYouth', 'term': 'Kenya Youth', 'score': 78, 'risk': 'medium'},
-        {'tag': '#KenyaPolitics', 'term': 'Kenya Politics', 'score': 88, 'risk': 'high'},
-        {'tag': '#KenyaNews', 'term': 'Kenya News', 'score': 75, 'risk': 'low'},
-        {'tag': '#KenyaElections', 'term': 'Kenya Elections', 'score': 82, 'risk': 'high'},
-        {'tag': '#KenyaEconomy', 'term': 'Kenya Economy', 'score': 70, 'risk': 'medium'},
-        {'tag': '#NairobiTraffic', 'term': 'Nairobi Traffic', 'score': 65, 'risk': 'low'},
-        {'tag': '#KenyaUniversities', 'term': 'Kenya Universities', 'score': 68, 'risk': 'medium'},
-        {'tag': '#KenyaSecurity', 'term': 'Kenya Security', 'score': 72, 'risk': 'high'},
-    ]
-    
-    hashtags = []
-    for item in current_hashtags:
-        trend_direction = 'up' if item['score'] > 80 else 'stable' if item['score'] > 70 else 'down'
-        
-        hashtags.append({
-            'tag': item['tag'],
-            'original_term': item['term'],
-            'interest_score': item['score'],
-            'trend': trend_direction,
-            'risk': item['risk'],
-            'source': 'curated'
-        })
-    
-    return hashtags
-
-def get_emergency_fallback_hashtags():
-    """
-    Emergency fallback hashtags when all methods fail
-    """
-    return [
-        {'tag': '#Kenya', 'original_term': 'Kenya', 'interest_score': 95, 'trend': 'up', 'risk': 'low', 'position': 1},
-        {'tag': '#Nairobi', 'original_term': 'Nairobi', 'interest_score': 90, 'trend': 'stable', 'risk': 'low', 'position': 2},
-        {'tag': '#KenyaPolitics', 'original_term': 'Kenya Politics', 'interest_score': 85, 'trend': 'up', 'risk': 'high', 'position': 3},
-        {'tag': '#Ruto', 'original_term': 'Ruto', 'interest_score': 80, 'trend': 'stable', 'risk': 'medium', 'position': 4},
-        {'tag': '#KenyaNews', 'original_term': 'Kenya News', 'interest_score': 75, 'trend': 'up', 'risk': 'low', 'position': 5},
-    ]
-
-def assess_risk_level(hashtag):
-    """
-    Assess risk level based on hashtag content
-    """
-    high_risk_keywords = ['protest', 'violence', 'riot', 'strike', 'clash', 'emergency']
-    medium_risk_keywords = ['politics', 'government', 'police', 'traffic', 'council']
-    
-    hashtag_lower = hashtag.lower()
-    
-    for keyword in high_risk_keywords:
-        if keyword in hashtag_lower:
-            return 'high'
-    
-    for keyword in medium_risk_keywords:
-        if keyword in hashtag_lower:
-            return 'medium'
-    
-    return 'low'
-
-def get_trend_direction(position):
-    """
-    Simulate trend direction based on position
-    """
-    if position < 3:
-        return 'up'
-    elif position < 8:
-        return 'stable' if position % 2 == 0 else 'up'
-    else:
-        return 'down' if position % 3 == 0 else 'stable'
-
 
 # Spatial Analysis Functionality
 @csrf_exempt
@@ -362,23 +344,32 @@ def spatial_analysis(request):
     """
     Perform spatial analysis including KDE and correlation analysis
     """
+    from .analysis import perform_correlation_analysis, perform_kde_analysis, snapshot_coordinates
+    from .bandwidth import BANDWIDTH_METHODS, get_kde_bandwidth
+    from .snapshot import get_event_snapshot, get_police_snapshot
+
     # Get parameters from query string
     metric = request.GET.get('metric', 'poverty_rate')
     include_kde = request.GET.get('include_kde', 'false').lower() == 'true'
+    bandwidth_method = request.GET.get('bandwidth_method', 'scott')
+    if bandwidth_method not in BANDWIDTH_METHODS:
+        return JsonResponse({
+            'success': False,
+            'error': f"bandwidth_method must be one of {', '.join(BANDWIDTH_METHODS)}"
+        }, status=400)
     
     try:
-        # Get protest events and police stations
-        protests = ProtestEvents.objects.all()
-        police_stations = PoliceStn.objects.all()
-        
-        # Extract coordinates
-        protest_coords = np.array([[p.geom.x, p.geom.y] for p in protests if p.geom])
-        police_coords = np.array([[ps.geom.x, ps.geom.y] for ps in police_stations if ps.geom])
+        # Get protest event and police station coordinates
+        protests = get_event_snapshot()
+        police_stations = get_police_snapshot()
+        protest_coords = snapshot_coordinates(protests)
+        police_coords = snapshot_coordinates(police_stations)
         
         # Perform KDE analysis
         kde_results = None
         if include_kde and len(protest_coords) > 0:
-            kde_results = perform_kde_analysis(protest_coords, police_coords)
+            bandwidth, _ = get_kde_bandwidth(bandwidth_method)
+            kde_results = perform_kde_analysis(protest_coords, police_coords, bandwidth=bandwidth)
         
         # Perform correlation analysis
         correlation_results = perform_correlation_analysis(protests, metric)
@@ -399,167 +390,6 @@ def spatial_analysis(request):
             'error': str(e)
         }, status=500)
 
-def perform_kde_analysis(protest_coords, police_coords, grid_size=50):
-    """
-    Perform Kernel Density Estimation on protest events
-    """
-    if len(protest_coords) < 2:
-        return None
-    
-    # Create KDE model
-    kde = KernelDensity(bandwidth=0.01, kernel='gaussian')
-    kde.fit(protest_coords)
-    
-    # Create grid for density estimation
-    x_min, x_max = protest_coords[:, 0].min() - 0.05, protest_coords[:, 0].max() + 0.05
-    y_min, y_max = protest_coords[:, 1].min() - 0.05, protest_coords[:, 1].max() + 0.05
-    
-    xx, yy = np.meshgrid(
-        np.linspace(x_min, x_max, grid_size),
-        np.linspace(y_min, y_max, grid_size)
-    )
-    
-    grid_points = np.c_[xx.ravel(), yy.ravel()]
-    
-    # Calculate density scores
-    log_density = kde.score_samples(grid_points)
-    density = np.exp(log_density).reshape(xx.shape)
-    
-    # Calculate police station proximity weights
-    proximity_weights = calculate_police_proximity_weights(grid_points, police_coords)
-    proximity_weights = proximity_weights.reshape(xx.shape)
-    
-    # Calculate weighted risk surface
-    risk_surface = density * (1 / (proximity_weights + 0.1))  # Higher risk when police are far
-    
-    # Prepare data for frontend
-    kde_data = {
-        'density_grid': density.tolist(),
-        'risk_surface': risk_surface.tolist(),
-        'proximity_weights': proximity_weights.tolist(),
-        'grid_bounds': {
-            'x_min': x_min, 'x_max': x_max,
-            'y_min': y_min, 'y_max': y_max
-        },
-        'grid_size': grid_size,
-        'hotspots': identify_hotspots(xx, yy, risk_surface)
-    }
-    
-    return kde_data
-
-def calculate_police_proximity_weights(grid_points, police_coords):
-    """
-    Calculate proximity weights based on distance to nearest police station
-    """
-    if len(police_coords) == 0:
-        return np.ones(len(grid_points))
-    
-    # Calculate distance to nearest police station for each grid point
-    distances = cdist(grid_points, police_coords)
-    min_distances = np.min(distances, axis=1)
-    
-    # Convert to weights (closer = higher weight)
-    max_distance = np.max(min_distances)
-    weights = 1 - (min_distances / max_distance)
-    
-    return weights
-
-def identify_hotspots(xx, yy, risk_surface, threshold_percentile=90):
-    """
-    Identify high-risk hotspots
-    """
-    threshold = np.percentile(risk_surface, threshold_percentile)
-    hotspot_indices = np.where(risk_surface >= threshold)
-    
-    hotspots = []
-    for i, j in zip(hotspot_indices[0], hotspot_indices[1]):
-        hotspots.append({
-            'longitude': xx[i, j],
-            'latitude': yy[i, j],
-            'risk_score': float(risk_surface[i, j]),
-            'intensity': float(risk_surface[i, j] / np.max(risk_surface))
-        })
-    
-    return hotspots
-
-def perform_correlation_analysis(protests, metric):
-    """
-    Perform correlation analysis between protest intensity and socioeconomic factors using real ward data
-    """
-    correlation_data = []
-    
-    # Group protests by ward/region and calculate intensity
-    protest_intensity = []
-    socioeconomic_values = []
-    
-    # Get all wards with socioeconomic data
-    wards = MergedWards.objects.filter(geom__isnull=False)
-    
-    for ward in wards[:30]:  # Limit for performance
-        if ward.geom:
-            # Calculate protest intensity for this ward
-            ward_center = ward.geom.centroid
-            intensity = calculate_protest_intensity_for_location(
-                ward_center.y, ward_center.x, protests, radius_km=5
-            )
-            
-            # Get socioeconomic value based on metric
-            socio_value = None
-            if metric == 'poverty_rate' and ward.poverty_ra:
-                socio_value = ward.poverty_ra
-            elif metric == 'youth_unemployment' and ward.youth_unem:
-                socio_value = ward.youth_unem
-            elif metric == 'population_density' and ward.pop_densit:
-                socio_value = ward.pop_densit
-            elif metric == 'education_level' and ward.avg_educat:
-                socio_value = ward.avg_educat
-            elif metric == 'slum_housing' and ward.slum_house:
-                socio_value = ward.slum_house
-            elif metric == 'protest_density' and ward.protest_de is not None:
-                socio_value = ward.protest_de
-            
-            if socio_value is not None and intensity >= 0:
-                protest_intensity.append(intensity)
-                socioeconomic_values.append(socio_value)
-                
-                correlation_data.append({
-                    'protest_intensity': intensity,
-                    'socioeconomic_value': socio_value,
-                    'ward': ward.full_location,
-                    'ward_id': ward.gid,
-                    'risk_assessment': ward.risk_assessment
-                })
-    
-    # Calculate correlation
-    if len(protest_intensity) > 1:
-        correlation, p_value = stats.pearsonr(protest_intensity, socioeconomic_values)
-    else:
-        correlation, p_value = 0, 1
-    
-    return {
-        'correlation': float(correlation) if not np.isnan(correlation) else 0,
-        'p_value': float(p_value) if not np.isnan(p_value) else 1,
-        'data': correlation_data,
-        'sample_size': len(correlation_data)
-    }
-
-def calculate_protest_intensity_for_location(lat, lon, all_protests, radius_km=2):
-    """
-    Calculate protest intensity within radius of a location
-    """
-    center = Point(lon, lat)
-    nearby_protests = 0
-    
-    for protest in all_protests:
-        if protest.geom:
-            protest_point = Point(protest.geom.x, protest.geom.y)
-            distance = center.distance(protest_point) * 111  # Convert to km approximately
-            
-            if distance <= radius_km:
-                nearby_protests += 1
-    
-    return nearby_protests
-
 
 # Ward Statistics Endpoint
 @csrf_exempt
@@ -567,12 +397,15 @@ def ward_statistics(request):
     """
     Get statistical summary of ward socioeconomic data
     """
+    from .analysis import calculate_field_stats, get_protest_density_distribution, get_risk_distribution
+    from .snapshot import get_ward_snapshot
+
     try:
-        wards = MergedWards.objects.filter(geom__isnull=False)
+        wards = get_ward_snapshot()
         
         # Calculate statistics
         stats_data = {
-            'total_wards': wards.count(),
+            'total_wards': len(wards['gids']),
             'poverty_stats': calculate_field_stats(wards, 'poverty_ra'),
             'unemployment_stats': calculate_field_stats(wards, 'youth_unem'),
             'population_stats': calculate_field_stats(wards, 'pop_densit'),
@@ -595,46 +428,674 @@ def ward_statistics(request):
             'error': str(e)
         }, status=500)
 
-def calculate_field_stats(wards, field_name):
+
+# Nearest Facility Endpoint
+MAX_NEAREST_K = 50
+MAX_NEAREST_BATCH = 1000
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def nearest_facility(request):
     """
-    Calculate statistics for a specific field
+    Rank the k nearest hospitals or police stations by geodesic distance.
+    GET ?lat=&lon=&type=hospital|police&k= for one point, or POST
+    {"type": ..., "k": ..., "points": [{"lat": ..., "lon": ...}, ...]} for a batch.
     """
-    values = [getattr(ward, field_name) for ward in wards if getattr(ward, field_name) is not None]
-    
-    if not values:
-        return None
-    
-    return {
-        'mean': np.mean(values),
-        'median': np.median(values),
-        'std': np.std(values),
-        'min': np.min(values),
-        'max': np.max(values),
-        'count': len(values)
-    }
+    try:
+        if request.method == 'POST':
+            payload = json.loads(request.body or b'{}')
+            if not isinstance(payload, dict):
+                raise TypeError('the request body must be a JSON object')
+            facility_type = payload.get('type', 'hospital')
+            k = int(payload.get('k', 5))
+            points = [(float(p['lon']), float(p['lat'])) for p in payload.get('points', [])]
+        else:
+            facility_type = request.GET.get('type', 'hospital')
+            k = int(request.GET.get('k', 5))
+            points = [(float(request.GET['lon']), float(request.GET['lat']))]
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid query: {e}'
+        }, status=400)
+
+    if facility_type not in FACILITY_MODELS:
+        return JsonResponse({
+            'success': False,
+            'error': f"type must be one of {', '.join(FACILITY_MODELS)}"
+        }, status=400)
+    if not points or len(points) > MAX_NEAREST_BATCH:
+        return JsonResponse({
+            'success': False,
+            'error': f'Provide between 1 and {MAX_NEAREST_BATCH} points'
+        }, status=400)
+    k = max(1, min(k, MAX_NEAREST_K))
+
+    try:
+        ranked = nearest_facilities(points, facility_type, k)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    results = [
+        {'query': {'lat': lat, 'lon': lon}, 'facilities': facilities}
+        for (lon, lat), facilities in zip(points, ranked)
+    ]
+    if request.method == 'GET':
+        return JsonResponse({
+            'success': True,
+            'type': facility_type,
+            'k': k,
+            **results[0]
+        })
+    return JsonResponse({
+        'success': True,
+        'type': facility_type,
+        'k': k,
+        'results': results
+    })
 
-def get_risk_distribution(wards):
+
+# Road Network Routing Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def road_route(request):
     """
-    Get distribution of risk levels across wards
+    Fastest route over the roads network between two points, computed in-process
     """
-    risk_counts = {'Low Risk': 0, 'Medium Risk': 0, 'High Risk': 0, 'Critical Risk': 0, 'Unknown': 0}
-    
-    for ward in wards:
-        risk_level = ward.risk_assessment
-        if risk_level in risk_counts:
-            risk_counts[risk_level] += 1
-    
-    return risk_counts
+    from .routing import get_road_graph
+
+    try:
+        from_lat = float(request.GET['from_lat'])
+        from_lon = float(request.GET['from_lon'])
+        to_lat = float(request.GET['to_lat'])
+        to_lon = float(request.GET['to_lon'])
+    except (KeyError, ValueError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'from_lat, from_lon, to_lat and to_lon are required numbers ({e})'
+        }, status=400)
+
+    try:
+        graph = get_road_graph()
+        route = graph.route(from_lon, from_lat, to_lon, to_lat)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    if route is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'No route found between the given points'
+        }, status=404)
+
+    return JsonResponse({
+        'success': True,
+        'route': route,
+        'graph_version': graph.version
+    })
+
 
-def get_protest_density_distribution(wards):
+# Coverage Isochrones Endpoint
+MAX_ISOCHRONE_MINUTES = 60
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def coverage_isochrones(request):
     """
-    Get distribution of protest density levels across wards
+    Travel-time coverage polygons for police stations or hospitals.
+    ?type=police|hospital&minutes=5,10,15&scope=all|facility|both
     """
-    protest_counts = {'None': 0, 'Low': 0, 'Medium': 0, 'High': 0, 'Very High': 0, 'No Data': 0}
-    
-    for ward in wards:
-        protest_level = ward.protest_density_level
-        if protest_level in protest_counts:
-            protest_counts[protest_level] += 1
-    
-    return protest_counts
+    from .isochrones import ISOCHRONE_MINUTES, get_isochrones
+
+    facility_type = request.GET.get('type', 'police')
+    scope = request.GET.get('scope', 'all')
+    try:
+        minutes_param = request.GET.get('minutes')
+        minutes = sorted({int(m) for m in minutes_param.split(',')}) if minutes_param else list(ISOCHRONE_MINUTES)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'minutes must be a comma-separated list of integers'
+        }, status=400)
+
+    if facility_type not in FACILITY_MODELS:
+        return JsonResponse({
+            'success': False,
+            'error': f"type must be one of {', '.join(FACILITY_MODELS)}"
+        }, status=400)
+    if scope not in ('all', 'facility', 'both'):
+        return JsonResponse({
+            'success': False,
+            'error': 'scope must be all, facility or both'
+        }, status=400)
+    if not minutes or any(m <= 0 or m > MAX_ISOCHRONE_MINUTES for m in minutes):
+        return JsonResponse({
+            'success': False,
+            'error': f'minutes must be between 1 and {MAX_ISOCHRONE_MINUTES}'
+        }, status=400)
+    if len(minutes) > len(ISOCHRONE_MINUTES):
+        return JsonResponse({
+            'success': False,
+            'error': f'at most {len(ISOCHRONE_MINUTES)} distinct minutes values are allowed'
+        }, status=400)
+
+    try:
+        features, version = get_isochrones(facility_type, minutes)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    if scope != 'both':
+        features = [f for f in features if f['properties']['scope'] == scope]
+
+    return JsonResponse({
+        'type': 'FeatureCollection',
+        'facility_type': facility_type,
+        'minutes': minutes,
+        'data_version': version,
+        'features': features
+    })
+
+
+# Protest-Police Proximity Endpoint
+MAX_PROXIMITY_RADIUS_KM = 50
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def protest_police_proximity(request):
+    """
+    For each protest event, the police stations within radius_km and the nearest station.
+    ?radius_km=2&start_date=&end_date=&summary_only=true
+    The queries run before the response starts (errors are a JSON 500); only the encoding
+    is streamed, so large event sets never sit in memory as one document.
+    """
+    from .proximity import proximity_inputs, stream_proximity_json
+
+    try:
+        radius_km = float(request.GET.get('radius_km', 2))
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        start_date = date.fromisoformat(start_date) if start_date else None
+        end_date = date.fromisoformat(end_date) if end_date else None
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid query: {e}'
+        }, status=400)
+
+    if not 0 < radius_km <= MAX_PROXIMITY_RADIUS_KM:
+        return JsonResponse({
+            'success': False,
+            'error': f'radius_km must be between 0 and {MAX_PROXIMITY_RADIUS_KM}'
+        }, status=400)
+
+    try:
+        events, stations = proximity_inputs(start_date, end_date)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    summary_only = request.GET.get('summary_only', 'false').lower() == 'true'
+    return StreamingHttpResponse(
+        stream_proximity_json(radius_km, events, stations, summary_only),
+        content_type='application/json'
+    )
+
+
+# Facility Coverage Buffers Endpoint
+MAX_COVERAGE_RADIUS_KM = 20
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def coverage_buffers(request):
+    """
+    Dissolved geodesic buffers around hospitals or police stations with per-ward coverage.
+    ?type=hospital|police&radius_km=1
+    """
+    facility_type = request.GET.get('type', 'hospital')
+    try:
+        radius_km = float(request.GET.get('radius_km', 1))
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'radius_km must be a number'
+        }, status=400)
+
+    if facility_type not in FACILITY_MODELS:
+        return JsonResponse({
+            'success': False,
+            'error': f"type must be one of {', '.join(FACILITY_MODELS)}"
+        }, status=400)
+    if not 0 < radius_km <= MAX_COVERAGE_RADIUS_KM:
+        return JsonResponse({
+            'success': False,
+            'error': f'radius_km must be between 0 and {MAX_COVERAGE_RADIUS_KM}'
+        }, status=400)
+
+    try:
+        coverage, version = get_coverage(facility_type, round(radius_km, 3))
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'data_version': version,
+        **coverage
+    })
+
+
+# Spatial Metrics Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def spatial_metrics(request):
+    """
+    Precomputed city metrics: area, road length by class, facility densities and distances
+    """
+    from .spatial_metrics import get_spatial_metrics
+
+    try:
+        metrics, version = get_spatial_metrics()
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'data_version': version,
+        'metrics': metrics
+    })
+
+
+# Protest Clustering Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def protest_clusters(request):
+    """
+    Density-based protest clusters with hulls, member counts and fatality totals.
+    ?algorithm=dbscan|hdbscan&eps_km=1.5&min_samples=3&start_date=&end_date=
+    """
+    from .clustering import CLUSTER_ALGORITHMS, get_protest_clusters
+
+    algorithm = request.GET.get('algorithm', 'dbscan')
+    try:
+        eps_km = round(float(request.GET.get('eps_km', 1.5)), 3)
+        min_samples = int(request.GET.get('min_samples', 3))
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        start_date = date.fromisoformat(start_date) if start_date else None
+        end_date = date.fromisoformat(end_date) if end_date else None
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid query: {e}'
+        }, status=400)
+
+    if algorithm not in CLUSTER_ALGORITHMS:
+        return JsonResponse({
+            'success': False,
+            'error': f"algorithm must be one of {', '.join(CLUSTER_ALGORITHMS)}"
+        }, status=400)
+    if not 0 < eps_km <= 50 or min_samples < 1:
+        return JsonResponse({
+            'success': False,
+            'error': 'eps_km must be in (0, 50] and min_samples at least 1'
+        }, status=400)
+
+    try:
+        result, version = get_protest_clusters(algorithm, eps_km, min_samples, start_date, end_date)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'algorithm': algorithm,
+        'eps_km': eps_km,
+        'min_samples': min_samples,
+        'data_version': version,
+        **result
+    })
+
+
+# Emerging Hotspots Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def emerging_hotspots(request):
+    """
+    Space-time Gi* hot spots with Mann-Kendall trends and emerging hot spot categories.
+    ?cell_size_m=1000&time_step=month|week&time_window=1
+    """
+    from .hotspots import MIN_CELL_SIZE_M, TIME_STEPS, CubeTooLarge, get_emerging_hotspots
+
+    time_step = request.GET.get('time_step', 'month')
+    try:
+        cell_size_m = int(request.GET.get('cell_size_m', 1000))
+        time_window = int(request.GET.get('time_window', 1))
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid query: {e}'
+        }, status=400)
+
+    if time_step not in TIME_STEPS:
+        return JsonResponse({
+            'success': False,
+            'error': f"time_step must be one of {', '.join(TIME_STEPS)}"
+        }, status=400)
+    min_cell_size = MIN_CELL_SIZE_M[time_step]
+    if not min_cell_size <= cell_size_m <= 10000 or not 1 <= time_window <= 12:
+        return JsonResponse({
+            'success': False,
+            'error': f'cell_size_m must be between {min_cell_size} and 10000 for time_step={time_step} '
+                     f'and time_window between 1 and 12'
+        }, status=400)
+
+    try:
+        result, version = get_emerging_hotspots(cell_size_m, time_step, time_window)
+    except CubeTooLarge as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'time_step': time_step,
+        'time_window': time_window,
+        'data_version': version,
+        **result
+    })
+
+
+# Ward Spatial Autocorrelation Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def ward_autocorrelation(request):
+    """
+    Global Moran's I and LISA clusters for a ward indicator.
+    ?indicator=poverty_ra&contiguity=queen|rook&permutations=999
+    """
+    from .autocorrelation import CONTIGUITY_TYPES, WARD_INDICATORS, get_autocorrelation
+
+    indicator = request.GET.get('indicator', 'protest_de')
+    contiguity = request.GET.get('contiguity', 'queen')
+    try:
+        permutations = int(request.GET.get('permutations', 999))
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid query: {e}'
+        }, status=400)
+
+    if indicator not in WARD_INDICATORS:
+        return JsonResponse({
+            'success': False,
+            'error': f"indicator must be one of {', '.join(WARD_INDICATORS)}"
+        }, status=400)
+    if contiguity not in CONTIGUITY_TYPES:
+        return JsonResponse({
+            'success': False,
+            'error': f"contiguity must be one of {', '.join(CONTIGUITY_TYPES)}"
+        }, status=400)
+    if not 99 <= permutations <= 9999:
+        return JsonResponse({
+            'success': False,
+            'error': 'permutations must be between 99 and 9999'
+        }, status=400)
+
+    try:
+        result, version = get_autocorrelation(indicator, contiguity, permutations)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'data_version': version,
+        **result
+    })
+
+
+# Protest Hexbin Pyramid Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def protest_hexbins(request):
+    """
+    Hexagon aggregates of protest events at the pyramid level matching the map zoom.
+    ?zoom=11&in_bbox=west,south,east,north
+    """
+    from .hexbins import HEX_SIZES_M, get_hex_pyramid, hexbin_features, level_for_zoom
+
+    try:
+        zoom = int(request.GET.get('zoom', 11))
+        bbox = request.GET.get('in_bbox')
+        bbox = tuple(float(value) for value in bbox.split(',')) if bbox else None
+        if bbox is not None and len(bbox) != 4:
+            raise ValueError('in_bbox needs west,south,east,north')
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid query: {e}'
+        }, status=400)
+
+    level = level_for_zoom(zoom)
+    try:
+        pyramid, version = get_hex_pyramid()
+        features = hexbin_features(pyramid, level, bbox)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return HttpResponse(dumps({
+        'type': 'FeatureCollection',
+        'zoom': zoom,
+        'level': level,
+        'hex_size_m': HEX_SIZES_M[level],
+        'data_version': version,
+        'features': features
+    }), content_type='application/json')
+
+
+# Risk Forecast Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def risk_forecast(request):
+    """
+    Expected protest events and probability of at least one event next month for every ward,
+    scored in one pass by the model trained with manage.py train_risk_model
+    """
+    from .forecast import forecast_wards, get_forecast_features, get_risk_model
+
+    try:
+        model = get_risk_model()
+        if model is None:
+            return JsonResponse({
+                'success': False,
+                'error': 'Risk model has not been trained; run manage.py train_risk_model'
+            }, status=503)
+        features, version = get_forecast_features()
+        wards = forecast_wards(model, features)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'forecast_month': features['forecast_month'],
+        'data_version': version,
+        'model': model.metadata,
+        'wards': wards
+    })
+
+
+# Risk Surface Time Slider Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def risk_cube(request):
+    """
+    One slice (or the sum over a range of slices) of the precomputed density/risk cube.
+    ?time_step=month|week&surface=density|risk&slice=2023-06 or &start=2023-01&end=2023-06
+    Without slice/start/end only the grid and slice index are returned.
+    """
+    import numpy as np
+
+    from .hotspots import TIME_STEPS
+    from .risk_cube import get_risk_cube
+
+    time_step = request.GET.get('time_step', 'month')
+    surface = request.GET.get('surface', 'risk')
+    if time_step not in TIME_STEPS or surface not in ('density', 'risk'):
+        return JsonResponse({
+            'success': False,
+            'error': f"time_step must be one of {', '.join(TIME_STEPS)} and surface density or risk"
+        }, status=400)
+
+    try:
+        cube = get_risk_cube(time_step)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+    if cube is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'The risk cube needs at least two dated protest events at distinct points'
+        }, status=404)
+
+    index = cube.index
+    labels = index['labels']
+    selected = request.GET.get('slice')
+    start, end = request.GET.get('start'), request.GET.get('end')
+    grid = None
+    try:
+        if selected:
+            position = labels.index(selected)
+            grid = np.asarray(cube.slice(position), dtype=np.float64)
+            start = end = selected
+        elif start or end:
+            first = labels.index(start) if start else 0
+            last = labels.index(end) if end else len(labels) - 1
+            if first > last:
+                raise ValueError('start must not be after end')
+            grid = cube.range_sum(first, last + 1)
+            start, end = labels[first], labels[last]
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid slice: {e}'
+        }, status=400)
+
+    if grid is not None and surface == 'risk':
+        grid = grid * cube.risk_factor
+
+    return HttpResponse(dumps({
+        'success': True,
+        'time_step': time_step,
+        'surface': surface,
+        'data_version': index['events_version'],
+        'bandwidth_m': index['bandwidth_m'],
+        'grid_bounds': dict(zip(('x_min', 'y_min', 'x_max', 'y_max'), index['bounds'])),
+        'grid_size': index['nx'],
+        'slices': [{'label': label, 'events': count} for label, count in zip(labels, index['event_counts'])],
+        'start': start,
+        'end': end,
+        'grid': np.round(grid, 6).tolist() if grid is not None else None,
+        'max_value': float(grid.max()) if grid is not None else None
+    }), content_type='application/json')
+
+
+# Map Search Endpoint
+@csrf_exempt
+@require_http_methods(["GET"])
+def search(request):
+    """
+    Ranked name search / autocomplete across map layers.
+    ?q=kilim&types=ward,police&limit=10
+    """
+    from .search import SEARCH_TYPES, get_search_index
+
+    query = request.GET.get('q', '').strip()
+    types = request.GET.get('types')
+    types = tuple(value.strip() for value in types.split(',') if value.strip()) if types else SEARCH_TYPES
+    unknown = [value for value in types if value not in SEARCH_TYPES]
+    if unknown:
+        return JsonResponse({
+            'success': False,
+            'error': f"Unknown types {', '.join(unknown)}; use {', '.join(SEARCH_TYPES)}"
+        }, status=400)
+    try:
+        limit = int(request.GET.get('limit', 10))
+        if not 1 <= limit <= 50:
+            raise ValueError('limit must be between 1 and 50')
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid limit: {e}'
+        }, status=400)
+
+    try:
+        results = get_search_index().search(query, types, limit) if query else []
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'query': query,
+        'results': results
+    })
+
+
+# Metrics Endpoint
+@require_http_methods(["GET"])
+def metrics(request):
+    """
+    Request metrics of this process in Prometheus text format, for staff users and
+    scrapers with the PROTEST_METRICS_TOKEN bearer token
+    """
+    if not metrics_enabled():
+        return JsonResponse({
+            'success': False,
+            'error': 'Metrics are disabled'
+        }, status=404)
+    if not metrics_access_allowed(request):
+        return JsonResponse({
+            'success': False,
+            'error': 'Metrics are only available to staff users or with the metrics token'
+        }, status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,70 @@
+# protest/warmup.py
+"""
+Explicit warm-up of the analysis stack that protest.views imports lazily.
+
+By default NumPy, SciPy, scikit-learn and the scraping libraries load on the first
+request that needs them, which keeps worker boot and management commands fast but makes
+that first request slow. settings.PROTEST_WARM_UP moves the cost to boot instead
+(finalyear/wsgi.py and asgi.py call warm_up_configured()):
+
+    ''           nothing is preloaded
+    'imports'    import the analysis and scraping modules
+    'snapshots'  also load the event, police and ward snapshots from the database
+"""
+import importlib
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+
+
+LAZY_MODULES = (
+    'protest.analysis',
+    'protest.scraping',
+    'protest.snapshot',
+    'protest.bandwidth',
+    'protest.routing',
+    'protest.isochrones',
+    'protest.proximity',
+    'protest.spatial_metrics',
+    'protest.clustering',
+    'protest.hotspots',
+    'protest.autocorrelation',
+    'protest.hexbins',
+    'protest.forecast',
+    'protest.risk_cube',
+    'protest.point_clusters',
+    'protest.search',
+)
+
+
+def warm_up(snapshots=False):
+    """
+    Import LAZY_MODULES and optionally load the snapshots. Returns {step: seconds}.
+    A snapshot that cannot be loaded (e.g. the database is not up yet) is skipped and
+    loads on first use instead.
+    """
+    timings = {}
+    for name in LAZY_MODULES:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - started
+
+    if snapshots:
+        from .snapshot import get_event_snapshot, get_police_snapshot, get_ward_snapshot
+
+        for load in (get_event_snapshot, get_police_snapshot, get_ward_snapshot):
+            started = time.perf_counter()
+            try:
+                load()
+            except DatabaseError:
+                continue
+            timings[load.__name__] = time.perf_counter() - started
+    return timings
+
+
+def warm_up_configured():
+    mode = getattr(settings, 'PROTEST_WARM_UP', '')
+    if mode:
+        return warm_up(snapshots=mode == 'snapshots')
+    return {}
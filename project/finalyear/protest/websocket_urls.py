@@ -0,0 +1,9 @@
+# protest/websocket_urls.py
+from django.urls import path
+
+from .consumers import ProtestEventsConsumer
+
+
+websocket_urlpatterns = [
+    path('ws/protest-events/', ProtestEventsConsumer.as_asgi()),
+]